@@ -0,0 +1,289 @@
+"""Benchmarks of the ingest, chart and fan-out hot paths.
+
+Runs without a network or MQTT broker against a temporary database filled
+with a synthetic sensor stream, and writes the results as JSON so runs can
+be compared across commits::
+
+    python -m benchmarks --sources 8 --gaps random --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from benchmarks.synthetic import SyntheticStream
+from mqtt_thermometer.settings import SourceSettings, settings
+
+COLORS = ["#00dd00", "#00eeee", "#dd0000", "#dddd00", "#0000dd", "#dd00dd"]
+
+
+def _summarize(durations_ns: list[int]) -> dict[str, float]:
+    durations_us = sorted(duration / 1000 for duration in durations_ns)
+    total_seconds = sum(durations_ns) / 1e9
+    percentiles = (
+        statistics.quantiles(durations_us, n=100, method="inclusive")
+        if len(durations_us) > 1
+        else durations_us * 99
+    )
+    return {
+        "count": len(durations_us),
+        "total_seconds": round(total_seconds, 6),
+        "ops_per_second": round(len(durations_us) / total_seconds, 1)
+        if total_seconds
+        else None,
+        "mean_us": round(statistics.fmean(durations_us), 3),
+        "p50_us": round(percentiles[49], 3),
+        "p95_us": round(percentiles[94], 3),
+        "max_us": round(durations_us[-1], 3),
+    }
+
+
+def measure(operation: Callable[[], object], repeat: int) -> dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        operation()
+        durations.append(time.perf_counter_ns() - started)
+    return _summarize(durations)
+
+
+def _configure(stream: SyntheticStream, db_path: Path):
+    # Must happen before the service modules read the settings at import
+    settings.db_connection_string = str(db_path)
+    settings.sources[:] = [
+        SourceSettings(
+            label=f"Sensor {index}",
+            source=topic,
+            border_color=COLORS[index % len(COLORS)],
+            background_color=COLORS[index % len(COLORS)],
+        )
+        for index, topic in enumerate(stream.topics())
+    ]
+    settings.source_templates[:] = []
+    settings.cache.snapshot_enabled = False
+
+
+class _Message:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+    async def send_text(self, message: str):
+        self.sent_messages += 1
+        self.sent_bytes += len(message)
+
+    async def send_bytes(self, message: bytes):
+        self.sent_messages += 1
+        self.sent_bytes += len(message)
+
+    async def close(self):
+        pass
+
+
+def bench_on_message(stream: SyntheticStream, until: datetime, limit: int) -> dict:
+    from mqtt_thermometer import mqtt
+
+    messages = [
+        _Message(topic, str(temperature).encode())
+        for _, (topic, _, temperature) in zip(range(limit), stream.readings(until))
+    ]
+
+    def run():
+        for message in messages:
+            mqtt.on_message(None, None, message)
+
+    # Timed per batch of messages, the timer would dominate a single call
+    result = measure(run, repeat=5)
+    mqtt.aggregator.flush()
+    result["batch_size"] = len(messages)
+    result["messages_per_second"] = round(
+        len(messages) * result["count"] / result["total_seconds"], 1
+    )
+    return result
+
+
+def bench_cache_add(stream: SyntheticStream, until: datetime) -> dict:
+    from mqtt_thermometer import cache
+
+    averages = list(stream.minute_averages(until))
+    cache.clear_cache()
+    durations = []
+    for topic, minute, average in averages:
+        started = time.perf_counter_ns()
+        cache.add_temperature_to_cache(topic, minute, average)
+        durations.append(time.perf_counter_ns() - started)
+    return _summarize(durations)
+
+
+def bench_chart_data(repeat: int) -> dict:
+    from mqtt_thermometer import cache, service
+
+    source = settings.sources[0]
+
+    def chart_data():
+        service._get_temperature_data_for_source(
+            source.source,
+            source.calibration_multiplier,
+            source.calibration_offset,
+            for_json=True,
+        )
+
+    def rebuilt_chart_data():
+        # A bulk load invalidates the incremental grids
+        cache._bump_generation()
+        chart_data()
+
+    return {
+        "incremental": measure(chart_data, repeat),
+        "rebuild": measure(rebuilt_chart_data, repeat),
+    }
+
+
+def bench_temperatures_endpoint(repeat: int) -> dict:
+    from fastapi.testclient import TestClient
+
+    from mqtt_thermometer import service
+
+    client = TestClient(service.app)
+    etag = client.get("/temperatures").headers["ETag"]
+    return {
+        "json": measure(lambda: client.get("/temperatures"), repeat),
+        "columnar": measure(
+            lambda: client.get("/temperatures", params={"format": "columnar"}), repeat
+        ),
+        "not_modified": measure(
+            lambda: client.get("/temperatures", headers={"If-None-Match": etag}),
+            repeat,
+        ),
+    }
+
+
+async def _bench_broadcast(clients: int, repeat: int) -> dict:
+    from mqtt_thermometer import broadcast, service
+
+    websockets = [_FakeWebSocket() for _ in range(clients)]
+    for index, websocket in enumerate(websockets):
+        # A mix of the client formats the page and older pages ask for
+        broadcast.broadcaster.add(
+            websocket, columnar=index % 2 == 0, compressed=index % 4 == 0
+        )
+
+    async def drained():
+        while broadcast.broadcaster.get_stats()["queued_messages"]:
+            await asyncio.sleep(0)
+
+    async def run(full_chart: bool) -> dict:
+        durations = []
+        for iteration in range(repeat):
+            service.process_mqtt_readings(
+                {
+                    source.source: Decimal(20 + iteration % 10)
+                    for source in settings.sources
+                }
+            )
+            if full_chart:
+                service.chart_state = None
+            started = time.perf_counter_ns()
+            service._broadcast_chart()
+            await drained()
+            durations.append(time.perf_counter_ns() - started)
+        return _summarize(durations)
+
+    results = {
+        "full_chart": await run(full_chart=True),
+        "chart_delta": await run(full_chart=False),
+        "sent_bytes": sum(websocket.sent_bytes for websocket in websockets),
+    }
+    service.legend_trigger.cancel()
+    service.chart_trigger.cancel()
+    await broadcast.broadcaster.close()
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--messages-per-minute", type=int, default=6)
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument(
+        "--gaps", choices=["none", "periodic", "random"], default="none"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="JSON file, default stdout")
+    arguments = parser.parse_args(argv)
+
+    stream = SyntheticStream(
+        sources=arguments.sources,
+        messages_per_minute=arguments.messages_per_minute,
+        hours=arguments.hours,
+        gaps=arguments.gaps,
+        seed=arguments.seed,
+    )
+    until = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        _configure(stream, Path(directory) / "benchmark.db")
+        from mqtt_thermometer import database
+
+        database.create_table()
+        results = {
+            "mqtt_on_message": bench_on_message(stream, until, limit=10_000),
+            "cache_add_temperature": bench_cache_add(stream, until),
+            "chart_data_for_source": bench_chart_data(arguments.repeat),
+            "temperatures_endpoint": bench_temperatures_endpoint(arguments.repeat),
+            "broadcast_chart": asyncio.run(
+                _bench_broadcast(arguments.clients, arguments.repeat)
+            ),
+        }
+        database.close_connections()
+
+    report = {
+        "created": datetime.now(tz=UTC).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "parameters": vars(arguments) | {"output": None},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        arguments.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Synthetic sensor streams for the benchmarks."""
+
+import math
+import random
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Literal
+
+GapPattern = Literal["none", "periodic", "random"]
+
+
+@dataclass
+class SyntheticStream:
+    """Readings of a number of sources over a time range.
+
+    Temperatures follow a daily sine wave with noise, rounded to 0.1 like
+    the real sensors. Gaps drop every reading of a source for a minute:
+    "periodic" leaves out 10 minutes every hour, "random" drops single
+    minutes and the occasional longer outage. The same seed always gives
+    the same stream.
+    """
+
+    sources: int = 4
+    messages_per_minute: int = 6
+    hours: float = 24.0
+    gaps: GapPattern = "none"
+    seed: int = 0
+
+    def topics(self) -> list[str]:
+        return [f"bench/sensor{index}/temperature" for index in range(self.sources)]
+
+    def _missing_minutes(self, rng: random.Random, minutes: int) -> set[int]:
+        if self.gaps == "periodic":
+            return {minute for minute in range(minutes) if minute % 60 >= 50}
+        if self.gaps == "random":
+            missing = {minute for minute in range(minutes) if rng.random() < 0.02}
+            for _ in range(max(minutes // (6 * 60), 1)):
+                start = rng.randrange(minutes)
+                missing.update(range(start, min(start + rng.randint(5, 30), minutes)))
+            return missing
+        return set()
+
+    def readings(self, until: datetime) -> Iterator[tuple[str, datetime, Decimal]]:
+        """(topic, timestamp, temperature) of every message in time order."""
+        rng = random.Random(self.seed)
+        minutes = int(self.hours * 60)
+        start = until - timedelta(minutes=minutes)
+        missing = {
+            topic: self._missing_minutes(rng, minutes) for topic in self.topics()
+        }
+        step = 60 / self.messages_per_minute
+        for minute in range(minutes):
+            for message in range(self.messages_per_minute):
+                timestamp = start + timedelta(minutes=minute, seconds=message * step)
+                for index, topic in enumerate(self.topics()):
+                    if minute in missing[topic]:
+                        continue
+                    phase = 2 * math.pi * (minute / (24 * 60) + index / self.sources)
+                    temperature = 20 + 5 * math.sin(phase) + rng.gauss(0, 0.2)
+                    yield topic, timestamp, Decimal(f"{temperature:.1f}")
+
+    def minute_averages(
+        self, until: datetime
+    ) -> Iterator[tuple[str, datetime, Decimal]]:
+        """(topic, minute, average) of the stream, as saved to the database."""
+        totals: dict[tuple[str, datetime], tuple[Decimal, int]] = {}
+        for topic, timestamp, temperature in self.readings(until):
+            key = (topic, timestamp.replace(second=0, microsecond=0))
+            total, count = totals.get(key, (Decimal(0), 0))
+            totals[key] = (total + temperature, count + 1)
+        for (topic, minute), (total, count) in totals.items():
+            yield topic, minute, (total / count).quantize(Decimal("0.01"))
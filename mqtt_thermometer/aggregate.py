@@ -0,0 +1,114 @@
+import logging
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import clock
+from mqtt_thermometer.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (source, minute, average, minimum, maximum, count)
+AggregateRow = tuple[str, datetime, Decimal, Decimal, Decimal, int]
+
+
+@dataclass(slots=True)
+class MinuteAggregate:
+    """Running count, sum, minimum and maximum of one source in one minute."""
+
+    count: int
+    total: Decimal
+    minimum: Decimal
+    maximum: Decimal
+
+    @classmethod
+    def first(cls, temperature: Decimal) -> "MinuteAggregate":
+        return cls(count=1, total=temperature, minimum=temperature, maximum=temperature)
+
+    def add(self, temperature: Decimal):
+        self.count += 1
+        self.total += temperature
+        if temperature < self.minimum:
+            self.minimum = temperature
+        elif temperature > self.maximum:
+            self.maximum = temperature
+
+    @property
+    def average(self) -> Decimal:
+        return (self.total / self.count).quantize(Decimal("0.01"))
+
+
+class MinuteAggregator:
+    """Aggregates readings per source and minute, flushed on minute boundaries.
+
+    Readings are added from the MQTT callbacks, stamped with their arrival
+    time. ``run`` wakes up ``flush_delay_seconds`` after each minute
+    boundary and hands the finished minutes to the writer, so a quiet
+    sensor's last minute is persisted on time. The delay only lets a
+    callback that stamped its reading just before the boundary add it;
+    readings for a minute that has already been flushed are dropped.
+    """
+
+    def __init__(self, flush_delay_seconds: float):
+        self.flush_delay_seconds = flush_delay_seconds
+        self.late_readings = 0
+        self._minutes: dict[datetime, dict[str, MinuteAggregate]] = {}
+        self._flushed_until: datetime | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "MinuteAggregator":
+        return cls(
+            flush_delay_seconds=settings.database.aggregation_flush_delay_seconds
+        )
+
+    def add(self, source: str, temperature: Decimal, timestamp: datetime):
+        minute = timestamp.replace(second=0, microsecond=0)
+        with self._lock:
+            if self._flushed_until is not None and minute < self._flushed_until:
+                self.late_readings += 1
+                logger.warning(
+                    f"Dropping late reading of {source} for {minute}, already saved"
+                )
+                return
+            aggregates = self._minutes.setdefault(minute, {})
+            if aggregate := aggregates.get(source):
+                aggregate.add(temperature)
+            else:
+                aggregates[source] = MinuteAggregate.first(temperature)
+
+    def flush(self, before: datetime | None = None) -> list[AggregateRow]:
+        """Return and forget the minutes before the given minute, or all."""
+        with self._lock:
+            minutes = sorted(
+                minute for minute in self._minutes if before is None or minute < before
+            )
+            if before is not None:
+                self._flushed_until = max(self._flushed_until or before, before)
+            return [
+                (
+                    source,
+                    minute,
+                    aggregate.average,
+                    aggregate.minimum,
+                    aggregate.maximum,
+                    aggregate.count,
+                )
+                for minute in minutes
+                for source, aggregate in self._minutes.pop(minute).items()
+            ]
+
+    async def run(self, write: Callable[[list[AggregateRow]], object]):
+        """Flush finished minutes to write after each minute boundary."""
+        while True:
+            now = clock.now()
+            next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+            delay = (next_minute - now).total_seconds() + self.flush_delay_seconds
+            await clock.sleep(delay)
+            # Readings are stamped on arrival, the earlier minutes are finished
+            rows = self.flush(before=clock.now().replace(second=0, microsecond=0))
+            if rows:
+                logger.debug(f"Flushing {len(rows)} minute aggregates")
+                write(rows)
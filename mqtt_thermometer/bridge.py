@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from collections.abc import Callable
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+
+class ReadingBridge:
+    """Hands the latest reading of each topic from the MQTT thread to the event loop.
+
+    The MQTT thread only stores the reading in a slot per topic and wakes
+    the loop once; a reading that is replaced before the loop gets to it is
+    counted as coalesced. The loop drains all pending topics in one batch.
+    Storing and popping single dict keys is atomic, so no lock is needed.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        handler: Callable[[dict[str, Decimal]], None],
+    ):
+        self.loop = loop
+        self.handler = handler
+        self.received_readings = 0
+        self.coalesced_readings = 0
+        self.drains = 0
+        self._slots: dict[str, Decimal] = {}
+        self._wake_pending = False
+
+    def put(self, topic: str, temperature: Decimal):
+        """Store the latest reading of a topic. Called from the MQTT thread."""
+        self.received_readings += 1
+        if topic in self._slots:
+            self.coalesced_readings += 1
+        self._slots[topic] = temperature
+        if not self._wake_pending:
+            self._wake_pending = True
+            self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        # Cleared before draining, a reading stored after its topic has been
+        # popped schedules a new drain
+        self._wake_pending = False
+        readings = {}
+        for topic in list(self._slots):
+            readings[topic] = self._slots.pop(topic)
+        self.drains += 1
+        try:
+            self.handler(readings)
+        except Exception as e:
+            logger.error(f"Failed to process MQTT readings: {e}")
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "received_readings": self.received_readings,
+            "coalesced_readings": self.coalesced_readings,
+            "drains": self.drains,
+            "pending_topics": len(self._slots),
+        }
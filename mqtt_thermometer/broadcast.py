@@ -0,0 +1,247 @@
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from collections.abc import Callable
+
+from fastapi import WebSocket
+
+from mqtt_thermometer import clock, compression
+from mqtt_thermometer.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ClientSender:
+    """Bounded outgoing queue of one websocket, drained by its own task.
+
+    Queued messages are already serialized. A new legends frame replaces a
+    legends frame still waiting in the queue, and when the queue is full the
+    oldest message is dropped. A dropped chart delta is detected by the
+    client from the version numbers, which then asks for a resync. A send
+    that does not finish within ``send_timeout`` seconds closes the client.
+    Clients that asked for compressed frames get deflated binary frames
+    instead of text.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        queue_size: int,
+        send_timeout: float,
+        columnar: bool = False,
+        compressed: bool = False,
+    ):
+        self.websocket = websocket
+        # The client asked for full charts in the columnar format
+        self.columnar = columnar
+        # The client asked for raw deflate compressed binary frames
+        self.compressed = compressed
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.closed = False
+        self.sent_messages = 0
+        self.dropped_messages = 0
+        self.coalesced_messages = 0
+        self._queue: deque[tuple[str | bytes, bool]] = deque()
+        self._ready = asyncio.Event()
+
+    def send(self, message: str | bytes, coalesce: bool = False):
+        """Queue a message without waiting for the network.
+
+        Messages sent with coalesce=True replace the queued message of the
+        same kind, only the latest one is worth sending. Bytes are taken as
+        already compressed.
+        """
+        if self.closed:
+            return
+        if self.compressed and isinstance(message, str):
+            message = compression.compress_message(message)
+        if coalesce:
+            for index, (_, queued_coalesce) in enumerate(self._queue):
+                if queued_coalesce:
+                    del self._queue[index]
+                    self.coalesced_messages += 1
+                    break
+        if len(self._queue) >= self.queue_size:
+            self._queue.popleft()
+            self.dropped_messages += 1
+        self._queue.append((message, coalesce))
+        self._ready.set()
+
+    async def run(self):
+        """Send queued messages until the client disconnects or is too slow."""
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._queue:
+                    message, _ = self._queue.popleft()
+                    await asyncio.wait_for(
+                        self.websocket.send_bytes(message)
+                        if isinstance(message, bytes)
+                        else self.websocket.send_text(message),
+                        self.send_timeout,
+                    )
+                    self.sent_messages += 1
+        except TimeoutError:
+            logger.warning(
+                f"Websocket send took over {self.send_timeout}s, closing slow client"
+            )
+        except Exception as e:
+            logger.warning(f"Failed to send to websocket: {e}")
+        finally:
+            self.closed = True
+            self._queue.clear()
+        # A timed out send may have left a partial frame, the connection is
+        # unusable either way
+        with contextlib.suppress(Exception):
+            await asyncio.wait_for(self.websocket.close(), self.send_timeout)
+
+
+class Broadcaster:
+    """Fan-out of pre-serialized messages to all connected websockets."""
+
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._clients: dict[WebSocket, ClientSender] = {}
+        self._tasks: dict[WebSocket, asyncio.Task] = {}
+        self._evicted_clients = 0
+
+    @classmethod
+    def from_settings(cls) -> "Broadcaster":
+        return cls(
+            queue_size=settings.websocket.send_queue_size,
+            send_timeout=settings.websocket.send_timeout_seconds,
+        )
+
+    def add(
+        self, websocket: WebSocket, columnar: bool = False, compressed: bool = False
+    ) -> ClientSender:
+        sender = ClientSender(
+            websocket,
+            self.queue_size,
+            self.send_timeout,
+            columnar=columnar,
+            compressed=compressed,
+        )
+        self._clients[websocket] = sender
+        task = asyncio.create_task(sender.run())
+        self._tasks[websocket] = task
+        task.add_done_callback(lambda _: self._on_sender_done(websocket, sender))
+        return sender
+
+    def _on_sender_done(self, websocket: WebSocket, sender: ClientSender):
+        if self._clients.get(websocket) is sender:
+            # The sender gave up on its own, the client was too slow or gone
+            self._evicted_clients += 1
+            del self._clients[websocket]
+            self._tasks.pop(websocket, None)
+
+    def remove(self, websocket: WebSocket):
+        self._clients.pop(websocket, None)
+        if task := self._tasks.pop(websocket, None):
+            task.cancel()
+
+    def broadcast(
+        self,
+        message: str,
+        coalesce: bool = False,
+        columnar_message: str | None = None,
+    ):
+        """Queue a message for every connected client.
+
+        Clients that asked for the columnar format get columnar_message
+        instead, if given. Each message is compressed at most once, however
+        many clients asked for compressed frames.
+        """
+        compressed: dict[str, bytes] = {}
+        for sender in list(self._clients.values()):
+            client_message = (
+                columnar_message
+                if sender.columnar and columnar_message is not None
+                else message
+            )
+            if sender.compressed:
+                if client_message not in compressed:
+                    compressed[client_message] = compression.compress_message(
+                        client_message
+                    )
+                sender.send(compressed[client_message], coalesce=coalesce)
+            else:
+                sender.send(client_message, coalesce=coalesce)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        self._clients.clear()
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get_stats(self) -> dict[str, int]:
+        senders = self._clients.values()
+        return {
+            "clients": len(self._clients),
+            "evicted_clients": self._evicted_clients,
+            "queued_messages": sum(len(sender._queue) for sender in senders),
+            "sent_messages": sum(sender.sent_messages for sender in senders),
+            "dropped_messages": sum(sender.dropped_messages for sender in senders),
+            "coalesced_messages": sum(sender.coalesced_messages for sender in senders),
+        }
+
+
+class CoalescingTrigger:
+    """Runs a callback at most once per interval.
+
+    The first trigger after a quiet period runs the callback right away.
+    Triggers within the interval after that are coalesced into a single
+    run at the end of the interval.
+    """
+
+    def __init__(self, interval: float, callback: Callable[[], None]):
+        self.interval = interval
+        self.callback = callback
+        self.runs = 0
+        self.coalesced = 0
+        self._last_run: float | None = None
+        self._handle: clock.Timer | None = None
+
+    def trigger(self) -> bool:
+        """Request a run. Returns True if the callback ran immediately."""
+        if self._handle is not None:
+            # A trailing run is already scheduled and will cover this one
+            self.coalesced += 1
+            return False
+        delay = (
+            0.0
+            if self._last_run is None
+            else self._last_run + self.interval - clock.monotonic()
+        )
+        if delay <= 0:
+            self._run()
+            return True
+        self.coalesced += 1
+        self._handle = clock.call_later(delay, self._run)
+        return False
+
+    def _run(self):
+        self._handle = None
+        self._last_run = clock.monotonic()
+        self.runs += 1
+        try:
+            self.callback()
+        except Exception as e:
+            logger.error(f"Broadcast failed: {e}")
+
+    def cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+broadcaster = Broadcaster.from_settings()
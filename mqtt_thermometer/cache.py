@@ -1,39 +1,225 @@
+import bisect
+import itertools
 import logging
+import math
+import operator
 import threading
-from collections import defaultdict
-from datetime import UTC, datetime, timedelta
+import time
+from array import array
+from datetime import datetime, timedelta
 from decimal import Decimal
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 
-from mqtt_thermometer import database
+from mqtt_thermometer import clock, database
 
 logger = logging.getLogger(__name__)
 
-# Cache data structure: {source: [(timestamp, temperature), ...]}
-# Each source has a list of (timestamp, temperature) tuples sorted by timestamp
-temperature_cache: Dict[str, List[Tuple[datetime, Decimal]]] = defaultdict(list)
-cache_mutex = threading.RLock()
-
 # Maximum age for cache entries (24 hours)
 CACHE_MAX_AGE = timedelta(hours=24)
+# One slot per minute of the cache window, plus headroom for clock skew
+CACHE_CAPACITY = int(CACHE_MAX_AGE / timedelta(minutes=1)) + 60
+# How far back a late, out-of-order reading may be inserted
+MAX_LATE_SLOTS = 60
+
+
+class TemperatureRing:
+    """Fixed-capacity ring buffer of readings for one source.
+
+    Readings are kept sorted by epoch minute in two parallel arrays: epoch
+    minutes and centi-degree values. Appending and expiring old readings are
+    O(1); a late reading is inserted by shifting at most MAX_LATE_SLOTS
+    newer readings. When the ring is full the oldest reading is overwritten.
+    """
+
+    __slots__ = ("capacity", "minutes", "values", "start", "length")
+
+    def __init__(self, capacity: int = CACHE_CAPACITY):
+        self.capacity = capacity
+        self.minutes = array("q", bytes(8 * capacity))
+        self.values = array("i", bytes(4 * capacity))
+        self.start = 0
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _slot(self, index: int) -> int:
+        return (self.start + index) % self.capacity
+
+    def minute_at(self, index: int) -> int:
+        return self.minutes[self._slot(index)]
+
+    def value_at(self, index: int) -> int:
+        return self.values[self._slot(index)]
+
+    def add(self, minute: int, value: int) -> bool:
+        """Add or replace the reading of a minute.
+
+        Returns False if the reading is too late to be inserted.
+        """
+        if self.length and minute <= self.minute_at(self.length - 1):
+            return self._insert_late(minute, value)
+
+        if self.length == self.capacity:
+            self.start = self._slot(1)
+            self.length -= 1
+        slot = self._slot(self.length)
+        self.minutes[slot] = minute
+        self.values[slot] = value
+        self.length += 1
+        return True
+
+    def _insert_late(self, minute: int, value: int) -> bool:
+        # Scan back from the newest reading for the insertion point
+        lowest = max(self.length - 1 - MAX_LATE_SLOTS, 0)
+        index = self.length - 1
+        while index >= lowest and self.minute_at(index) > minute:
+            index -= 1
+
+        if index >= lowest:
+            if self.minute_at(index) == minute:
+                self.values[self._slot(index)] = value
+                return True
+        elif lowest > 0 or self.length == self.capacity:
+            # Too late, or older than everything in a full ring
+            return False
+
+        if self.length == self.capacity:
+            # Make room by dropping the oldest reading
+            self.start = self._slot(1)
+            self.length -= 1
+            index -= 1
+        # Shift the newer readings one slot towards the end
+        for i in range(self.length, index + 1, -1):
+            self.minutes[self._slot(i)] = self.minute_at(i - 1)
+            self.values[self._slot(i)] = self.value_at(i - 1)
+        slot = self._slot(index + 1)
+        self.minutes[slot] = minute
+        self.values[slot] = value
+        self.length += 1
+        return True
+
+    def extend(self, minutes: array, values: array):
+        """Append readings newer than the newest one, in chronological order."""
+        count = len(minutes)
+        if self.start == 0 and self.length + count <= self.capacity:
+            # Bulk copy while the ring has not wrapped around yet
+            self.minutes[self.length : self.length + count] = minutes
+            self.values[self.length : self.length + count] = values
+            self.length += count
+            return
+        for minute, value in zip(minutes, values):
+            self.add(minute, value)
+
+    def prepend(self, minutes: array, values: array):
+        """Insert readings older than the oldest one, in chronological order.
+
+        Readings that are not older than the oldest reading are added one by
+        one, replacing the reading of the same minute.
+        """
+        count = (
+            bisect.bisect_left(minutes, self.minute_at(0))
+            if self.length
+            else len(minutes)
+        )
+        # Keep the newest readings if everything does not fit
+        skip = max(count - (self.capacity - self.length), 0)
+        self.start = (self.start - (count - skip)) % self.capacity
+        for index in range(skip, count):
+            slot = self._slot(index - skip)
+            self.minutes[slot] = minutes[index]
+            self.values[slot] = values[index]
+        self.length += count - skip
+        for index in range(count, len(minutes)):
+            self.add(minutes[index], values[index])
+
+    def bisect_left(self, minute: int) -> int:
+        """Return the logical index of the first reading at or after minute."""
+        return bisect.bisect_left(range(self.length), minute, key=self.minute_at)
+
+    def expire(self, cutoff_minute: int):
+        """Drop readings older than the cutoff minute."""
+        while self.length and self.minutes[self.start] < cutoff_minute:
+            self.start = self._slot(1)
+            self.length -= 1
+
+    def snapshot(self, first: int = 0) -> tuple[array, array]:
+        """Copy readings from logical index ``first`` onwards.
+
+        Returns (minutes, values) arrays; only the requested range is copied.
+        """
+        if first >= self.length:
+            return array("q"), array("i")
+        begin = self._slot(first)
+        end = begin + (self.length - first)
+        if end <= self.capacity:
+            return self.minutes[begin:end], self.values[begin:end]
+        end -= self.capacity
+        return (
+            self.minutes[begin:] + self.minutes[:end],
+            self.values[begin:] + self.values[:end],
+        )
+
+
+# Cache data structure: {source: TemperatureRing}
+temperature_cache: Dict[str, TemperatureRing] = {}
+cache_mutex = threading.RLock()
+
+# Bumped whenever the cache content is replaced wholesale, e.g. on clear or
+# bulk load, so that derived data knows to rebuild
+cache_generation = 0
+# Rows and duration of the last warm-up from the database or a snapshot
+warmup_stats: Dict[str, float | str] = {}
+# Called with (source, epoch_minute, centidegrees) under cache_mutex after a
+# reading has been added to the cache
+reading_listeners: List[Callable[[str, int, int], None]] = []
+
+
+def _to_epoch_minute(timestamp: datetime) -> int:
+    return int(timestamp.timestamp()) // 60
+
+
+def _ceil_epoch_minute(timestamp: datetime) -> int:
+    # First minute that does not start before the timestamp
+    return math.ceil(timestamp.timestamp() / 60)
+
+
+def _cutoff_minute() -> int:
+    # Oldest minute that is still within CACHE_MAX_AGE
+    return _ceil_epoch_minute(clock.now() - CACHE_MAX_AGE)
 
 
 def add_temperature_to_cache(source: str, timestamp: datetime, temperature: Decimal):
-    """Add a temperature reading to the cache and clean up old entries."""
+    """Add a temperature reading to the cache and expire old entries."""
     with cache_mutex:
-        # Add the new entry
-        temperature_cache[source].append((timestamp, temperature))
+        ring = temperature_cache.get(source)
+        if ring is None:
+            ring = temperature_cache[source] = TemperatureRing()
+        minute = _to_epoch_minute(timestamp)
+        centidegrees = database.to_centidegrees(temperature)
+        if ring.add(minute, centidegrees):
+            for listener in reading_listeners:
+                listener(source, minute, centidegrees)
+        else:
+            logger.warning(f"Dropped late temperature from cache: {source} {timestamp}")
+        ring.expire(_cutoff_minute())
 
-        # Keep the list sorted by timestamp
-        temperature_cache[source].sort(key=lambda x: x[0])
+        logger.debug(f"Added temperature to cache: {source} {timestamp} {temperature}")
 
-        # Clean up old entries (older than 24 hours) every time we add new data
-        cutoff_time = datetime.now(tz=UTC) - CACHE_MAX_AGE
-        temperature_cache[source] = [
-            (ts, temp) for ts, temp in temperature_cache[source] if ts >= cutoff_time
-        ]
 
-        logger.debug(f"Added temperature to cache: {source} {timestamp} {temperature}")
+def get_readings(source: str, since: datetime) -> tuple[array, array]:
+    """Get cached readings of a source since the given timestamp.
+
+    Returns (epoch_minutes, centidegrees) arrays in chronological order. The
+    window start is found with a binary search and only the readings inside
+    the window are copied.
+    """
+    since_minute = _ceil_epoch_minute(since)
+    with cache_mutex:
+        ring = temperature_cache.get(source)
+        if ring is None:
+            return array("q"), array("i")
+        return ring.snapshot(ring.bisect_left(since_minute))
 
 
 def get_temperatures_from_cache_only(
@@ -41,23 +227,23 @@ def get_temperatures_from_cache_only(
 ) -> List[Tuple[str, str, Decimal]]:
     """Get temperature readings from cache only - no database fallback.
 
+    Compatibility wrapper around get_readings().
     Returns a list of (source, timestamp_iso, temperature) tuples.
     """
-    with cache_mutex:
-        if source not in temperature_cache:
-            return []
-
-        # Filter entries since the given timestamp
-        cached_entries = [
-            (source, timestamp.isoformat(), temperature)
-            for timestamp, temperature in temperature_cache[source]
-            if timestamp >= since
-        ]
-
-        logger.debug(
-            f"Retrieved {len(cached_entries)} entries from cache for {source} since {since}"
+    minutes, values = get_readings(source, since)
+    cached_entries = [
+        (
+            source,
+            database.from_epoch_seconds(minute * 60).isoformat(),
+            database.from_centidegrees(value),
         )
-        return cached_entries
+        for minute, value in zip(minutes, values)
+    ]
+
+    logger.debug(
+        f"Retrieved {len(cached_entries)} entries from cache for {source} since {since}"
+    )
+    return cached_entries
 
 
 def get_temperatures_cached(
@@ -91,49 +277,118 @@ def initialize_cache_from_database():
     # Clear any existing cache data first
     clear_cache()
 
-    # Get all unique sources from database
+    # Load the last 24 hours of all sources with one query, rows are
+    # grouped by source in time order so each batch is appended in bulk
+    since = clock.now() - CACHE_MAX_AGE
+    started = time.perf_counter()
+    total_loaded = 0
+
     try:
-        with database.get_database_connection() as connection:
-            cursor = connection.cursor()
-            cursor.execute("SELECT DISTINCT source FROM temperature")
-            sources = [row[0] for row in cursor.fetchall()]
+        for rows in database.iter_recent_readings(since, database.WARMUP_BATCH_SIZE):
+            with cache_mutex:
+                for source, source_rows in itertools.groupby(
+                    rows, operator.itemgetter(0)
+                ):
+                    _, minutes, values = zip(*source_rows)
+                    ring = temperature_cache.get(source)
+                    if ring is None:
+                        ring = temperature_cache[source] = TemperatureRing()
+                    ring.extend(array("q", minutes), array("i", values))
+            total_loaded += len(rows)
     except Exception as e:
-        logger.error(f"Failed to get sources from database: {e}")
-        return
+        logger.error(f"Failed to load cache data from database: {e}")
 
-    # For each source, load last 24 hours of data
-    since = datetime.now(tz=UTC) - CACHE_MAX_AGE
+    _bump_generation()
+    seconds = time.perf_counter() - started
+    warmup_stats.clear()
+    warmup_stats.update(
+        {"source": "database", "rows": total_loaded, "seconds": round(seconds, 3)}
+    )
+    logger.info(
+        f"Cache initialization completed. Loaded {total_loaded} total entries "
+        f"from database in {seconds:.2f} seconds."
+    )
+
+
+def load_older_readings(since: datetime, until: datetime | None) -> int:
+    """Add the saved readings between since and until to the cache.
+
+    Meant for loading history backwards in time while newer readings are
+    already being added, so keep the range short. Returns the number of
+    readings read.
+    """
+    readings: dict[str, tuple[array, array]] = {}
     total_loaded = 0
+    for rows in database.iter_recent_readings(since, database.WARMUP_BATCH_SIZE, until):
+        for source, source_rows in itertools.groupby(rows, operator.itemgetter(0)):
+            _, minutes, values = zip(*source_rows)
+            source_minutes, source_values = readings.setdefault(
+                source, (array("q"), array("i"))
+            )
+            source_minutes.extend(minutes)
+            source_values.extend(values)
+        total_loaded += len(rows)
+    with cache_mutex:
+        for source, (minutes, values) in readings.items():
+            ring = temperature_cache.get(source)
+            if ring is None:
+                ring = temperature_cache[source] = TemperatureRing()
+            ring.prepend(minutes, values)
+    _bump_generation()
+    return total_loaded
 
-    for source in sources:
-        try:
-            # Get data from database
-            db_data = database.get_temperatures(source, since)
 
-            # Add to cache
-            with cache_mutex:
-                for _, timestamp_iso, temperature in db_data:
-                    timestamp = datetime.fromisoformat(timestamp_iso)
-                    temperature_cache[source].append((timestamp, temperature))
+def get_all_readings() -> dict[str, tuple[array, array]]:
+    """Copy the (epoch_minutes, centidegrees) readings of every source."""
+    with cache_mutex:
+        return {source: ring.snapshot() for source, ring in temperature_cache.items()}
 
-                # Keep sorted by timestamp
-                temperature_cache[source].sort(key=lambda x: x[0])
 
-            total_loaded += len(db_data)
-            logger.debug(f"Loaded {len(db_data)} entries for source {source}")
+def load_readings(readings: dict[str, tuple[array, array]]):
+    """Replace the cache content, e.g. with readings from a snapshot.
 
-        except Exception as e:
-            logger.error(f"Failed to load cache data for source {source}: {e}")
+    Readings older than the cache window are dropped.
+    """
+    cutoff = _cutoff_minute()
+    with cache_mutex:
+        temperature_cache.clear()
+        for source, (minutes, values) in readings.items():
+            ring = temperature_cache[source] = TemperatureRing()
+            ring.extend(minutes, values)
+            ring.expire(cutoff)
+        _bump_generation()
 
-    logger.info(
-        f"Cache initialization completed. Loaded {total_loaded} total entries from database."
-    )
+
+def replay_from_database(since: datetime) -> int:
+    """Add the readings saved since the given timestamp, replacing cached ones.
+
+    Returns the number of readings read from the database.
+    """
+    since = max(since, clock.now() - CACHE_MAX_AGE)
+    total_loaded = 0
+    for rows in database.iter_recent_readings(since, database.WARMUP_BATCH_SIZE):
+        with cache_mutex:
+            for source, minute, value in rows:
+                ring = temperature_cache.get(source)
+                if ring is None:
+                    ring = temperature_cache[source] = TemperatureRing()
+                ring.add(minute, value)
+        total_loaded += len(rows)
+    _bump_generation()
+    return total_loaded
+
+
+def _bump_generation():
+    global cache_generation
+    with cache_mutex:
+        cache_generation += 1
 
 
 def clear_cache():
     """Clear all cache data. Useful for testing or manual cache reset."""
     with cache_mutex:
         temperature_cache.clear()
+        _bump_generation()
         logger.info("Temperature cache cleared")
 
 
@@ -141,6 +396,6 @@ def get_cache_stats() -> Dict[str, int]:
     """Get statistics about the current cache state."""
     with cache_mutex:
         stats = {}
-        for source, entries in temperature_cache.items():
-            stats[source] = len(entries)
+        for source, ring in temperature_cache.items():
+            stats[source] = len(ring)
         return stats
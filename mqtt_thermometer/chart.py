@@ -0,0 +1,381 @@
+"""Vectorized chart series engine.
+
+Builds the per-minute chart series of a source from cached readings: applies
+calibration, limits the step between consecutive readings, interpolates
+short gaps and appends the latest live reading. Values are float64 arrays
+with NaN marking minutes without data.
+"""
+
+import math
+import threading
+from array import array
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from mqtt_thermometer import cache, database
+
+# Largest change allowed between consecutive readings, in °C
+MAX_STEP = 0.5
+# Gaps up to this many minutes are interpolated
+MAX_GAP_MINUTES = 10
+# Columnar chart values are serialized with this many decimals
+DISPLAY_DECIMALS = 2
+# Float error is far below this many decimals, and the Decimal results of
+# the calibration and interpolation never have a tie there
+SNAP_DECIMALS = 9
+
+
+def calibrate(values: array, multiplier: float, offset: float) -> np.ndarray:
+    """Convert centi-degree readings to calibrated °C."""
+    centidegrees = np.frombuffer(values, dtype=np.int32) if len(values) else np.empty(0)
+    return centidegrees / 100 * multiplier + offset
+
+
+def round_values(series: np.ndarray, decimals: int = DISPLAY_DECIMALS) -> np.ndarray:
+    """Round half to even to the given decimals, like Decimal.quantize.
+
+    Values are first snapped to SNAP_DECIMALS, so float error cannot move a
+    value that is exactly halfway in decimal across the rounding boundary.
+    """
+    snapped = np.round(series * 10.0**SNAP_DECIMALS)
+    return np.round(snapped / 10.0 ** (SNAP_DECIMALS - decimals)) / 10.0**decimals
+
+
+def limit_steps(temperatures: np.ndarray, max_step: float = MAX_STEP) -> np.ndarray:
+    """Limit each value to within max_step of the previous limited value.
+
+    Readings normally change slowly, so only the runs following a jump are
+    walked one by one; everything else is copied as is.
+    """
+    limited = temperatures.copy()
+    jumps = np.flatnonzero(np.abs(np.diff(temperatures)) > max_step) + 1
+    position = 0
+    for jump in jumps:
+        if jump < position:
+            # Already walked while catching up after an earlier jump
+            continue
+        position = jump
+        while position < len(limited):
+            previous = limited[position - 1]
+            value = min(
+                max(temperatures[position], previous - max_step), previous + max_step
+            )
+            if value == temperatures[position]:
+                break
+            limited[position] = value
+            position += 1
+    return limited
+
+
+def interpolate_gaps(series: np.ndarray, max_gap: int = MAX_GAP_MINUTES) -> np.ndarray:
+    """Linearly fill NaN runs whose known neighbours are at most max_gap apart."""
+    known = np.flatnonzero(~np.isnan(series))
+    if len(known) < 2:
+        return series
+    missing = np.flatnonzero(np.isnan(series))
+    following = np.searchsorted(known, missing)
+    inside = (following > 0) & (following < len(known))
+    missing, following = missing[inside], following[inside]
+    fillable = known[following] - known[following - 1] <= max_gap
+    missing = missing[fillable]
+    series[missing] = np.interp(missing, known, series[known])
+    return series
+
+
+def build_series(
+    minutes: array,
+    values: array,
+    since_minute: int,
+    slots: int,
+    multiplier: float,
+    offset: float,
+    latest_temperature: float | None = None,
+) -> np.ndarray:
+    """Build the chart series for slots minutes starting at since_minute.
+
+    The last slot is the current minute. latest_temperature is the already
+    calibrated live reading, which is placed in the current minute.
+    """
+    temperatures = limit_steps(calibrate(values, multiplier, offset))
+
+    series = np.full(slots, np.nan)
+    indexes = (
+        np.frombuffer(minutes, dtype=np.int64) - since_minute
+        if len(minutes)
+        else np.empty(0, dtype=np.int64)
+    )
+    inside = (indexes >= 0) & (indexes < slots)
+    series[indexes[inside]] = temperatures[inside]
+    interpolate_gaps(series)
+
+    if latest_temperature is not None:
+        apply_latest(
+            series,
+            temperatures[-1] if len(temperatures) else None,
+            latest_temperature,
+        )
+    return series
+
+
+def apply_latest(
+    series: np.ndarray, last_temperature: float | None, latest_temperature: float
+):
+    """Place the live reading in the current (last) minute of the series.
+
+    A short gap between the last value and the current minute is bridged
+    linearly, and the live value is step limited against last_temperature,
+    the limited value of the newest cached reading.
+    """
+    current = len(series) - 1
+    known = np.flatnonzero(~np.isnan(series))
+    if len(known):
+        last = known[-1]
+        gap = current - last
+        # Bridge a short gap between the last reading and the live value
+        if 1 < gap <= MAX_GAP_MINUTES:
+            progress = np.arange(1, gap) / gap
+            series[last + 1 : current] = (
+                series[last] + (latest_temperature - series[last]) * progress
+            )
+    if last_temperature is not None:
+        latest_temperature = min(
+            max(latest_temperature, last_temperature - MAX_STEP),
+            last_temperature + MAX_STEP,
+        )
+    series[current] = latest_temperature
+
+
+def changed_slots(
+    previous: np.ndarray,
+    previous_since_minute: int,
+    current: np.ndarray,
+    current_since_minute: int,
+) -> np.ndarray:
+    """Indexes of the current series whose value differs from the previous one.
+
+    The previous series may start earlier; minutes it did not cover count as
+    changed.
+    """
+    changed = np.ones(len(current), dtype=bool)
+    shift = current_since_minute - previous_since_minute
+    if 0 <= shift < len(previous):
+        overlap = min(len(previous) - shift, len(current))
+        old = previous[shift : shift + overlap]
+        new = current[:overlap]
+        changed[:overlap] = ~((old == new) | (np.isnan(old) & np.isnan(new)))
+    return np.flatnonzero(changed)
+
+
+@lru_cache(maxsize=4)
+def iso_timestamps(since_minute: int, slots: int) -> tuple[str, ...]:
+    """ISO-8601 keys of a minute grid, shared by all sources."""
+    since = database.from_epoch_seconds(since_minute * 60)
+    return tuple(
+        (since + timedelta(minutes=index)).isoformat() for index in range(slots)
+    )
+
+
+def to_json_data(series: np.ndarray, since_minute: int) -> dict[str, float | None]:
+    """Map ISO timestamps to values, with None for minutes without data."""
+    return dict(
+        zip(
+            iso_timestamps(since_minute, len(series)),
+            [None if math.isnan(value) else value for value in series.tolist()],
+        )
+    )
+
+
+def to_columnar_values(
+    series: np.ndarray, decimals: int = DISPLAY_DECIMALS
+) -> list[float | None]:
+    """Values rounded to the display precision, with None for minutes without data."""
+    return [
+        None if math.isnan(value) else value
+        for value in round_values(series, decimals).tolist()
+    ]
+
+
+class SourceGrid:
+    """Materialized minute grid of one source, maintained incrementally.
+
+    Keeps the calibrated readings, their step limited values and the
+    interpolated series for the chart window. A new reading only re-limits
+    the readings after it until the limited values converge again, and only
+    re-interpolates between the known readings around the change. Moving
+    the window forward shifts the arrays and restarts the step limiting at
+    the first reading left in the window.
+    """
+
+    def __init__(self, source: str, multiplier: float, offset: float, slots: int):
+        self.source = source
+        self.multiplier = multiplier
+        self.offset = offset
+        self.slots = slots
+        self.since_minute: int | None = None
+        self.generation = -1
+        self.stale = True
+        # Incremented whenever the series changes
+        self.version = 0
+        self.raw = np.full(slots, np.nan)
+        self.limited = np.full(slots, np.nan)
+        self.series = np.full(slots, np.nan)
+        self.last_temperature: float | None = None
+
+    def rebuild(self, since_minute: int, generation: int):
+        """Recompute the whole grid from the cache."""
+        minutes, values = cache.get_readings(
+            self.source, database.from_epoch_seconds(since_minute * 60)
+        )
+        temperatures = calibrate(values, self.multiplier, self.offset)
+        limited = limit_steps(temperatures)
+        indexes = (
+            np.frombuffer(minutes, dtype=np.int64) - since_minute
+            if len(minutes)
+            else np.empty(0, dtype=np.int64)
+        )
+        inside = indexes < self.slots
+
+        self.since_minute = since_minute
+        self.generation = generation
+        # Readings beyond the window affect the step limiting of the live
+        # value, so keep rebuilding until the window reaches them
+        self.stale = not inside.all()
+        self.raw.fill(np.nan)
+        self.raw[indexes[inside]] = temperatures[inside]
+        self.limited.fill(np.nan)
+        self.limited[indexes[inside]] = limited[inside]
+        self.series[:] = self.limited
+        interpolate_gaps(self.series)
+        self.last_temperature = float(limited[-1]) if len(limited) else None
+        self.version += 1
+
+    def slide(self, since_minute: int):
+        """Move the window forward to start at since_minute."""
+        assert self.since_minute is not None
+        shift = since_minute - self.since_minute
+        if shift < 0 or shift >= self.slots:
+            self.rebuild(since_minute, self.generation)
+            return
+        if shift == 0:
+            return
+        for values in (self.raw, self.limited, self.series):
+            values[:-shift] = values[shift:]
+            values[-shift:] = np.nan
+        self.since_minute = since_minute
+
+        known = np.flatnonzero(~np.isnan(self.raw))
+        if len(known):
+            first = known[0]
+            # Nothing before the first reading in the window to interpolate from
+            self.series[:first] = np.nan
+            # The step limiting chain now starts at the first reading
+            if self.limited[first] != self.raw[first]:
+                self._relimit(first)
+        else:
+            self.last_temperature = None
+        self.version += 1
+
+    def add_reading(self, minute: int, centidegrees: int):
+        """Apply a reading that was added to the cache."""
+        assert self.since_minute is not None
+        index = minute - self.since_minute
+        if index < 0:
+            return
+        if index >= self.slots:
+            self.stale = True
+            return
+        self.raw[index] = centidegrees / 100 * self.multiplier + self.offset
+        self._relimit(index)
+        self.version += 1
+
+    def _relimit(self, start: int):
+        known = np.flatnonzero(~np.isnan(self.raw))
+        first_position = int(np.searchsorted(known, start))
+        previous = (
+            self.limited[known[first_position - 1]] if first_position > 0 else None
+        )
+
+        last_changed = first_position
+        for position in range(first_position, len(known)):
+            index = known[position]
+            value = self.raw[index]
+            if previous is not None:
+                value = min(max(value, previous - MAX_STEP), previous + MAX_STEP)
+            if index > start and value == self.limited[index]:
+                # Converged, the rest of the chain is unchanged
+                break
+            self.limited[index] = value
+            previous = value
+            last_changed = position
+
+        # Re-interpolate between the unchanged readings around the change
+        begin = known[first_position - 1] if first_position > 0 else 0
+        end = (
+            known[last_changed + 1] + 1 if last_changed + 1 < len(known) else self.slots
+        )
+        region = self.limited[begin:end].copy()
+        self.series[begin:end] = interpolate_gaps(region)
+        self.last_temperature = float(self.limited[known[-1]])
+
+    def get_series(self, latest_temperature: float | None) -> np.ndarray:
+        """Return a copy of the series with the live value applied."""
+        series = self.series.copy()
+        if latest_temperature is not None:
+            apply_latest(series, self.last_temperature, latest_temperature)
+        return series
+
+
+class ChartGrids:
+    """Minute grids of all charted sources, fed by cache updates."""
+
+    # Pending readings per grid beyond which a rebuild is cheaper
+    MAX_PENDING = 120
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self._grids: dict[tuple[str, float, float], SourceGrid] = {}
+        self._grids_by_source: dict[str, list[SourceGrid]] = {}
+        self._pending: dict[SourceGrid, list[tuple[int, int]]] = {}
+        self._pending_lock = threading.Lock()
+        cache.reading_listeners.append(self._on_reading)
+
+    def _on_reading(self, source: str, minute: int, centidegrees: int):
+        # Runs in the writer thread; readings are applied on the next read
+        with self._pending_lock:
+            for grid in self._grids_by_source.get(source, []):
+                pending = self._pending[grid]
+                if len(pending) < self.MAX_PENDING:
+                    pending.append((minute, centidegrees))
+                else:
+                    pending.clear()
+                    grid.stale = True
+
+    def get_grid(
+        self, source: str, multiplier: float, offset: float, since_minute: int
+    ) -> SourceGrid:
+        """Return the grid of a source, brought up to date for the window."""
+        key = (source, multiplier, offset)
+        with self._pending_lock:
+            grid = self._grids.get(key)
+            if grid is None:
+                grid = SourceGrid(source, multiplier, offset, self.slots)
+                self._grids[key] = grid
+                self._grids_by_source.setdefault(source, []).append(grid)
+            # Everything pending is already in the cache, so a rebuild
+            # started after this point covers it as well
+            pending = self._pending.get(grid, [])
+            self._pending[grid] = []
+
+        generation = cache.cache_generation
+        if grid.stale or grid.generation != generation or grid.since_minute is None:
+            grid.rebuild(since_minute, generation)
+            return grid
+
+        grid.slide(since_minute)
+        for minute, centidegrees in pending:
+            grid.add_reading(minute, centidegrees)
+        if grid.stale:
+            grid.rebuild(since_minute, generation)
+        return grid
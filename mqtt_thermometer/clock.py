@@ -0,0 +1,150 @@
+"""Current time of the application, replaceable for replays and tests.
+
+Code that needs the wall clock calls ``clock.now()`` instead of
+``datetime.now(tz=UTC)``. ``set_clock`` installs another clock, e.g. a
+``SimulatedClock`` that a replay moves forward faster than real time.
+"""
+
+import asyncio
+import heapq
+import itertools
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
+from typing import Protocol
+
+
+class Timer(Protocol):
+    def cancel(self): ...
+
+
+class Clock(Protocol):
+    def now(self) -> datetime: ...
+
+    def monotonic(self) -> float: ...
+
+    async def sleep(self, seconds: float): ...
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Timer: ...
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now(tz=UTC)
+
+    def monotonic(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Timer:
+        return asyncio.get_running_loop().call_later(delay, callback)
+
+
+class _SimulatedTimer:
+    __slots__ = ("callback", "cancelled")
+
+    def __init__(self, callback: Callable[[], object]):
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SimulatedClock:
+    """Clock that only moves when told to.
+
+    Timers run once the clock has been moved past their deadline, in
+    deadline order, with the clock showing the deadline. A sleeping task is
+    only woken by its timer and resumes after ``advance_to`` has returned,
+    so it sees the time the clock was moved to, not its own deadline. Must
+    be used from the event loop thread.
+    """
+
+    def __init__(self, start: datetime):
+        self._now = start
+        self._timers: list[tuple[datetime, int, _SimulatedTimer]] = []
+        self._order = itertools.count()
+
+    def now(self) -> datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._now.timestamp()
+
+    def advance_to(self, timestamp: datetime):
+        """Move the clock forward, running the timers that are due.
+
+        Woken tasks run once the caller yields to the event loop.
+        """
+        while self._timers and self._timers[0][0] <= timestamp:
+            deadline, _, timer = heapq.heappop(self._timers)
+            self._now = max(self._now, deadline)
+            if not timer.cancelled:
+                timer.callback()
+        self._now = max(self._now, timestamp)
+
+    def advance(self, seconds: float):
+        self.advance_to(self._now + timedelta(seconds=seconds))
+
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        timer = self.call_later(
+            seconds, lambda: future.done() or future.set_result(None)
+        )
+        try:
+            await future
+        finally:
+            timer.cancel()
+
+    def call_later(self, delay: float, callback: Callable[[], object]) -> Timer:
+        timer = _SimulatedTimer(callback)
+        deadline = self._now + timedelta(seconds=max(delay, 0))
+        heapq.heappush(self._timers, (deadline, next(self._order), timer))
+        return timer
+
+
+_clock: Clock = SystemClock()
+
+
+def now() -> datetime:
+    """Current time, timezone aware in UTC."""
+    return _clock.now()
+
+
+def monotonic() -> float:
+    """Seconds for measuring intervals, not related to the calendar time."""
+    return _clock.monotonic()
+
+
+async def sleep(seconds: float):
+    await _clock.sleep(seconds)
+
+
+def call_later(delay: float, callback: Callable[[], object]) -> Timer:
+    return _clock.call_later(delay, callback)
+
+
+def get_clock() -> Clock:
+    return _clock
+
+
+def set_clock(clock: Clock):
+    global _clock
+    _clock = clock
+
+
+@contextmanager
+def use_clock(clock: Clock) -> Iterator[Clock]:
+    """Use the given clock within the block, then restore the previous one."""
+    previous = _clock
+    set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
@@ -0,0 +1,240 @@
+"""Response and websocket message compression.
+
+HTTP responses are compressed with brotli, if the optional brotli package
+is installed and the client accepts it, or with gzip. Websocket messages
+are compressed once into raw deflate and the same bytes are sent to every
+client that asked for compressed frames.
+"""
+
+import time
+import zlib
+from collections.abc import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from mqtt_thermometer.settings import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+
+class CompressionStats:
+    """Bytes in and out and CPU time spent per encoding."""
+
+    def __init__(self):
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        stats = self._stats.setdefault(
+            encoding, {"count": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+        )
+        stats["count"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["cpu_seconds"] += seconds
+
+    def get_stats(self) -> dict[str, dict[str, float]]:
+        return {
+            encoding: {
+                **stats,
+                "ratio": round(stats["bytes_out"] / stats["bytes_in"], 3)
+                if stats["bytes_in"]
+                else None,
+            }
+            for encoding, stats in self._stats.items()
+        }
+
+
+stats = CompressionStats()
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Best supported encoding of an Accept-Encoding header, or None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Streaming compressor of one response body."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=brotli_quality)
+            self._process: Callable[[bytes], bytes] = compressor.process
+            self._finish: Callable[[], bytes] = compressor.finish
+        else:
+            # wbits 31 writes the gzip header and trailer
+            compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._process = compressor.compress
+            self._finish = compressor.flush
+        self.encoding = encoding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def compress(self, data: bytes, finish: bool) -> bytes:
+        started = time.thread_time()
+        compressed = self._process(data)
+        if finish:
+            compressed += self._finish()
+        self.seconds += time.thread_time() - started
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        if finish:
+            stats.record(self.encoding, self.bytes_in, self.bytes_out, self.seconds)
+        return compressed
+
+
+class CompressionMiddleware:
+    """Compresses text and JSON responses of at least minimum_size bytes.
+
+    Like Starlette's GZipMiddleware, with brotli and compression stats.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 5,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        # A client revalidating an encoded copy sent its encoded entity tag
+        revalidating_encoded = encoding is not None and _strip_encoded_etags(
+            scope, encoding
+        )
+
+        start_message: Message | None = None
+        compressor: _Compressor | None = None
+
+        async def send_compressed(message: Message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                if message["status"] == 304:
+                    headers = MutableHeaders(raw=message["headers"])
+                    headers.add_vary_header("Accept-Encoding")
+                    if revalidating_encoded:
+                        _set_encoded_etag(headers, encoding)
+                    await send(message)
+                    return
+                # Wait for the first body chunk to decide
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if start_message is not None:
+                first_message, start_message = start_message, None
+                headers = MutableHeaders(raw=first_message["headers"])
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if "content-encoding" in headers or not headers.get(
+                    "content-type", ""
+                ).startswith(COMPRESSIBLE_CONTENT_TYPES):
+                    await send(first_message)
+                    await send(message)
+                    return
+                # Caches must not serve this to clients accepting another encoding
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is None or (
+                    not more_body and len(body) < self.minimum_size
+                ):
+                    await send(first_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                body = compressor.compress(body, finish=not more_body)
+                headers["Content-Encoding"] = encoding
+                _set_encoded_etag(headers, encoding)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(first_message)
+                await send({**message, "body": body})
+                return
+            if compressor is None:
+                await send(message)
+                return
+            more_body = message.get("more_body", False)
+            body = compressor.compress(message.get("body", b""), finish=not more_body)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _set_encoded_etag(headers: MutableHeaders, encoding: str):
+    """Give the encoded body its own entity tag, e.g. "abc" -> "abc-gzip"."""
+    etag = headers.get("etag")
+    if etag and etag.endswith('"'):
+        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+
+
+def _strip_encoded_etags(scope: Scope, encoding: str) -> bool:
+    """Turn If-None-Match tags of the encoding back into the app's tags.
+
+    Returns True if any tag was changed.
+    """
+    suffix = f'-{encoding}"'.encode()
+    stripped = False
+    headers = []
+    for name, value in scope["headers"]:
+        if name == b"if-none-match" and suffix in value:
+            value = value.replace(suffix, b'"')
+            stripped = True
+        headers.append((name, value))
+    if stripped:
+        scope["headers"] = headers
+    return stripped
+
+
+def compress_message(message: str) -> bytes:
+    """Compress a websocket message into raw deflate.
+
+    Every message is compressed on its own, without a shared context, so
+    the result can be sent to any number of clients as is.
+    """
+    started = time.thread_time()
+    compressor = zlib.compressobj(
+        settings.compression.websocket_level,
+        zlib.DEFLATED,
+        -settings.compression.websocket_window_bits,
+    )
+    data = message.encode()
+    compressed = compressor.compress(data) + compressor.flush()
+    stats.record("websocket", len(data), len(compressed), time.thread_time() - started)
+    return compressed
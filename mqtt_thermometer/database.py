@@ -1,16 +1,20 @@
 import logging
+import queue
 import sqlite3
 import threading
+import time
+from collections.abc import Iterator
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 from pathlib import Path
 
+from mqtt_thermometer import clock
 from mqtt_thermometer.settings import settings
 
 logger = logging.getLogger(__name__)
 
-# Create a mutex for database operations
+# Serializes all writes through the shared writer connection
 db_mutex = threading.RLock()
 
 
@@ -34,117 +38,790 @@ sqlite3.register_adapter(Decimal, adapt_decimal)
 sqlite3.register_converter("DECTEXT", convert_decimal)
 
 
+# Pragmas applied to every connection. The Raspberry Pi runs from an SD card,
+# so favour WAL with NORMAL sync (durable at checkpoint, no fsync per commit)
+# and keep hot pages in memory.
+CACHE_SIZE_KIB = 8 * 1024
+MMAP_SIZE_BYTES = 64 * 1024 * 1024
+BUSY_TIMEOUT_SECONDS = 10.0
+# Statements executed with identical SQL text are reused from this cache
+STATEMENT_CACHE_SIZE = 64
+READER_POOL_SIZE = 2
+
+# Schema version 2 stores readings as integers: epoch seconds and
+# centi-degrees, keyed by (source_id, timestamp) in a WITHOUT ROWID table.
+# Version 0/1 databases have the legacy TEXT based "temperature" table, which
+# is migrated in the background by migrate_legacy_data(). Version 3 adds the
+# minimum, maximum and count of the readings aggregated into each minute.
+# Version 4 adds the rollup table.
+SCHEMA_VERSION = 4
+MIGRATION_BATCH_SIZE = 5000
+RETENTION_BATCH_SIZE = 1000
+WARMUP_BATCH_SIZE = 5000
+VACUUM_BATCH_PAGES = 256
+AUTO_VACUUM_INCREMENTAL = 2
+# Databases up to this size are converted to incremental vacuum automatically
+VACUUM_CONVERSION_MAX_BYTES = 64 * 1024 * 1024
+
+INSERT_SOURCE_SQL = "INSERT INTO source (name) VALUES (?) ON CONFLICT (name) DO NOTHING"
+SELECT_SOURCE_ID_SQL = "SELECT id FROM source WHERE name=?"
+UPSERT_READING_SQL = (
+    "INSERT INTO reading (source_id, timestamp, temperature, minimum, maximum, count) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (source_id, timestamp) DO UPDATE SET "
+    "temperature=excluded.temperature, minimum=excluded.minimum, "
+    "maximum=excluded.maximum, count=excluded.count"
+)
+# Columns added in schema version 3, NULL for readings saved before it
+AGGREGATE_COLUMNS = {
+    "minimum": "INTEGER",  # Centi-degrees
+    "maximum": "INTEGER",  # Centi-degrees
+    "count": "INTEGER",
+}
+# Rollup resolutions in seconds: 5 minutes, an hour and a (UTC) day. Each
+# level is recomputed from the one before it, the first from the readings.
+ROLLUP_RESOLUTIONS = (5 * 60, 60 * 60, 24 * 60 * 60)
+ROLLUP_BACKFILL_CHUNK_SECONDS = 7 * 24 * 60 * 60
+# Averages are weighted by the number of minutes in each row. Rollups are
+# refreshed one source at a time, so both queries are range seeks on the
+# primary key instead of scans of the whole table.
+ROLLUP_FROM_READINGS_SQL = (
+    "INSERT INTO rollup "
+    "(resolution, source_id, timestamp, minimum, average, maximum, count) "
+    "SELECT ?1, source_id, timestamp / ?1 * ?1, "
+    "min(coalesce(minimum, temperature)), CAST(round(avg(temperature)) AS INTEGER), "
+    "max(coalesce(maximum, temperature)), count(*) "
+    "FROM reading WHERE source_id = ?4 AND timestamp >= ?2 AND timestamp < ?3 "
+    "GROUP BY timestamp / ?1 "
+    "ON CONFLICT (resolution, source_id, timestamp) DO UPDATE SET "
+    "minimum=excluded.minimum, average=excluded.average, "
+    "maximum=excluded.maximum, count=excluded.count"
+)
+ROLLUP_FROM_ROLLUP_SQL = (
+    "INSERT INTO rollup "
+    "(resolution, source_id, timestamp, minimum, average, maximum, count) "
+    "SELECT ?1, source_id, timestamp / ?1 * ?1, min(minimum), "
+    "CAST(round(sum(average * count) * 1.0 / sum(count)) AS INTEGER), "
+    "max(maximum), sum(count) "
+    "FROM rollup "
+    "WHERE resolution = ?4 AND source_id = ?5 AND timestamp >= ?2 AND timestamp < ?3 "
+    "GROUP BY timestamp / ?1 "
+    "ON CONFLICT (resolution, source_id, timestamp) DO UPDATE SET "
+    "minimum=excluded.minimum, average=excluded.average, "
+    "maximum=excluded.maximum, count=excluded.count"
+)
+SELECT_ROLLUPS_SQL = (
+    "SELECT timestamp, minimum, average, maximum, count FROM rollup "
+    "WHERE resolution=? AND source_id=? AND timestamp >= ? ORDER BY timestamp"
+)
+# One range seek on the primary key per source, rows come out grouped by
+# source in time order, already as epoch minutes and centi-degrees
+SELECT_RECENT_READINGS_SQL = (
+    "SELECT source.name, reading.timestamp / 60, reading.temperature "
+    "FROM source JOIN reading ON reading.source_id = source.id "
+    "WHERE reading.timestamp >= ? AND reading.timestamp < ? "
+    "ORDER BY source.id, reading.timestamp"
+)
+# Newest reading timestamp, a primary key lookup per source
+SELECT_HIGH_WATER_MARK_SQL = (
+    "SELECT MAX((SELECT MAX(timestamp) FROM reading WHERE source_id = source.id)) "
+    "FROM source"
+)
+# Oldest reading before a timestamp, a primary key range seek per source
+SELECT_OLDEST_READING_BEFORE_SQL = (
+    "SELECT MIN((SELECT MIN(timestamp) FROM reading "
+    "WHERE source_id = source.id AND timestamp < ?)) FROM source"
+)
+SELECT_READINGS_SQL = (
+    "SELECT timestamp, temperature FROM reading "
+    "WHERE source_id=? AND timestamp >= ? ORDER BY timestamp"
+)
+
+
+class ConnectionManager:
+    """Long-lived SQLite connections: one writer and a small pool of readers.
+
+    Writes are serialized with ``db_mutex``. Readers use their own read-only
+    connections, so with WAL they never wait for the writer.
+    """
+
+    def __init__(self, database_path: str, reader_pool_size: int = READER_POOL_SIZE):
+        self.database_path = database_path
+        self._writer: sqlite3.Connection | None = None
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(reader_pool_size)
+        self._all_readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        # Interned source ids, only touched while holding db_mutex
+        self.source_ids: dict[str, int] = {}
+
+    def _connect(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            uri = Path(self.database_path).absolute().as_uri() + "?mode=ro"
+            connection = sqlite3.connect(
+                uri,
+                uri=True,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                timeout=BUSY_TIMEOUT_SECONDS,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
+            connection.execute("PRAGMA query_only=ON")
+        else:
+            # Ensure the directory exists for the database file
+            Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                self.database_path,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                timeout=BUSY_TIMEOUT_SECONDS,
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
+            # Takes effect for new databases only, existing ones are
+            # converted with a one-time VACUUM by enable_incremental_vacuum()
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA temp_store=MEMORY")
+        connection.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+        connection.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        return connection
+
+    def _get_writer(self) -> sqlite3.Connection:
+        with db_mutex:
+            if self._writer is None:
+                self._writer = self._connect(read_only=False)
+            return self._writer
+
+    @contextmanager
+    def writer(self):
+        with db_mutex:
+            connection = self._get_writer()
+            try:
+                yield connection
+            except sqlite3.Error as e:
+                logger.error(f"Database error: {e}")
+                self._rollback(connection)
+                raise
+            except Exception:
+                self._rollback(connection)
+                raise
+
+    def _rollback(self, connection: sqlite3.Connection):
+        connection.rollback()
+        # Source ids interned in the rolled back transaction no longer exist
+        self.source_ids.clear()
+
+    @contextmanager
+    def reader(self):
+        # The writer creates the database file and switches it to WAL mode,
+        # which read-only connections cannot do themselves
+        if self._writer is None:
+            self._get_writer()
+        with self._reader_slots:
+            try:
+                connection = self._readers.get_nowait()
+            except queue.Empty:
+                connection = self._connect(read_only=True)
+                with self._readers_lock:
+                    self._all_readers.append(connection)
+            try:
+                yield connection
+            except sqlite3.Error as e:
+                logger.error(f"Database error: {e}")
+                raise
+            finally:
+                if connection.in_transaction:
+                    connection.rollback()
+                self._readers.put(connection)
+
+    def close(self):
+        with db_mutex:
+            with self._readers_lock:
+                for connection in self._all_readers:
+                    connection.close()
+                self._all_readers.clear()
+            while not self._readers.empty():
+                self._readers.get_nowait()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_connection_manager: ConnectionManager | None = None
+
+
+def get_connection_manager() -> ConnectionManager:
+    """Return the connection manager for the configured database.
+
+    A new manager is created if the configured database path has changed,
+    e.g. when tests point the settings to a temporary database.
+    """
+    global _connection_manager
+    with db_mutex:
+        if (
+            _connection_manager is None
+            or _connection_manager.database_path != settings.db_connection_string
+        ):
+            if _connection_manager is not None:
+                _connection_manager.close()
+            _connection_manager = ConnectionManager(settings.db_connection_string)
+        return _connection_manager
+
+
+def close_connections():
+    """Close all long-lived database connections."""
+    global _connection_manager
+    with db_mutex:
+        if _connection_manager is not None:
+            _connection_manager.close()
+            _connection_manager = None
+
+
 @contextmanager
 def get_database_connection():
-    connection = None
-    try:
-        # Ensure the directory exists for the database file
-        db_path = Path(settings.db_connection_string)
-        db_path.parent.mkdir(parents=True, exist_ok=True)
+    """Borrow the shared writer connection. Writes are serialized."""
+    with get_connection_manager().writer() as connection:
+        yield connection
 
-        connection = sqlite3.connect(
-            settings.db_connection_string, detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        # Ensure our custom types are registered for this connection
-        connection.execute(
-            "PRAGMA table_info(temperature)"
-        )  # This helps ensure types are loaded
+
+@contextmanager
+def get_reader_connection():
+    """Borrow a read-only connection from the reader pool."""
+    with get_connection_manager().reader() as connection:
         yield connection
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        if connection:
-            connection.rollback()
-        raise
-    finally:
-        if connection:
-            connection.close()
 
 
 def create_table():
-    with db_mutex:
+    with get_database_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS source ("
+            "id INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL UNIQUE"
+            ")"
+        )
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS reading ("
+            "source_id INTEGER NOT NULL REFERENCES source (id), "
+            "timestamp INTEGER NOT NULL, "  # Epoch seconds
+            "temperature INTEGER NOT NULL, "  # Centi-degrees, minute average
+            "minimum INTEGER, "
+            "maximum INTEGER, "
+            "count INTEGER, "
+            "PRIMARY KEY (source_id, timestamp)"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(reading)")}
+        for column, column_type in AGGREGATE_COLUMNS.items():
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE reading ADD COLUMN {column} {column_type}")
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS rollup ("
+            "resolution INTEGER NOT NULL, "  # Seconds
+            "source_id INTEGER NOT NULL REFERENCES source (id), "
+            "timestamp INTEGER NOT NULL, "  # Epoch seconds, start of the period
+            "minimum INTEGER NOT NULL, "  # Centi-degrees
+            "average INTEGER NOT NULL, "
+            "maximum INTEGER NOT NULL, "
+            "count INTEGER NOT NULL, "  # Minutes with a reading
+            "PRIMARY KEY (resolution, source_id, timestamp)"
+            ") WITHOUT ROWID"
+        )
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS migration_state ("
+            "name TEXT PRIMARY KEY, "
+            "value INTEGER NOT NULL"
+            ")"
+        )
+        cursor.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        connection.commit()
+
+
+def to_epoch_seconds(timestamp: datetime) -> int:
+    return int(timestamp.timestamp())
+
+
+def from_epoch_seconds(epoch_seconds: int) -> datetime:
+    return datetime.fromtimestamp(epoch_seconds, tz=UTC)
+
+
+def to_centidegrees(temperature: Decimal) -> int:
+    return int((Decimal(temperature) * 100).to_integral_value())
+
+
+def from_centidegrees(centidegrees: int) -> Decimal:
+    return Decimal(centidegrees).scaleb(-2)
+
+
+def _get_source_id(connection: sqlite3.Connection, source: str) -> int:
+    """Return the interned id of a source, creating it if needed.
+
+    Must be called with the writer connection.
+    """
+    source_ids = get_connection_manager().source_ids
+    source_id = source_ids.get(source)
+    if source_id is None:
+        connection.execute(INSERT_SOURCE_SQL, (source,))
+        (source_id,) = connection.execute(SELECT_SOURCE_ID_SQL, (source,)).fetchone()
+        source_ids[source] = source_id
+    return source_id
+
+
+def _legacy_table_exists(connection: sqlite3.Connection) -> bool:
+    return (
+        connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='temperature'"
+        ).fetchone()
+        is not None
+    )
+
+
+def _parse_legacy_timestamp(timestamp_iso: str) -> int:
+    timestamp = datetime.fromisoformat(timestamp_iso)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=UTC)
+    return to_epoch_seconds(timestamp)
+
+
+def _touched_ranges(readings: list[tuple]) -> dict[int, tuple[int, int]]:
+    """First and last timestamp per source id of (source_id, timestamp, ...) rows."""
+    ranges: dict[int, tuple[int, int]] = {}
+    for source_id, timestamp, *_ in readings:
+        if source_id in ranges:
+            first, last = ranges[source_id]
+            ranges[source_id] = (min(first, timestamp), max(last, timestamp))
+        else:
+            ranges[source_id] = (timestamp, timestamp)
+    return ranges
+
+
+def _refresh_rollups(
+    connection: sqlite3.Connection, ranges: dict[int, tuple[int, int]]
+):
+    """Recompute every rollup period overlapping [start, end] epoch seconds.
+
+    ranges maps a source id to its (start, end). Periods are recomputed
+    from scratch from the finer level, so refreshing the same period again
+    is harmless.
+    """
+    for source_id, (start, end) in ranges.items():
+        finer = None
+        for resolution in ROLLUP_RESOLUTIONS:
+            period_start = start // resolution * resolution
+            period_end = end // resolution * resolution + resolution
+            if finer is None:
+                connection.execute(
+                    ROLLUP_FROM_READINGS_SQL,
+                    (resolution, period_start, period_end, source_id),
+                )
+            else:
+                connection.execute(
+                    ROLLUP_FROM_ROLLUP_SQL,
+                    (resolution, period_start, period_end, finer, source_id),
+                )
+            finer = resolution
+
+
+def backfill_rollups(stop_event: threading.Event | None = None) -> bool:
+    """Compute the rollups of readings saved before rollups existed.
+
+    Runs once per database, a week of readings per transaction. Progress is
+    stored in the migration_state table, so an interrupted backfill resumes.
+    Returns True once the backfill is complete.
+    """
+    while stop_event is None or not stop_event.is_set():
         with get_database_connection() as connection:
             cursor = connection.cursor()
+            state = cursor.execute(
+                "SELECT value FROM migration_state WHERE name='rollup_backfill'"
+            ).fetchone()
+            if state is None:
+                # Start from the newest reading and work backwards
+                (newest,) = cursor.execute(SELECT_HIGH_WATER_MARK_SQL).fetchone()
+                state = ((newest if newest is not None else 0) + 1,)
+            elif state[0] < 0:
+                return True
+            end = state[0]
+            start = end - ROLLUP_BACKFILL_CHUNK_SECONDS
+            (oldest,) = cursor.execute(
+                SELECT_OLDEST_READING_BEFORE_SQL, (end,)
+            ).fetchone()
+            if oldest is not None:
+                source_ids = [row[0] for row in cursor.execute("SELECT id FROM source")]
+                _refresh_rollups(
+                    connection,
+                    dict.fromkeys(source_ids, (max(start, oldest), end - 1)),
+                )
+            done = oldest is None or oldest >= start
             cursor.execute(
-                "CREATE TABLE IF NOT EXISTS temperature ("
-                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
-                "source TEXT, "
-                "timestamp TEXT, "
-                "temperature DECTEXT"
-                ")"
+                "INSERT INTO migration_state (name, value) "
+                "VALUES ('rollup_backfill', ?) "
+                "ON CONFLICT (name) DO UPDATE SET value=excluded.value",
+                (-1 if done else start,),
             )
-            cursor.execute(
-                "CREATE INDEX IF NOT EXISTS timestamp_index ON temperature (timestamp)"
+            connection.commit()
+        if done:
+            logger.info("Rollup backfill complete")
+            return True
+    return False
+
+
+def enable_incremental_vacuum(
+    force: bool = False, max_bytes: int = VACUUM_CONVERSION_MAX_BYTES
+) -> bool:
+    """Convert the database to auto_vacuum=INCREMENTAL if it is not already.
+
+    Rewrites the whole database file while holding the write connection, so
+    only databases up to max_bytes are converted unless forced. Returns True
+    if it was converted.
+    """
+    with get_database_connection() as connection:
+        (auto_vacuum,) = connection.execute("PRAGMA auto_vacuum").fetchone()
+        if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+            return False
+        (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+        (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+        size = page_size * page_count
+        if not force and size > max_bytes:
+            logger.warning(
+                f"Not converting the {size} byte database to incremental vacuum, "
+                "set retention.convert_to_incremental_vacuum to convert it"
+            )
+            return False
+        logger.info(f"Converting the {size} byte database to incremental vacuum")
+        started = time.perf_counter()
+        connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.execute("VACUUM")
+        logger.info(
+            "Converted database to incremental vacuum in "
+            f"{time.perf_counter() - started:.1f} seconds"
+        )
+        return True
+
+
+def _delete_expired_batch(
+    connection: sqlite3.Connection,
+    resolution: int | None,
+    source_id: int,
+    cutoff: int,
+    batch_size: int,
+) -> int:
+    """Delete up to batch_size of the oldest rows of a source before cutoff.
+
+    Rows are deleted by primary key range. resolution None means readings.
+    """
+    if resolution is None:
+        table, condition, params = "reading", "source_id=?", (source_id,)
+    else:
+        table, condition = "rollup", "resolution=? AND source_id=?"
+        params = (resolution, source_id)
+    last = connection.execute(
+        f"SELECT timestamp FROM {table} WHERE {condition} AND timestamp < ? "
+        "ORDER BY timestamp LIMIT 1 OFFSET ?",
+        (*params, cutoff, batch_size - 1),
+    ).fetchone()
+    until = last[0] + 1 if last is not None else cutoff
+    return connection.execute(
+        f"DELETE FROM {table} WHERE {condition} AND timestamp < ?",
+        (*params, until),
+    ).rowcount
+
+
+def incremental_vacuum() -> int:
+    """Return free pages to the file system. Returns the bytes reclaimed."""
+    reclaimed_pages = 0
+    while True:
+        with get_database_connection() as connection:
+            (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+            (before,) = connection.execute("PRAGMA page_count").fetchone()
+            connection.execute(
+                f"PRAGMA incremental_vacuum({VACUUM_BATCH_PAGES})"
+            ).fetchall()
+            (after,) = connection.execute("PRAGMA page_count").fetchone()
+        reclaimed_pages += before - after
+        if before - after < VACUUM_BATCH_PAGES:
+            return reclaimed_pages * page_size
+
+
+def prune_expired(
+    retention_days: dict[int | None, int | None],
+    batch_size: int = RETENTION_BATCH_SIZE,
+    stop_event: threading.Event | None = None,
+) -> int:
+    """Delete readings and rollups older than their retention period.
+
+    retention_days maps a rollup resolution, or None for the minute
+    readings, to the number of days to keep; None keeps everything. Rows
+    are deleted in small transactions so live writes are not held up.
+    Returns the number of rows deleted.
+    """
+    now = clock.now()
+    with get_reader_connection() as connection:
+        source_ids = [row[0] for row in connection.execute("SELECT id FROM source")]
+    pruned = 0
+    for resolution, days in retention_days.items():
+        if days is None:
+            continue
+        cutoff = to_epoch_seconds(now - timedelta(days=days))
+        for source_id in source_ids:
+            while stop_event is None or not stop_event.is_set():
+                with get_database_connection() as connection:
+                    deleted = _delete_expired_batch(
+                        connection, resolution, source_id, cutoff, batch_size
+                    )
+                    connection.commit()
+                pruned += deleted
+                if deleted < batch_size:
+                    break
+    if pruned:
+        logger.info(f"Pruned {pruned} expired rows")
+    return pruned
+
+
+def migrate_legacy_data(
+    batch_size: int = MIGRATION_BATCH_SIZE,
+    stop_before: datetime | None = None,
+    stop_event: threading.Event | None = None,
+) -> int:
+    """Copy rows from the legacy "temperature" table into the v2 schema.
+
+    Rows are migrated newest first in small transactions, so the writer is
+    only held briefly and live writes can continue in between. Progress is
+    stored in the migration_state table and an interrupted migration resumes
+    where it stopped. Rows already present in the v2 table are kept as is.
+    The legacy table is dropped once everything has been copied.
+
+    If stop_before is given, returns once all rows newer than it have been
+    migrated. Setting stop_event interrupts the migration between batches.
+    Returns the number of rows migrated.
+    """
+    migrated = 0
+    while stop_event is None or not stop_event.is_set():
+        with get_database_connection() as connection:
+            if not _legacy_table_exists(connection):
+                return migrated
+
+            cursor = connection.cursor()
+            state = cursor.execute(
+                "SELECT value FROM migration_state WHERE name='legacy_temperature'"
+            ).fetchone()
+            if state is None:
+                cursor.execute(
+                    "SELECT id, source, timestamp, CAST(temperature AS TEXT) "
+                    "FROM temperature ORDER BY id DESC LIMIT ?",
+                    (batch_size,),
+                )
+            else:
+                cursor.execute(
+                    "SELECT id, source, timestamp, CAST(temperature AS TEXT) "
+                    "FROM temperature WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (state[0], batch_size),
+                )
+            rows = cursor.fetchall()
+
+            if not rows:
+                cursor.execute("DROP TABLE temperature")
+                cursor.execute(
+                    "DELETE FROM migration_state WHERE name='legacy_temperature'"
+                )
+                connection.commit()
+                logger.info("Legacy temperature table migrated and dropped")
+                return migrated
+
+            readings = []
+            oldest_timestamp = None
+            for _, source, timestamp_iso, temperature in rows:
+                try:
+                    timestamp = _parse_legacy_timestamp(timestamp_iso)
+                    readings.append(
+                        (
+                            _get_source_id(connection, source),
+                            timestamp,
+                            to_centidegrees(Decimal(temperature)),
+                        )
+                    )
+                except (TypeError, ValueError, ArithmeticError) as e:
+                    logger.warning(f"Skipping invalid legacy row {source}: {e}")
+                    continue
+                if oldest_timestamp is None or timestamp < oldest_timestamp:
+                    oldest_timestamp = timestamp
+
+            cursor.executemany(
+                "INSERT INTO reading (source_id, timestamp, temperature) "
+                "VALUES (?, ?, ?) ON CONFLICT (source_id, timestamp) DO NOTHING",
+                readings,
             )
+            _refresh_rollups(connection, _touched_ranges(readings))
             cursor.execute(
-                "CREATE INDEX IF NOT EXISTS source_index ON temperature (source)"
+                "INSERT INTO migration_state (name, value) "
+                "VALUES ('legacy_temperature', ?) "
+                "ON CONFLICT (name) DO UPDATE SET value=excluded.value",
+                (rows[-1][0],),
             )
             connection.commit()
 
+        migrated += len(rows)
+        logger.info(f"Migrated {migrated} legacy temperature rows")
+        if (
+            stop_before is not None
+            and oldest_timestamp is not None
+            and oldest_timestamp <= to_epoch_seconds(stop_before)
+        ):
+            return migrated
+    return migrated
+
 
 def save_temperature(source: str, timestamp: datetime, temperature: Decimal) -> bool:
     """Save a temperature reading to the database and cache.
 
+    Returns True if successful, False otherwise.
+    """
+    return save_temperatures([(source, timestamp, temperature)])
+
+
+def _to_reading_row(connection: sqlite3.Connection, row: tuple) -> tuple:
+    source, timestamp, temperature, *aggregate = row
+    minimum, maximum, count = aggregate or (None, None, None)
+    return (
+        _get_source_id(connection, source),
+        to_epoch_seconds(timestamp),
+        to_centidegrees(temperature),
+        None if minimum is None else to_centidegrees(minimum),
+        None if maximum is None else to_centidegrees(maximum),
+        count,
+    )
+
+
+def save_temperatures(
+    rows: list[
+        tuple[str, datetime, Decimal]
+        | tuple[str, datetime, Decimal, Decimal, Decimal, int]
+    ],
+    add_to_cache: bool = True,
+) -> bool:
+    """Save (source, timestamp, temperature) readings in a single transaction.
+
+    Rows may carry the minimum, maximum and count of the minute as well.
+    Existing readings with the same source and timestamp are replaced. The
+    readings are added to the cache once the transaction has committed.
     Returns True if successful, False otherwise.
     """
     try:
-        with db_mutex:
-            with get_database_connection() as connection:
-                cursor = connection.cursor()
-                cursor.execute(
-                    "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
-                    (source, timestamp.isoformat(), temperature),
-                )
-                connection.commit()
+        with get_database_connection() as connection:
+            cursor = connection.cursor()
+            readings = [_to_reading_row(connection, row) for row in rows]
+            cursor.executemany(UPSERT_READING_SQL, readings)
+            _refresh_rollups(connection, _touched_ranges(readings))
+            connection.commit()
 
-                # Add to cache after successful database save
-                from mqtt_thermometer import cache
+        if add_to_cache:
+            # Add to cache after successful database save
+            from mqtt_thermometer import cache
 
+            for source, timestamp, temperature, *_ in rows:
                 cache.add_temperature_to_cache(source, timestamp, temperature)
 
-                return True
+        return True
     except Exception as e:
-        logger.error(f"Failed to save temperature: {e}")
+        logger.error(f"Failed to save temperatures: {e}")
         return False
 
 
+def get_sources() -> list[str]:
+    """Get the names of all sources that have readings in the database."""
+    try:
+        with get_reader_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT name FROM source ORDER BY id")
+            return [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Failed to get sources: {e}")
+        return []
+
+
 def get_temperatures(source: str, since: datetime) -> list:
     """Get temperature readings from a specific source since a given timestamp.
 
-    Returns a list of (source, timestamp, temperature) tuples.
+    Returns a list of (source, timestamp_iso, temperature) tuples.
     """
     try:
-        with db_mutex:
-            with get_database_connection() as connection:
-                cursor = connection.cursor()
-                cursor.execute(
-                    "SELECT source, timestamp, temperature FROM temperature "
-                    "WHERE source=? AND timestamp >= ? ORDER BY timestamp",
-                    (source, since.isoformat()),
+        with get_reader_connection() as connection:
+            cursor = connection.cursor()
+            row = cursor.execute(SELECT_SOURCE_ID_SQL, (source,)).fetchone()
+            if row is None:
+                return []
+            cursor.execute(SELECT_READINGS_SQL, (row[0], to_epoch_seconds(since)))
+            return [
+                (
+                    source,
+                    from_epoch_seconds(timestamp).isoformat(),
+                    from_centidegrees(temperature),
                 )
-                results = cursor.fetchall()
-
-                # Ensure temperature values are properly converted to Decimal
-                converted_results = []
-                for row in results:
-                    source_val, timestamp_val, temperature_val = row
-                    # Handle potential bytes to Decimal conversion
-                    if isinstance(temperature_val, bytes):
-                        temperature_val = Decimal(temperature_val.decode("utf-8"))
-                    elif isinstance(temperature_val, str):
-                        temperature_val = Decimal(temperature_val)
-                    elif not isinstance(temperature_val, Decimal):
-                        temperature_val = Decimal(str(temperature_val))
-
-                    converted_results.append(
-                        (source_val, timestamp_val, temperature_val)
-                    )
-
-                return converted_results
+                for timestamp, temperature in cursor.fetchall()
+            ]
     except Exception as e:
         logger.error(f"Failed to get temperatures: {e}")
         return []
 
 
+def iter_recent_readings(
+    since: datetime,
+    batch_size: int = WARMUP_BATCH_SIZE,
+    until: datetime | None = None,
+) -> Iterator[list[tuple[str, int, int]]]:
+    """Stream (source, epoch_minute, centidegrees) readings of all sources.
+
+    Readings since the given timestamp, and before until if given, are read
+    with a single query and yielded in batches, grouped by source in
+    chronological order.
+    """
+    with get_reader_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            SELECT_RECENT_READINGS_SQL,
+            (
+                to_epoch_seconds(since),
+                # Past any timestamp
+                to_epoch_seconds(until) if until is not None else 1 << 62,
+            ),
+        )
+        while rows := cursor.fetchmany(batch_size):
+            yield rows
+
+
+def get_high_water_mark() -> int | None:
+    """Epoch seconds of the newest saved reading, None if there are none."""
+    try:
+        with get_reader_connection() as connection:
+            return connection.execute(SELECT_HIGH_WATER_MARK_SQL).fetchone()[0]
+    except Exception as e:
+        logger.error(f"Failed to get the newest reading: {e}")
+        return None
+
+
+def get_rollups(
+    source: str, resolution: int, since: datetime
+) -> list[tuple[int, int, int, int, int]]:
+    """Get (timestamp, minimum, average, maximum, count) rollups of a source.
+
+    Timestamps are epoch seconds and temperatures centi-degrees.
+    """
+    try:
+        with get_reader_connection() as connection:
+            cursor = connection.cursor()
+            row = cursor.execute(SELECT_SOURCE_ID_SQL, (source,)).fetchone()
+            if row is None:
+                return []
+            cursor.execute(
+                SELECT_ROLLUPS_SQL, (resolution, row[0], to_epoch_seconds(since))
+            )
+            return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Failed to get rollups: {e}")
+        return []
+
+
 def get_temperatures_cached(source: str, since: datetime) -> list:
     """Get temperature readings from cache only.
 
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Literal
+
+from mqtt_thermometer import cache, clock, snapshot
+
+logger = logging.getLogger(__name__)
+
+# History is loaded an hour at a time, newest first
+HYDRATION_CHUNK = timedelta(hours=1)
+
+
+class CacheHydration:
+    """Fills the cache in a worker thread while the app already serves requests.
+
+    The cache is restored from the snapshot if there is a valid one.
+    Otherwise the last 24 hours are loaded from the database in chunks,
+    newest first, so the right edge of the chart fills first. Live readings
+    keep being added to the cache meanwhile.
+    """
+
+    def __init__(self, snapshot_path: Path | None, chunk: timedelta = HYDRATION_CHUNK):
+        self.snapshot_path = snapshot_path
+        self.chunk = chunk
+        self.state: Literal["pending", "hydrating", "ready", "stopped"] = "pending"
+        self.loaded_seconds = 0.0
+        self.rows = 0
+        self.duration_seconds: float | None = None
+        self._stop_event = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def progress(self) -> float:
+        if self.ready:
+            return 1.0
+        return min(self.loaded_seconds / cache.CACHE_MAX_AGE.total_seconds(), 1.0)
+
+    def run(self):
+        """Hydrate the cache, returning early if stop() is called."""
+        self.state = "hydrating"
+        started = time.perf_counter()
+        restored = self.snapshot_path is not None and snapshot.restore_cache(
+            self.snapshot_path
+        )
+        if restored:
+            self.rows = cache.warmup_stats["rows"] + cache.warmup_stats["replayed_rows"]
+        else:
+            self._load_newest_first()
+        if self._stop_event.is_set():
+            self.state = "stopped"
+            return
+        self.duration_seconds = time.perf_counter() - started
+        if not restored:
+            cache.warmup_stats.clear()
+            cache.warmup_stats.update(
+                {
+                    "source": "database",
+                    "rows": self.rows,
+                    "seconds": round(self.duration_seconds, 3),
+                }
+            )
+        self.state = "ready"
+        logger.info(f"Cache hydrated in {self.duration_seconds:.2f} seconds")
+
+    def _load_newest_first(self):
+        until = None
+        oldest = clock.now() - cache.CACHE_MAX_AGE
+        since = clock.now() - self.chunk
+        while not self._stop_event.is_set():
+            since = max(since, oldest)
+            # The first chunk is open ended to include readings saved meanwhile
+            self.rows += cache.load_older_readings(since, until)
+            self.loaded_seconds += self.chunk.total_seconds()
+            if since <= oldest:
+                return
+            until, since = since, since - self.chunk
+
+    def stop(self):
+        self._stop_event.set()
+
+    def get_stats(self) -> dict[str, str | float | int | None]:
+        return {
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "rows": self.rows,
+            "duration_seconds": self.duration_seconds,
+        }
@@ -0,0 +1,79 @@
+"""Memoized rendering of the legends shown above the chart."""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from jinja2 import Environment
+
+# (label, temperature, border colour, background colour) of a legend
+LegendFingerprint = tuple[str, Decimal | None, str, str]
+
+
+@dataclass
+class LegendData:
+    label: str
+    temperature: Decimal | None
+    border_color: str
+    background_color: str
+    last_updated: datetime
+
+
+def fingerprint(legend: LegendData) -> LegendFingerprint:
+    """What of a legend is visible, the update time is not."""
+    return (
+        legend.label,
+        legend.temperature,
+        legend.border_color,
+        legend.background_color,
+    )
+
+
+class LegendRenderer:
+    """Renders the legends, re-rendering only what changed since last time.
+
+    Each legend is rendered into its own HTML fragment, kept until the
+    legend's fingerprint changes. The joined legends HTML is kept until any
+    visible legend changes, and ``version`` is bumped whenever it does.
+    Legends without a temperature are not shown.
+    """
+
+    def __init__(self, environment: Environment):
+        self._item_template = environment.get_template("legend_item.jinja2")
+        self._legends_template = environment.get_template("legends.jinja2")
+        self._fragments: dict[str, tuple[LegendFingerprint, str]] = {}
+        self._fingerprint: tuple[LegendFingerprint, ...] | None = None
+        self._html = ""
+        self.version = 0
+        self.hits = 0
+        self.fragment_renders = 0
+
+    def render(self, legends: Iterable[LegendData]) -> str:
+        visible = [legend for legend in legends if legend.temperature is not None]
+        fingerprints = tuple(fingerprint(legend) for legend in visible)
+        if fingerprints == self._fingerprint:
+            self.hits += 1
+            return self._html
+        fragments = []
+        for legend, legend_fingerprint in zip(visible, fingerprints):
+            cached = self._fragments.get(legend.label)
+            if cached is None or cached[0] != legend_fingerprint:
+                cached = (
+                    legend_fingerprint,
+                    self._item_template.render({"legend": legend}),
+                )
+                self._fragments[legend.label] = cached
+                self.fragment_renders += 1
+            fragments.append(cached[1])
+        self._html = self._legends_template.render({"fragments": fragments})
+        self._fingerprint = fingerprints
+        self.version += 1
+        return self._html
+
+    def get_stats(self) -> dict[str, int]:
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "fragment_renders": self.fragment_renders,
+        }
@@ -1,21 +1,21 @@
 import asyncio
 import logging
 import time
-from datetime import UTC, datetime
+from contextlib import suppress
 from decimal import Decimal
 
 import paho.mqtt.client as mqtt
 
-from mqtt_thermometer import database
+from mqtt_thermometer import clock, routing
+from mqtt_thermometer.aggregate import MinuteAggregator
+from mqtt_thermometer.bridge import ReadingBridge
 from mqtt_thermometer.settings import settings
 
-loop = asyncio.get_event_loop()
-last_timestamp: datetime = datetime.now(tz=UTC).replace(second=0, microsecond=0)
-source_temperatures: dict[str, list[Decimal]] = {}
+aggregator = MinuteAggregator.from_settings()
 
 client = None
 
-main_queue: asyncio.Queue | None = None
+bridge: ReadingBridge | None = None
 
 logger = logging.getLogger(__name__)
 
@@ -24,47 +24,33 @@ def on_connect(client, userdata, flags, reason_code, properties):
     if reason_code.is_failure:
         logger.error("Failed to connect: %s", reason_code)
     else:
-        client.subscribe([(source.source, 1) for source in settings.sources])
+        client.subscribe(
+            [(topic, 1) for topic in routing.source_registry.subscriptions()]
+        )
 
 
 def on_message(client, userdata, message):
-    global last_timestamp, source_temperatures
-
     temperature = Decimal(message.payload.decode())
     source = message.topic
-    source_temperatures.setdefault(source, []).append(temperature)
-    timestamp = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+    # Minute averages are written by the aggregator's minute timer
+    aggregator.add(source, temperature, clock.now())
 
-    assert main_queue
-    asyncio.run_coroutine_threadsafe(main_queue.put((source, temperature)), loop)
+    if bridge is not None:
+        bridge.put(source, temperature)
 
-    if timestamp == last_timestamp:
-        return
 
-    for source, temperatures in source_temperatures.items():
-        average_temperature = Decimal(sum(temperatures) / len(temperatures)).quantize(
-            Decimal("0.11")
-        )
-        logger.debug(
-            "Saving temperature: %s %s %s",
-            last_timestamp.astimezone(),
-            source,
-            average_temperature,
-        )
-        success = database.save_temperature(source, last_timestamp, average_temperature)
-        if not success:
-            logger.error("Failed to save temperature for source: %s", source)
-    source_temperatures.clear()
-    last_timestamp = timestamp
+def _create_client() -> mqtt.Client:
+    new_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    new_client.on_connect = on_connect
+    new_client.on_message = on_message
+    return new_client
 
 
-def poll_mqtt_messages(queue: asyncio.Queue):
-    global client, main_queue
-    main_queue = queue
+def poll_mqtt_messages(reading_bridge: ReadingBridge | None = None):
+    global client, bridge
+    bridge = reading_bridge
 
-    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-    client.on_connect = on_connect
-    client.on_message = on_message
+    client = _create_client()
 
     for _ in range(10):
         try:
@@ -85,8 +71,139 @@ def stop_polling():
     client.disconnect()
 
 
-if __name__ == "__main__":
-    import asyncio
+class AsyncioIngest:
+    """Drives the MQTT client from the event loop instead of a thread.
+
+    The client socket is registered with ``loop.add_reader``/``add_writer``
+    and paho's housekeeping runs in a task, so the callbacks run in the
+    loop thread. Only the connect, a DNS lookup and TCP handshake, runs in
+    a worker thread so an unreachable broker does not stall the loop.
+    Connection failures and disconnects are retried with exponential
+    backoff. Cancelling ``run`` disconnects cleanly.
+    """
+
+    def __init__(
+        self,
+        reading_bridge: ReadingBridge | None,
+        host: str,
+        port: int,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.reading_bridge = reading_bridge
+        self.host = host
+        self.port = port
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.connects = 0
+        self.client = _create_client()
+        self.client.on_socket_open = self._on_socket_open
+        self.client.on_socket_close = self._on_socket_close
+        self.client.on_socket_register_write = self._on_socket_register_write
+        self.client.on_socket_unregister_write = self._on_socket_unregister_write
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._misc_task: asyncio.Task | None = None
+        self._connecting: asyncio.Future | None = None
+        self._socket_open = False
+        self._disconnected = asyncio.Event()
+
+    @classmethod
+    def from_settings(cls, reading_bridge: ReadingBridge | None) -> "AsyncioIngest":
+        return cls(reading_bridge, settings.mqtt_broker.host, settings.mqtt_broker.port)
+
+    def _in_loop(self, callback, *args):
+        # Socket callbacks of a connect run in the worker thread
+        assert self._loop
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._in_loop(self._register_socket, client, sock)
+
+    def _register_socket(self, client, sock):
+        assert self._loop
+        self._loop.add_reader(sock, client.loop_read)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+        self._socket_open = True
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._in_loop(self._unregister_socket, sock)
+
+    def _unregister_socket(self, sock):
+        assert self._loop
+        self._loop.remove_reader(sock)
+        self._loop.remove_writer(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+        self._socket_open = False
+        self._disconnected.set()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        assert self._loop
+        self._in_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        assert self._loop
+        self._in_loop(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        # Keepalive pings and retries, what loop_forever does between reads
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    async def run(self):
+        global bridge
+        bridge = self.reading_bridge
+        self._loop = asyncio.get_running_loop()
+        backoff = self.initial_backoff
+        try:
+            while True:
+                self._disconnected.clear()
+                try:
+                    # The rest is driven by the socket callbacks. Shielded,
+                    # a cancelled run waits for the connect in finally.
+                    self._connecting = self._loop.run_in_executor(
+                        None, self.client.connect, self.host, self.port
+                    )
+                    await asyncio.shield(self._connecting)
+                except OSError as e:
+                    logger.error(
+                        "Failed to connect: %s. Retrying in %s seconds...", e, backoff
+                    )
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                self.connects += 1
+                backoff = self.initial_backoff
+                await self._disconnected.wait()
+                logger.warning(
+                    "Disconnected from MQTT broker, reconnecting in %s seconds...",
+                    backoff,
+                )
+                await asyncio.sleep(backoff)
+        finally:
+            if self._connecting is not None and not self._connecting.done():
+                # Its socket must be closed as well
+                with suppress(OSError):
+                    await self._connecting
+                # Let the socket callbacks it queued run
+                await asyncio.sleep(0)
+            if self._socket_open:
+                self._disconnected.clear()
+                # Writing the DISCONNECT packet closes the socket
+                self.client.disconnect()
+                try:
+                    await asyncio.wait_for(self._disconnected.wait(), 5)
+                except TimeoutError:
+                    logger.warning("MQTT broker did not see a clean disconnect")
 
-    queue = asyncio.Queue()
-    poll_mqtt_messages(queue)
+
+if __name__ == "__main__":
+    poll_mqtt_messages()
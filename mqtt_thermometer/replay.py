@@ -0,0 +1,337 @@
+"""Replays recorded history through the live ingest and broadcast pipeline.
+
+Messages are read from the readings of an existing database, one message per
+source and minute, also from a database with the legacy "temperature" table
+that has not been migrated yet, or from a message log with one JSON object
+per line::
+
+    {"timestamp": "2025-01-01T12:00:05+00:00", "topic": "...", "payload": "21.5"}
+
+Each message is passed to ``mqtt.on_message`` under a ``SimulatedClock``
+that is moved to the message's timestamp, so minute flushes, cache expiry,
+legend resets and the chart window all follow the recorded time. Readings
+go on through ``process_mqtt_readings`` to the legends and broadcasts to
+fake websocket clients. A week replays in seconds with ``--speed 0``::
+
+    python -m mqtt_thermometer.replay --source-database mqtt-thermometer.db \\
+        --since 2025-01-01 --until 2025-01-08 --clients 20 --output replay.json
+
+Sources are taken from the configuration as usual. Minute averages are saved
+to a separate database, a temporary one by default.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sqlite3
+import tempfile
+import time
+from collections.abc import Iterable, Iterator
+from datetime import UTC, datetime
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+from mqtt_thermometer import clock
+from mqtt_thermometer.settings import settings
+
+# (timestamp, topic, payload)
+ReplayMessage = tuple[datetime, str, bytes]
+
+SELECT_REPLAY_READINGS_SQL = (
+    "SELECT source.name, reading.timestamp, reading.temperature "
+    "FROM source JOIN reading ON reading.source_id = source.id "
+    "WHERE reading.timestamp >= ? AND reading.timestamp < ? "
+    "ORDER BY reading.timestamp, source.id"
+)
+SELECT_LEGACY_TEMPERATURES_SQL = (
+    "SELECT source, timestamp, CAST(temperature AS TEXT) FROM temperature "
+    "ORDER BY timestamp, id"
+)
+
+
+def _table_exists(connection: sqlite3.Connection, name: str) -> bool:
+    return (
+        connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+        ).fetchone()
+        is not None
+    )
+
+
+def _read_legacy_temperatures(
+    connection: sqlite3.Connection, since: datetime | None, until: datetime | None
+) -> Iterator[ReplayMessage]:
+    for source, timestamp_iso, temperature in connection.execute(
+        SELECT_LEGACY_TEMPERATURES_SQL
+    ):
+        try:
+            timestamp = _parse_timestamp(timestamp_iso)
+        except (TypeError, ValueError):
+            continue
+        if until and timestamp >= until:
+            return
+        if since and timestamp < since:
+            continue
+        yield timestamp, source, temperature.encode()
+
+
+def read_database(
+    path: Path, since: datetime | None = None, until: datetime | None = None
+) -> Iterator[ReplayMessage]:
+    """Messages from the minute readings of a database, opened read-only.
+
+    A database that has not been fully migrated still has the legacy
+    "temperature" table. Its rows are replayed first, followed by the
+    readings saved after its newest row.
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        first_reading = int(since.timestamp()) if since else 0
+        if _table_exists(connection, "temperature"):
+            for message in _read_legacy_temperatures(connection, since, until):
+                first_reading = max(first_reading, int(message[0].timestamp()) + 1)
+                yield message
+        if not _table_exists(connection, "reading"):
+            return
+        cursor = connection.execute(
+            SELECT_REPLAY_READINGS_SQL,
+            (first_reading, int(until.timestamp()) if until else 2**63 - 1),
+        )
+        for name, timestamp, centidegrees in cursor:
+            yield (
+                datetime.fromtimestamp(timestamp, tz=UTC),
+                name,
+                str(Decimal(centidegrees).scaleb(-2)).encode(),
+            )
+    finally:
+        connection.close()
+
+
+def read_log(
+    path: Path, since: datetime | None = None, until: datetime | None = None
+) -> Iterator[ReplayMessage]:
+    """Messages from a JSON lines message log, in the order they were logged."""
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            timestamp = datetime.fromisoformat(entry["timestamp"])
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=UTC)
+            if (since and timestamp < since) or (until and timestamp >= until):
+                continue
+            yield timestamp, entry["topic"], str(entry["payload"]).encode()
+
+
+class _Message:
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+class _FakeWebSocket:
+    def __init__(self):
+        self.sent_messages = 0
+        self.sent_bytes = 0
+
+    async def send_text(self, message: str):
+        self.sent_messages += 1
+        self.sent_bytes += len(message)
+
+    async def send_bytes(self, message: bytes):
+        self.sent_messages += 1
+        self.sent_bytes += len(message)
+
+    async def close(self):
+        pass
+
+
+async def _settle():
+    # Lets woken sleepers, bridge drains and websocket senders run
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def _get_chart_coverage() -> dict[str, int]:
+    """Minutes with a value on the 24 hour chart, per source label."""
+    from mqtt_thermometer import service
+
+    since_minute = service._get_chart_since_minute()
+    return {
+        source.label: int(
+            np.count_nonzero(
+                ~np.isnan(
+                    service._get_temperature_series(
+                        source.source,
+                        source.calibration_multiplier,
+                        source.calibration_offset,
+                        since_minute,
+                    )
+                )
+            )
+        )
+        for source in settings.sources
+    }
+
+
+async def replay(
+    messages: Iterable[ReplayMessage], speed: float = 0.0, clients: int = 0
+) -> dict:
+    """Feed the messages through the pipeline, returning a report.
+
+    speed is simulated seconds per wall clock second, 0 replays as fast as
+    possible. The database must have been created already.
+    """
+    from mqtt_thermometer import broadcast, cache, database, mqtt, service
+    from mqtt_thermometer.bridge import ReadingBridge
+
+    messages = iter(messages)
+    first = next(messages, None)
+    if first is None:
+        return {"messages": 0}
+
+    saved_rows = 0
+
+    def write(rows):
+        nonlocal saved_rows
+        # Saved right away instead of through the write-behind queue, so
+        # the cache is up to date before the next simulated minute
+        if database.save_temperatures(rows):
+            saved_rows += len(rows)
+
+    simulated_clock = clock.SimulatedClock(first[0])
+    with clock.use_clock(simulated_clock):
+        bridge = ReadingBridge(
+            asyncio.get_running_loop(), service.process_mqtt_readings
+        )
+        service.mqtt_bridge = mqtt.bridge = bridge
+        service._register_known_sources()
+        websockets = [_FakeWebSocket() for _ in range(clients)]
+        for index, websocket in enumerate(websockets):
+            broadcast.broadcaster.add(
+                websocket, columnar=index % 2 == 0, compressed=index % 4 == 0
+            )
+        tasks = [
+            asyncio.create_task(mqtt.aggregator.run(write)),
+            asyncio.create_task(service.reset_inactive_temperatures()),
+            asyncio.create_task(service.advance_chart_every_minute()),
+        ]
+        await _settle()
+
+        count = 0
+        last = first[0]
+        started = time.perf_counter()
+        for timestamp, topic, payload in itertools.chain([first], messages):
+            delay = (timestamp - simulated_clock.now()).total_seconds()
+            if speed > 0 and delay > 0:
+                await asyncio.sleep(delay / speed)
+            simulated_clock.advance_to(timestamp)
+            await _settle()
+            mqtt.on_message(None, None, _Message(topic, payload))
+            await _settle()
+            count += 1
+            last = timestamp
+
+        # Let the last minute be flushed on time, then save what is left
+        simulated_clock.advance(60 + mqtt.aggregator.flush_delay_seconds)
+        await _settle()
+        write(mqtt.aggregator.flush())
+        while broadcast.broadcaster.get_stats()["queued_messages"]:
+            await asyncio.sleep(0)
+        wall_seconds = time.perf_counter() - started
+
+        simulated_seconds = (last - first[0]).total_seconds()
+        report = {
+            "messages": count,
+            "first": first[0].isoformat(),
+            "last": last.isoformat(),
+            "simulated_seconds": simulated_seconds,
+            "wall_seconds": round(wall_seconds, 3),
+            "speedup": round(simulated_seconds / wall_seconds, 1)
+            if wall_seconds
+            else None,
+            "saved_rows": saved_rows,
+            "late_readings": mqtt.aggregator.late_readings,
+            "bridge": bridge.get_stats(),
+            "cache": cache.get_cache_stats(),
+            "legends": service.legend_renderer.get_stats(),
+            "triggers": {
+                name: {"runs": trigger.runs, "coalesced": trigger.coalesced}
+                for name, trigger in (
+                    ("legend", service.legend_trigger),
+                    ("chart", service.chart_trigger),
+                )
+            },
+            "broadcast": broadcast.broadcaster.get_stats()
+            | {"sent_bytes": sum(websocket.sent_bytes for websocket in websockets)},
+            "chart_coverage": _get_chart_coverage(),
+        }
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        service.legend_trigger.cancel()
+        service.chart_trigger.cancel()
+        await broadcast.broadcaster.close()
+        mqtt.bridge = None
+    return report
+
+
+def _parse_timestamp(value: str) -> datetime:
+    timestamp = datetime.fromisoformat(value)
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=UTC)
+
+
+def main(argv: list[str] | None = None) -> dict:
+    parser = argparse.ArgumentParser(prog="python -m mqtt_thermometer.replay")
+    recording = parser.add_mutually_exclusive_group(required=True)
+    recording.add_argument("--source-database", type=Path)
+    recording.add_argument("--log", type=Path, help="JSON lines message log")
+    parser.add_argument("--since", type=_parse_timestamp)
+    parser.add_argument("--until", type=_parse_timestamp)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="simulated seconds per second, 0 for as fast as possible",
+    )
+    parser.add_argument("--clients", type=int, default=0)
+    parser.add_argument(
+        "--database", type=Path, help="database to save to, default temporary"
+    )
+    parser.add_argument("--output", type=Path, help="JSON file, default stdout")
+    arguments = parser.parse_args(argv)
+
+    if arguments.source_database:
+        messages = read_database(
+            arguments.source_database, arguments.since, arguments.until
+        )
+    else:
+        messages = read_log(arguments.log, arguments.since, arguments.until)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Must happen before the service modules read the settings at import
+        settings.db_connection_string = str(
+            arguments.database or Path(directory) / "replay.db"
+        )
+        settings.cache.snapshot_enabled = False
+        from mqtt_thermometer import database
+
+        database.create_table()
+        report = asyncio.run(replay(messages, arguments.speed, arguments.clients))
+        database.close_connections()
+
+    output = json.dumps(report, indent=2)
+    if arguments.output:
+        arguments.output.write_text(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import suppress
+
+from mqtt_thermometer import database
+from mqtt_thermometer.settings import RetentionSettings, settings
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionTask:
+    """Periodically deletes expired rows and returns the freed space.
+
+    Runs the database work in a worker thread. The first run converts an
+    existing database to incremental vacuum if it is small enough or the
+    conversion is asked for in the settings.
+    """
+
+    def __init__(self, retention: RetentionSettings):
+        self.retention = retention
+        self.runs = 0
+        self.pruned_rows = 0
+        self.reclaimed_bytes = 0
+        self.last_run: float | None = None
+        self.last_duration_seconds = 0.0
+        self._stop_event = threading.Event()
+        self._stopped: asyncio.Event | None = None
+
+    @classmethod
+    def from_settings(cls) -> "RetentionTask":
+        return cls(settings.retention)
+
+    def retention_days(self) -> dict[int | None, int | None]:
+        five_minutes, hourly, daily = database.ROLLUP_RESOLUTIONS
+        return {
+            None: self.retention.raw_days,
+            five_minutes: self.retention.five_minute_days,
+            hourly: self.retention.hourly_days,
+            daily: self.retention.daily_days,
+        }
+
+    def run_once(self):
+        started = time.perf_counter()
+        if self.runs == 0:
+            database.enable_incremental_vacuum(
+                force=self.retention.convert_to_incremental_vacuum,
+                max_bytes=self.retention.incremental_vacuum_conversion_max_bytes,
+            )
+        pruned = database.prune_expired(
+            self.retention_days(), self.retention.batch_size, self._stop_event
+        )
+        reclaimed = database.incremental_vacuum() if pruned else 0
+        self.runs += 1
+        self.pruned_rows += pruned
+        self.reclaimed_bytes += reclaimed
+        self.last_run = time.time()
+        self.last_duration_seconds = time.perf_counter() - started
+        if pruned:
+            logger.info(f"Retention pruned {pruned} rows, reclaimed {reclaimed} bytes")
+
+    async def run(self):
+        """Run until stop() is called."""
+        self._stop_event.clear()
+        self._stopped = asyncio.Event()
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            with suppress(TimeoutError):
+                await asyncio.wait_for(
+                    self._stopped.wait(), self.retention.interval_seconds
+                )
+
+    def stop(self):
+        """Stop, interrupting a run in progress between batches."""
+        self._stop_event.set()
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def get_stats(self) -> dict[str, int | float | None]:
+        return {
+            "runs": self.runs,
+            "pruned_rows": self.pruned_rows,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "last_run": self.last_run,
+            "last_duration_ms": self.last_duration_seconds * 1000,
+        }
+
+
+retention_task = RetentionTask.from_settings()
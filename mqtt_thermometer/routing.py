@@ -0,0 +1,158 @@
+import logging
+
+from mqtt_thermometer.settings import SourceSettings, SourceTemplateSettings, settings
+
+logger = logging.getLogger(__name__)
+
+
+def is_wildcard(pattern: str) -> bool:
+    return "+" in pattern or "#" in pattern
+
+
+def topic_wildcards(pattern: str, topic: str) -> list[str]:
+    """Topic levels matched by the + and # wildcards of a matching pattern."""
+    pattern_levels = pattern.split("/")
+    topic_levels = topic.split("/")
+    wildcards = []
+    for index, level in enumerate(pattern_levels):
+        if level == "#":
+            wildcards.append("/".join(topic_levels[index:]))
+            break
+        if level == "+":
+            wildcards.append(topic_levels[index])
+    return wildcards
+
+
+class _Node:
+    __slots__ = ("children", "multi_level", "values")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        # Values of patterns ending at this level
+        self.values: list = []
+        # Values of patterns ending in # at this level
+        self.multi_level: list = []
+
+
+class TopicRouter[T]:
+    """Maps MQTT topics to the values registered for matching topic filters.
+
+    Exact topics are looked up in a dict. Filters with + and # wildcards
+    are kept in a trie of topic levels, so matching costs O(topic depth)
+    regardless of how many filters are registered.
+    """
+
+    def __init__(self):
+        self._exact: dict[str, list[T]] = {}
+        self._root = _Node()
+        self._wildcards = 0
+
+    def add(self, pattern: str, value: T):
+        if not is_wildcard(pattern):
+            self._exact.setdefault(pattern, []).append(value)
+            return
+        node = self._root
+        levels = pattern.split("/")
+        for index, level in enumerate(levels):
+            if level == "#":
+                if index != len(levels) - 1:
+                    msg = f"# must be the last level of a topic filter: {pattern}"
+                    raise ValueError(msg)
+                node.multi_level.append(value)
+                break
+            node = node.children.setdefault(level, _Node())
+        else:
+            node.values.append(value)
+        self._wildcards += 1
+
+    def match(self, topic: str) -> list[T]:
+        """Values of all filters matching the topic, exact matches first."""
+        matches = list(self._exact.get(topic, ()))
+        # Wildcards never match topics starting with $, e.g. $SYS
+        if self._wildcards and not topic.startswith("$"):
+            self._match(self._root, topic.split("/"), 0, matches)
+        return matches
+
+    def _match(self, node: _Node, levels: list[str], index: int, matches: list[T]):
+        # "a/#" matches "a" as well as everything below it
+        matches.extend(node.multi_level)
+        if index == len(levels):
+            matches.extend(node.values)
+            return
+        for key in (levels[index], "+"):
+            if child := node.children.get(key):
+                self._match(child, levels, index + 1, matches)
+
+
+class SourceRegistry:
+    """Resolves MQTT topics to the configured sources.
+
+    Topics that match no configured source but match a source template are
+    registered as new sources, appended to the given source list, with
+    the label and colours of the template.
+    """
+
+    def __init__(
+        self,
+        sources: list[SourceSettings],
+        templates: list[SourceTemplateSettings],
+    ):
+        self.sources = sources
+        self.templates = templates
+        self._sources = TopicRouter[SourceSettings]()
+        for source in sources:
+            self._sources.add(source.source, source)
+        self._templates = TopicRouter[SourceTemplateSettings]()
+        for template in templates:
+            self._templates.add(template.topic, template)
+        self._registered: dict[int, int] = {}
+
+    @classmethod
+    def from_settings(cls) -> "SourceRegistry":
+        return cls(settings.sources, settings.source_templates)
+
+    def subscriptions(self) -> list[str]:
+        """Topic filters to subscribe to."""
+        topics = [source.source for source in self.sources] + [
+            template.topic for template in self.templates
+        ]
+        return list(dict.fromkeys(topics))
+
+    def match(self, topic: str) -> list[SourceSettings]:
+        """Sources of a topic, without registering new ones."""
+        return self._sources.match(topic)
+
+    def resolve(self, topic: str) -> list[SourceSettings]:
+        """Sources of a topic, registering it from a template if needed."""
+        if sources := self._sources.match(topic):
+            return sources
+        if templates := self._templates.match(topic):
+            return [self._register(topic, templates[0])]
+        return []
+
+    def _register(self, topic: str, template: SourceTemplateSettings) -> SourceSettings:
+        index = self._registered.get(id(template), 0)
+        self._registered[id(template)] = index + 1
+        label = template.label.format(
+            *topic_wildcards(template.topic, topic), topic=topic
+        )
+        if any(source.label == label for source in self.sources):
+            # Labels identify the chart datasets, keep them unique
+            label = topic
+        source = SourceSettings(
+            label=label,
+            source=topic,
+            calibration_multiplier=template.calibration_multiplier,
+            calibration_offset=template.calibration_offset,
+            border_color=template.border_colors[index % len(template.border_colors)],
+            background_color=template.background_colors[
+                index % len(template.background_colors)
+            ],
+        )
+        self.sources.append(source)
+        self._sources.add(topic, source)
+        logger.info(f"Registered source {label} for topic {topic}")
+        return source
+
+
+source_registry = SourceRegistry.from_settings()
@@ -1,36 +1,48 @@
 import asyncio
+import itertools
 import json
 import logging
-from contextlib import asynccontextmanager
+import math
+from contextlib import asynccontextmanager, suppress
 from dataclasses import dataclass
-from datetime import UTC, datetime, timedelta
+from datetime import datetime, timedelta
 from decimal import Decimal
 from pathlib import Path
-from threading import Thread
+from threading import Event, Thread
+from typing import Literal
 
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, HTMLResponse
+import numpy as np
+from fastapi import FastAPI, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi_htmx import htmx, htmx_init
 
-from mqtt_thermometer import database, mqtt
+from mqtt_thermometer import (
+    broadcast,
+    cache,
+    chart,
+    clock,
+    compression,
+    database,
+    hydration,
+    legends,
+    mqtt,
+    retention,
+    routing,
+    snapshot,
+    write_behind,
+)
+from mqtt_thermometer.bridge import ReadingBridge
+from mqtt_thermometer.legends import LegendData
 from mqtt_thermometer.settings import settings
 
-mqtt_message_queue = asyncio.Queue(maxsize=1)
-
-ws_connections: set[WebSocket] = set()
-
 logger = logging.getLogger(__name__)
 
-
-@dataclass
-class LegendData:
-    label: str
-    temperature: Decimal | None
-    border_color: str
-    background_color: str
-    last_updated: datetime
+# 24 hours of minutes, including the current minute
+CHART_SLOTS = 24 * 60 + 1
+# Per-source minute grids, updated in place as minute averages are cached
+chart_grids = chart.ChartGrids(CHART_SLOTS)
 
 
 legend_data: dict[str, LegendData] = {
@@ -39,7 +51,7 @@ legend_data: dict[str, LegendData] = {
         temperature=None,
         border_color=source.border_color.as_hex("long"),
         background_color=source.background_color.as_hex("long"),
-        last_updated=datetime.now(tz=UTC),
+        last_updated=clock.now(),
     )
     for source in settings.sources
 }
@@ -51,10 +63,51 @@ last_chart_temperatures: dict[str, Decimal | None] = {
 
 templates = Jinja2Templates(directory=Path(__file__).parent / "templates")
 htmx_init(templates=templates)
+legend_renderer = legends.LegendRenderer(templates.env)
+# Version of the legends last sent to the websocket clients
+broadcast_legends_version: int | None = None
 
 
 def _get_legends_element():
-    return templates.get_template("legends.jinja2").render({"legend_data": legend_data})
+    return legend_renderer.render(legend_data.values())
+
+
+def _get_latest_temperature(source: str) -> Decimal | None:
+    """Get the live, already calibrated legend temperature of an MQTT topic."""
+    latest_temperature = None
+    for settings_source in routing.source_registry.match(source):
+        legend = legend_data.get(settings_source.label)
+        if legend is not None and legend.temperature is not None:
+            latest_temperature = legend.temperature
+    return latest_temperature
+
+
+def _get_chart_since_minute() -> int:
+    """First epoch minute of the 24 hour chart window ending at the current minute."""
+    current_time = clock.now().replace(second=0, microsecond=0)
+    since = current_time - timedelta(hours=24)
+    return int(since.timestamp()) // 60
+
+
+def _get_temperature_series(
+    source: str,
+    calibration_multiplier: Decimal,
+    calibration_offset: Decimal,
+    since_minute: int,
+) -> np.ndarray:
+    # The very latest reading from legend_data shows the most recent value
+    # even before its minute average is saved. legend_data already contains
+    # calibrated temperatures from process_mqtt_queue.
+    latest_temperature = _get_latest_temperature(source)
+    grid = chart_grids.get_grid(
+        source,
+        multiplier=float(calibration_multiplier),
+        offset=float(calibration_offset),
+        since_minute=since_minute,
+    )
+    return grid.get_series(
+        float(latest_temperature) if latest_temperature is not None else None
+    )
 
 
 def _get_temperature_data_for_source(
@@ -62,148 +115,137 @@ def _get_temperature_data_for_source(
     calibration_multiplier: Decimal,
     calibration_offset: Decimal,
     for_json: bool = False,
-) -> dict[datetime, Decimal | None] | dict[str, float | None]:
+) -> dict[datetime, float | None] | dict[str, float | None]:
     """Get temperature data for a specific source - shared logic for chart and websocket updates."""
-    current_time = datetime.now(tz=UTC).replace(second=0, microsecond=0)
-    until = current_time  # Include the current minute in the range
-    since = until - timedelta(hours=24)
-
-    last_temperature = None
-    temperature_data = _get_empty_temperature_data(since=since, until=until)
-    for _, timestamp, temperature in database.get_temperatures_cached(
-        source=source,
-        since=since,
-    ):
-        temperature = Decimal(temperature) * calibration_multiplier + calibration_offset
-        MAX_STEP = Decimal("0.5")
-        if last_temperature is not None:
-            if temperature - last_temperature > MAX_STEP:
-                temperature = last_temperature + MAX_STEP
-            elif temperature - last_temperature < -MAX_STEP:
-                temperature = last_temperature - MAX_STEP
-        last_temperature = temperature
-        time_index = datetime.fromisoformat(timestamp).astimezone()
-        if time_index in temperature_data:
-            temperature_data[time_index] = temperature
-
-    # Enhanced interpolation to handle larger gaps (up to 10 minutes)
-    MAX_GAP_MINUTES = 10
-    timestamps = list(temperature_data.keys())
-    values = list(temperature_data.values())
-
-    for i in range(len(values)):
-        if values[i] is None:
-            # Find the nearest non-None values before and after this position
-            prev_value = None
-            prev_index = None
-            next_value = None
-            next_index = None
-
-            # Look backwards for the previous non-None value
-            for j in range(i - 1, -1, -1):
-                if values[j] is not None:
-                    prev_value = values[j]
-                    prev_index = j
-                    break
-
-            # Look forwards for the next non-None value
-            for j in range(i + 1, len(values)):
-                if values[j] is not None:
-                    next_value = values[j]
-                    next_index = j
-                    break
-
-            # Interpolate if we have both previous and next values and gap is not too large
-            if (
-                prev_value is not None
-                and next_value is not None
-                and prev_index is not None
-                and next_index is not None
-                and next_index - prev_index <= MAX_GAP_MINUTES
-            ):
-                # Linear interpolation
-                gap_size = next_index - prev_index
-                position_in_gap = i - prev_index
-                interpolated_value = prev_value + (next_value - prev_value) * (
-                    Decimal(position_in_gap) / Decimal(gap_size)
-                )
-                temperature_data[timestamps[i]] = interpolated_value
-
-    # Add the very latest temperature reading from legend_data if available
-    # This shows the most recent individual reading even before it's saved to database
-    # Note: legend_data already contains calibrated temperatures from process_mqtt_queue
-    current_time = datetime.now(tz=UTC).replace(second=0, microsecond=0)
-    for legend_source, legend in legend_data.items():
-        # Find matching source by comparing with source labels
-        for settings_source in settings.sources:
-            if (
-                settings_source.source == source
-                and settings_source.label == legend_source
-                and legend.temperature is not None
-            ):
-                # Use the already calibrated temperature from legend_data
-                latest_temp = legend.temperature
-
-                # Find the last non-None temperature in the existing data to check for gaps
-                last_db_time = None
-                last_db_temp = None
-                timestamps = list(temperature_data.keys())
-                for i in range(len(timestamps) - 1, -1, -1):
-                    if temperature_data[timestamps[i]] is not None:
-                        last_db_time = timestamps[i]
-                        last_db_temp = temperature_data[timestamps[i]]
-                        break
-
-                # Apply interpolation if there's a gap between last database reading and current time
-                if (
-                    last_db_time is not None
-                    and last_db_temp is not None
-                    and current_time > last_db_time
-                ):
-                    # Calculate the gap in minutes
-                    gap_minutes = int(
-                        (current_time - last_db_time).total_seconds() / 60
-                    )
-
-                    # Only interpolate if gap is reasonable (up to MAX_GAP_MINUTES)
-                    if gap_minutes <= MAX_GAP_MINUTES and gap_minutes > 1:
-                        # Fill in the gap with interpolated values
-                        for minute_offset in range(1, gap_minutes):
-                            interpolation_time = last_db_time + timedelta(
-                                minutes=minute_offset
-                            )
-                            if interpolation_time in temperature_data:
-                                # Linear interpolation
-                                progress = Decimal(minute_offset) / Decimal(gap_minutes)
-                                interpolated_value = (
-                                    last_db_temp
-                                    + (latest_temp - last_db_temp) * progress
-                                )
-                                temperature_data[interpolation_time] = (
-                                    interpolated_value
-                                )
-
-                # Apply the same smoothing logic to the latest temperature
-                if last_temperature is not None:
-                    MAX_STEP = Decimal("0.5")
-                    if latest_temp - last_temperature > MAX_STEP:
-                        latest_temp = last_temperature + MAX_STEP
-                    elif latest_temp - last_temperature < -MAX_STEP:
-                        latest_temp = last_temperature - MAX_STEP
-
-                # Always update the current minute with the latest value
-                temperature_data[current_time] = latest_temp
-                last_temperature = latest_temp  # Update for next iteration
-                break
+    since_minute = _get_chart_since_minute()
+    series = _get_temperature_series(
+        source, calibration_multiplier, calibration_offset, since_minute
+    )
 
     # Convert to JSON-serializable format if requested
     if for_json:
-        return {
-            timestamp.isoformat(): float(temp) if temp is not None else None
-            for timestamp, temp in temperature_data.items()
-        }
+        return chart.to_json_data(series, since_minute)
 
-    return temperature_data
+    since = database.from_epoch_seconds(since_minute * 60)
+    return dict(
+        zip(
+            _get_empty_temperature_data(since=since, until=since + timedelta(hours=24)),
+            [None if math.isnan(value) else value for value in series.tolist()],
+        )
+    )
+
+
+@dataclass
+class ChartState:
+    """Chart series as last sent to the websocket clients."""
+
+    version: int
+    since_minute: int
+    series: dict[str, np.ndarray]
+
+
+chart_state: ChartState | None = None
+
+
+def _get_chart_data(since_minute: int, series: dict[str, np.ndarray]) -> dict:
+    return {
+        "datasets": [
+            {
+                "data": chart.to_json_data(series[source.label], since_minute),
+                "label": source.label,
+                "borderColor": source.border_color.as_hex("long"),
+                "backgroundColor": source.background_color.as_hex("long"),
+                "borderJoinStyle": "round",
+            }
+            for source in settings.sources
+        ],
+    }
+
+
+def _get_columnar_chart(since_minute: int, series: dict[str, np.ndarray]) -> dict:
+    """Chart in the columnar format: one value per minute from start.
+
+    Clients rebuild the time axis from start and step (epoch seconds), so
+    the timestamps are not repeated for every point.
+    """
+    return {
+        "format": "columnar",
+        "start": since_minute * 60,
+        "step": 60,
+        "datasets": [
+            {
+                "values": chart.to_columnar_values(series[source.label]),
+                "label": source.label,
+                "borderColor": source.border_color.as_hex("long"),
+                "backgroundColor": source.background_color.as_hex("long"),
+                "borderJoinStyle": "round",
+            }
+            for source in settings.sources
+        ],
+    }
+
+
+def _advance_chart_state() -> dict[str, list[tuple[str, float | None]]] | None:
+    """Recompute the chart and store it as a new version if anything changed.
+
+    Returns the changed points per source label since the previous version,
+    or None if clients need the full chart: there was no previous version or
+    the set of sources changed.
+    """
+    global chart_state
+    since_minute = _get_chart_since_minute()
+    series = {
+        source.label: _get_temperature_series(
+            source.source,
+            source.calibration_multiplier,
+            source.calibration_offset,
+            since_minute,
+        )
+        for source in settings.sources
+    }
+
+    previous = chart_state
+    if previous is None or previous.series.keys() != series.keys():
+        # First version, or a source was registered: clients need a full chart
+        chart_state = ChartState(
+            version=previous.version + 1 if previous else 1,
+            since_minute=since_minute,
+            series=series,
+        )
+        return None
+
+    timestamps = chart.iso_timestamps(since_minute, CHART_SLOTS)
+    changes = {}
+    for label, values in series.items():
+        changed = chart.changed_slots(
+            previous.series[label], previous.since_minute, values, since_minute
+        )
+        if len(changed):
+            changes[label] = [
+                (timestamps[index], None if math.isnan(value) else value)
+                for index, value in zip(changed, values[changed].tolist())
+            ]
+    if changes or since_minute != previous.since_minute:
+        chart_state = ChartState(
+            version=previous.version + 1, since_minute=since_minute, series=series
+        )
+    return changes
+
+
+def _get_full_chart_message(legends_html: str, columnar: bool = False) -> str:
+    """Combined legends and full chart message of the current chart version."""
+    if chart_state is None:
+        _advance_chart_state()
+    assert chart_state is not None
+    get_chart = _get_columnar_chart if columnar else _get_chart_data
+    return json.dumps(
+        {
+            "type": "combined",
+            "legends": legends_html,
+            "version": chart_state.version,
+            "chart": get_chart(chart_state.since_minute, chart_state.series),
+        }
+    )
 
 
 def _should_update_chart() -> bool:
@@ -237,74 +279,133 @@ def _should_update_chart() -> bool:
     return False
 
 
-async def _broadcast_temperature_data():
-    """Broadcast legend updates and optionally chart updates to websockets."""
-    legends_html = _get_legends_element()
-
-    # Check if we need to update the chart
-    should_update_chart = _should_update_chart()
-
-    if should_update_chart:
-        # Get full chart data
-        chart_data = {
-            "datasets": [
-                {
-                    "data": temperature_data,
-                    "label": source.label,
-                    "borderColor": source.border_color.as_hex("long"),
-                    "backgroundColor": source.background_color.as_hex("long"),
-                    "borderJoinStyle": "round",
-                }
-                for source in settings.sources
-                if (
-                    temperature_data := _get_temperature_data_for_source(
-                        source=source.source,
-                        calibration_multiplier=source.calibration_multiplier,
-                        calibration_offset=source.calibration_offset,
-                        for_json=True,
-                    )
-                )
-            ],
-        }
-
-        # Update last chart temperatures for next comparison
-        for source in settings.sources:
-            last_chart_temperatures[source.label] = legend_data[
-                source.label
-            ].temperature
+def _broadcast_chart(only_changes: bool = False):
+    """Broadcast legends together with the chart changes to websockets.
 
-        # Send combined update with both legends and chart data
+    With only_changes nothing is sent if the chart did not change.
+    """
+    global broadcast_legends_version
+    previous_version = chart_state.version if chart_state else None
+    changes = _advance_chart_state()
+    if only_changes and changes is not None and chart_state.version == previous_version:
+        return
+    legends_html = _get_legends_element()
+    broadcast_legends_version = legend_renderer.version
+    # Update last chart temperatures for next comparison
+    for source in settings.sources:
+        last_chart_temperatures[source.label] = legend_data[source.label].temperature
+
+    columnar_message = None
+    if changes is None:
+        # Clients have no chart version to apply changes to
+        message = _get_full_chart_message(legends_html)
+        columnar_message = _get_full_chart_message(legends_html, columnar=True)
+    elif chart_state.version != previous_version:
+        # Send only the points that changed since the previous chart version
         message = json.dumps(
-            {"type": "combined", "legends": legends_html, "chart": chart_data}
+            {
+                "type": "chart_delta",
+                "legends": legends_html,
+                "base_version": previous_version,
+                "version": chart_state.version,
+                "since": chart.iso_timestamps(chart_state.since_minute, CHART_SLOTS)[0],
+                "changes": changes,
+            }
         )
     else:
-        # Send only legend update
         message = json.dumps({"type": "legends", "legends": legends_html})
+    broadcast.broadcaster.broadcast(message, columnar_message=columnar_message)
+
+
+def _broadcast_legends():
+    """Broadcast legend updates, or a chart update if the chart changed."""
+    global broadcast_legends_version
+    if not dirty_sources:
+        return
+    dirty_sources.clear()
+    # A chart message carries the legends as well
+    if _should_update_chart() and chart_trigger.trigger():
+        return
+    legends_html = _get_legends_element()
+    if legend_renderer.version == broadcast_legends_version:
+        # Changed back to what the clients already show
+        return
+    broadcast_legends_version = legend_renderer.version
+    # A newer legends message replaces this one if still queued
+    broadcast.broadcaster.broadcast(
+        json.dumps({"type": "legends", "legends": legends_html}),
+        coalesce=True,
+    )
+
+
+# Labels whose legend changed since the last broadcast
+dirty_sources: set[str] = set()
+legend_trigger = broadcast.CoalescingTrigger(
+    settings.websocket.legend_interval_seconds, _broadcast_legends
+)
+chart_trigger = broadcast.CoalescingTrigger(
+    settings.websocket.chart_interval_seconds, _broadcast_chart
+)
+
+
+# Changes whenever the chart data or a legend changes, part of the ETag of
+# /temperatures. next() on a count is atomic, so the writer thread and the
+# event loop can both bump it.
+_data_versions = itertools.count(1)
+data_version = next(_data_versions)
+
+
+def _bump_data_version(*_):
+    global data_version
+    data_version = next(_data_versions)
+
+
+# Minute averages added to the cache change the chart
+cache.reading_listeners.append(_bump_data_version)
 
-    for websocket in ws_connections.copy():
-        try:
-            await websocket.send_text(message)
-        except WebSocketDisconnect:
-            logger.warning("Failed to send temperature data to websocket")
-            if websocket in ws_connections:
-                ws_connections.remove(websocket)
+
+def _mark_dirty(label: str):
+    _bump_data_version()
+    dirty_sources.add(label)
+    legend_trigger.trigger()
 
 
 async def reset_inactive_temperatures():
     while True:
-        await asyncio.sleep(10)
+        await clock.sleep(10)
         for source in settings.sources:
-            if (
-                datetime.now(tz=UTC) - legend_data[source.label].last_updated
-            ) >= timedelta(seconds=60 * 5):
+            if (clock.now() - legend_data[source.label].last_updated) >= timedelta(
+                seconds=60 * 5
+            ):
+                was_active = legend_data[source.label].temperature is not None
                 legend_data[source.label] = LegendData(
                     label=source.label,
                     temperature=None,
                     border_color=source.border_color.as_hex("long"),
                     background_color=source.background_color.as_hex("long"),
-                    last_updated=datetime.now(tz=UTC),
+                    last_updated=clock.now(),
                 )
-        await _broadcast_temperature_data()
+                if was_active:
+                    _mark_dirty(source.label)
+
+
+async def advance_chart_every_minute():
+    """Move the chart window forward every minute, broadcasting the changes.
+
+    Otherwise the chart only advances on significant legend changes, and
+    with stable temperatures new clients would get a window hours old. Runs
+    once the minute's average has been saved.
+    """
+    delay = (
+        settings.database.aggregation_flush_delay_seconds
+        + settings.database.flush_interval_seconds
+    )
+    while True:
+        now = clock.now()
+        next_minute = now.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        await clock.sleep((next_minute - now).total_seconds() + delay)
+        if chart_state is not None:
+            _broadcast_chart(only_changes=True)
 
 
 def _get_empty_temperature_data(
@@ -318,94 +419,200 @@ def _get_empty_temperature_data(
     return empty_temperature_data
 
 
-async def process_mqtt_queue(queue):
-    while True:
-        source_mqtt_topic, temperature = await queue.get()
-        for source in settings.sources:
-            if source.source == source_mqtt_topic:
-                temperature = (
-                    temperature * source.calibration_multiplier
-                    + source.calibration_offset
-                )
-                legend_data[source.label] = LegendData(
+def process_mqtt_readings(readings: dict[str, Decimal]):
+    """Update the legends from the latest reading of each MQTT topic."""
+    for source_mqtt_topic, temperature in readings.items():
+        for source in routing.source_registry.resolve(source_mqtt_topic):
+            calibrated = (
+                temperature * source.calibration_multiplier + source.calibration_offset
+            )
+            # Sources registered from a template have no chart history yet
+            last_chart_temperatures.setdefault(source.label, None)
+            previous = legend_data.get(source.label)
+            legend = LegendData(
+                label=source.label,
+                temperature=calibrated.quantize(Decimal("0.1")),
+                border_color=source.border_color.as_hex("long"),
+                background_color=source.background_color.as_hex("long"),
+                last_updated=clock.now(),
+            )
+            legend_data[source.label] = legend
+            # Readings that round to the shown temperature change nothing
+            if previous is None or legends.fingerprint(previous) != legends.fingerprint(
+                legend
+            ):
+                _mark_dirty(source.label)
+
+
+def _register_known_sources():
+    """Register sources saved by earlier runs that match a source template."""
+    for name in database.get_sources():
+        for source in routing.source_registry.resolve(name):
+            last_chart_temperatures.setdefault(source.label, None)
+            legend_data.setdefault(
+                source.label,
+                LegendData(
                     label=source.label,
-                    temperature=temperature.quantize(Decimal("0.1")),
+                    temperature=None,
                     border_color=source.border_color.as_hex("long"),
                     background_color=source.background_color.as_hex("long"),
-                    last_updated=datetime.now(tz=UTC),
-                )
-                await _broadcast_temperature_data()
-                break
-        queue.task_done()
+                    last_updated=clock.now(),
+                ),
+            )
+
+
+mqtt_bridge: ReadingBridge | None = None
+cache_hydration = hydration.CacheHydration(
+    snapshot.get_snapshot_path() if settings.cache.snapshot_enabled else None
+)
+snapshot_task = snapshot.SnapshotTask.from_settings()
+
+
+def _run_background_migrations(stop_event: Event):
+    database.migrate_legacy_data(stop_event=stop_event)
+    # Rollups of readings saved before they existed, the legacy migration
+    # computes its own
+    database.backfill_rollups(stop_event=stop_event)
+
+
+def _resync_chart():
+    """Send the full chart to all clients, e.g. once the cache is hydrated."""
+    global chart_state
+    chart_state = None
+    _broadcast_chart()
+
+
+async def _start_in_background(migration_stop: Event):
+    """Hydrate the cache and migrate old data while requests are served."""
+    # Migrate the last 24 hours of a legacy database before hydrating the
+    # cache, the rest is migrated once the cache is ready
+    await asyncio.to_thread(
+        database.migrate_legacy_data,
+        stop_before=clock.now() - timedelta(hours=24),
+        stop_event=migration_stop,
+    )
+    if not migration_stop.is_set():
+        await asyncio.to_thread(cache_hydration.run)
+    if cache_hydration.ready:
+        # Clients that connected meanwhile were sent a partial chart
+        _resync_chart()
+    migrations = asyncio.to_thread(_run_background_migrations, migration_stop)
+    if cache_hydration.ready and settings.cache.snapshot_enabled:
+        await asyncio.gather(snapshot_task.run(), migrations)
+    else:
+        await migrations
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(process_mqtt_queue(mqtt_message_queue))
+    global mqtt_bridge
+    mqtt_bridge = ReadingBridge(asyncio.get_running_loop(), process_mqtt_readings)
     asyncio.create_task(reset_inactive_temperatures())
+    chart_task = asyncio.create_task(advance_chart_every_minute())
     database.create_table()
-
-    # Initialize cache with existing data from database
-    from mqtt_thermometer import cache
-
-    cache.initialize_cache_from_database()
-
-    thread = Thread(target=mqtt.poll_mqtt_messages, args=(mqtt_message_queue,))
-    thread.start()
+    _register_known_sources()
+    # Requests are served right away, the cache fills in the background.
+    # /ready reports the progress.
+    migration_stop = Event()
+    startup_task = asyncio.create_task(_start_in_background(migration_stop))
+
+    write_behind.write_queue.start()
+    if settings.retention.enabled:
+        retention_task = asyncio.create_task(retention.retention_task.run())
+    aggregator_task = asyncio.create_task(
+        mqtt.aggregator.run(write_behind.write_queue.put_many)
+    )
+    if settings.mqtt_broker.ingest_mode == "asyncio":
+        ingest_task = asyncio.create_task(
+            mqtt.AsyncioIngest.from_settings(mqtt_bridge).run()
+        )
+    else:
+        thread = Thread(target=mqtt.poll_mqtt_messages, args=(mqtt_bridge,))
+        thread.start()
     yield
-    mqtt.stop_polling()
-    thread.join()
+    if settings.mqtt_broker.ingest_mode == "asyncio":
+        ingest_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await ingest_task
+    else:
+        mqtt.stop_polling()
+        thread.join()
+    aggregator_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await aggregator_task
+    # Save the minutes aggregated so far, including the unfinished one, and
+    # commit minute averages still waiting in the write-behind queue
+    write_behind.write_queue.put_many(mqtt.aggregator.flush())
+    write_behind.write_queue.stop()
+    # An interrupted migration resumes on the next start
+    cache_hydration.stop()
+    migration_stop.set()
+    snapshot_task.stop()
+    await startup_task
+    if settings.cache.snapshot_enabled and cache_hydration.ready:
+        # Everything saved is in the cache now
+        await asyncio.to_thread(snapshot_task.write)
+    if settings.retention.enabled:
+        retention.retention_task.stop()
+        await retention_task
+    chart_task.cancel()
+    legend_trigger.cancel()
+    chart_trigger.cancel()
+    await broadcast.broadcaster.close()
+    database.close_connections()
 
 
 app = FastAPI(lifespan=lifespan)
+if settings.compression.enabled:
+    app.add_middleware(
+        compression.CompressionMiddleware,
+        minimum_size=settings.compression.minimum_size,
+        gzip_level=settings.compression.gzip_level,
+        brotli_quality=settings.compression.brotli_quality,
+    )
 
 # Add version for cache busting
 APP_VERSION = "1.0.1"  # Increment this on each deployment
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    chart_format: Literal["json", "columnar"] = Query("json", alias="format"),
+    compress: Literal["none", "deflate"] = Query("none"),
+):
     await websocket.accept()
-    ws_connections.add(websocket)
+    columnar = chart_format == "columnar"
+    if chart_state is not None:
+        # Bring the other clients to the current chart before this one joins
+        _broadcast_chart(only_changes=True)
+    sender = broadcast.broadcaster.add(
+        websocket,
+        columnar=columnar,
+        compressed=compress == "deflate" and settings.compression.enabled,
+    )
     try:
-        # Send initial combined update with both legends and chart data
-        legends_html = _get_legends_element()
-        chart_data = {
-            "datasets": [
-                {
-                    "data": temperature_data,
-                    "label": source.label,
-                    "borderColor": source.border_color.as_hex("long"),
-                    "backgroundColor": source.background_color.as_hex("long"),
-                    "borderJoinStyle": "round",
-                }
-                for source in settings.sources
-                if (
-                    temperature_data := _get_temperature_data_for_source(
-                        source=source.source,
-                        calibration_multiplier=source.calibration_multiplier,
-                        calibration_offset=source.calibration_offset,
-                        for_json=True,
-                    )
-                )
-            ],
-        }
-
-        # Initialize last chart temperatures
-        for source in settings.sources:
-            last_chart_temperatures[source.label] = legend_data[
-                source.label
-            ].temperature
-
-        initial_message = json.dumps(
-            {"type": "combined", "legends": legends_html, "chart": chart_data}
-        )
-        await websocket.send_text(initial_message)
+        # Send initial combined update with both legends and the current
+        # chart version, later updates are deltas against it
+        sender.send(_get_full_chart_message(_get_legends_element(), columnar))
 
         while True:
-            await websocket.receive_text()
+            message = await websocket.receive_text()
+            if message == "resync":
+                # Client missed a chart version, send the full chart again
+                sender.send(_get_full_chart_message(_get_legends_element(), columnar))
     except WebSocketDisconnect:
-        ws_connections.remove(websocket)
+        pass
+    finally:
+        broadcast.broadcaster.remove(websocket)
+
+
+@app.get("/ready")
+async def get_ready():
+    """Readiness of the app - 503 until the cache has been hydrated."""
+    return JSONResponse(
+        cache_hydration.get_stats(), status_code=200 if cache_hydration.ready else 503
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -419,18 +626,125 @@ async def root_page(request: Request):
     }
 
 
-@app.get("/temperatures")
-async def get_temperatures(request: Request):  # noqa: ARG001
-    def _get_last_known_temperature(
-        temperature_data: dict[datetime, Decimal | None],
-    ) -> Decimal | None:
-        temperatures = list(temperature_data.values())
-        if temperatures[-1] is not None:
-            return Decimal(temperatures[-1]).quantize(Decimal("0.1"))
-        elif temperatures[-2] is not None:
-            return Decimal(temperatures[-2]).quantize(Decimal("0.1"))
+# Chart ranges longer than 24 hours are drawn from the rollup tables
+CHART_RANGES = {"7d": 7, "30d": 30, "365d": 365}
+# The coarsest rollup resolution giving at least this many points is used
+MIN_CHART_POINTS = 150
+
+
+def _get_rollup_resolution(days: int) -> int:
+    for resolution in reversed(database.ROLLUP_RESOLUTIONS):
+        if days * 24 * 60 * 60 // resolution >= MIN_CHART_POINTS:
+            return resolution
+    return database.ROLLUP_RESOLUTIONS[0]
+
+
+def _get_rollup_chart(days: int, columnar: bool = False) -> dict:
+    resolution = _get_rollup_resolution(days)
+    since = clock.now() - timedelta(days=days)
+    # Columnar values are on a grid of whole rollup buckets from start
+    start = -(-database.to_epoch_seconds(since) // resolution) * resolution
+    slots = (database.to_epoch_seconds(clock.now()) - start) // resolution + 1
+    datasets = []
+    for source in settings.sources:
+        multiplier = source.calibration_multiplier / 100
+        rollups = {
+            timestamp: float(
+                (average * multiplier + source.calibration_offset).quantize(
+                    Decimal("0.01")
+                )
+            )
+            for timestamp, _, average, _, _ in database.get_rollups(
+                source.source, resolution, since
+            )
+        }
+        dataset = {
+            "label": source.label,
+            "borderColor": source.border_color.as_hex("long"),
+            "backgroundColor": source.background_color.as_hex("long"),
+            "borderJoinStyle": "round",
+        }
+        if columnar:
+            dataset["values"] = [
+                rollups.get(start + index * resolution) for index in range(slots)
+            ]
         else:
-            return None
+            dataset["data"] = {
+                database.from_epoch_seconds(timestamp).isoformat(): average
+                for timestamp, average in rollups.items()
+            }
+        datasets.append(dataset)
+    if columnar:
+        return {
+            "format": "columnar",
+            "resolution": resolution,
+            "start": start,
+            "step": resolution,
+            "datasets": datasets,
+        }
+    return {"resolution": resolution, "datasets": datasets}
+
+
+# Lets a reverse proxy answer repeated polls, the 24 hour chart changes at
+# least every minute
+CHART_CACHE_CONTROL = "public, max-age=10, must-revalidate"
+ROLLUP_CHART_CACHE_CONTROL = "public, max-age=300, must-revalidate"
+
+
+def _get_chart_etag(chart_range: str, chart_format: str = "json") -> str:
+    """Strong ETag of a chart response, computed without building the chart."""
+    current_minute = int(clock.now().timestamp()) // 60
+    return (
+        f'"{chart_range}-{chart_format}-{data_version}-{cache.cache_generation}-'
+        f'{len(settings.sources)}-{current_minute}"'
+    )
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+@app.get("/temperatures")
+async def get_temperatures(
+    request: Request,
+    response: Response,
+    chart_range: Literal["24h", "7d", "30d", "365d"] = Query("24h", alias="range"),
+    chart_format: Literal["json", "columnar"] = Query("json", alias="format"),
+):
+    etag = _get_chart_etag(chart_range, chart_format)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": (
+            ROLLUP_CHART_CACHE_CONTROL
+            if chart_range in CHART_RANGES
+            else CHART_CACHE_CONTROL
+        ),
+    }
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    columnar = chart_format == "columnar"
+    if chart_range in CHART_RANGES:
+        return _get_rollup_chart(CHART_RANGES[chart_range], columnar)
+    if columnar:
+        since_minute = _get_chart_since_minute()
+        return _get_columnar_chart(
+            since_minute,
+            {
+                source.label: _get_temperature_series(
+                    source.source,
+                    source.calibration_multiplier,
+                    source.calibration_offset,
+                    since_minute,
+                )
+                for source in settings.sources
+            },
+        )
 
     return {
         "datasets": [
@@ -458,27 +772,57 @@ async def get_temperatures(request: Request):  # noqa: ARG001
 async def get_cache_stats():
     """Get cache statistics - useful for monitoring cache performance."""
     try:
-        from mqtt_thermometer import cache
-
         stats = cache.get_cache_stats()
         total_entries = sum(stats.values())
         return {
             "cache_stats": stats,
             "total_cached_entries": total_entries,
             "sources": list(stats.keys()),
+            "warmup": cache.warmup_stats,
         }
     except Exception as e:
         logger.error(f"Failed to get cache stats: {e}")
         return {"error": "Failed to get cache statistics"}
 
 
+@app.get("/database/stats")
+async def get_database_stats():
+    """Get write-behind queue and retention statistics."""
+    return {
+        "write_queue": write_behind.write_queue.get_stats(),
+        "retention": retention.retention_task.get_stats(),
+    }
+
+
+@app.get("/mqtt/stats")
+async def get_mqtt_stats():
+    """Get MQTT ingest statistics - received and coalesced readings."""
+    return mqtt_bridge.get_stats() if mqtt_bridge else {}
+
+
+@app.get("/websocket/stats")
+async def get_websocket_stats():
+    """Get websocket fan-out statistics - connected clients and their send queues."""
+    return broadcast.broadcaster.get_stats()
+
+
+@app.get("/legends/stats")
+async def get_legends_stats():
+    """Get legend rendering statistics - cache hits and re-rendered fragments."""
+    return legend_renderer.get_stats()
+
+
+@app.get("/compression/stats")
+async def get_compression_stats():
+    """Get compression statistics - bytes in and out and CPU time per encoding."""
+    return compression.stats.get_stats()
+
+
 @app.get("/debug/temperatures/{source}")
 async def debug_temperatures(source: str, use_cache: bool = True, hours: int = 24):
     """Debug endpoint to compare cache vs database data for a specific source."""
     try:
-        from mqtt_thermometer import cache
-
-        since = datetime.now(tz=UTC) - timedelta(hours=hours)
+        since = clock.now() - timedelta(hours=hours)
 
         if use_cache:
             results = database.get_temperatures_cached(source, since)
@@ -1,6 +1,6 @@
 from decimal import Decimal
 from pathlib import Path
-from typing import Tuple, Type
+from typing import Literal, Tuple, Type
 
 from pydantic import Field
 from pydantic_extra_types.color import Color
@@ -15,6 +15,77 @@ from pydantic_settings import (
 class MQTTBrokerSettings(BaseSettings):
     host: str = Field(default=...)
     port: int = Field(default=1883)
+    # "thread" runs the MQTT client in a dedicated thread, "asyncio" drives
+    # it from the event loop
+    ingest_mode: Literal["thread", "asyncio"] = Field(default="thread")
+
+
+class DatabaseSettings(BaseSettings):
+    # Minute averages are written by a background writer in group commits
+    write_queue_size: int = Field(default=1440)
+    flush_interval_seconds: float = Field(default=1.0)
+    flush_max_rows: int = Field(default=500)
+    # Minute aggregates are flushed this long after each minute boundary
+    aggregation_flush_delay_seconds: float = Field(default=2.0)
+
+
+class CacheSettings(BaseSettings):
+    # The 24 hour cache is saved to a snapshot on shutdown and periodically,
+    # a restart loads it and reads only newer rows from the database
+    snapshot_enabled: bool = Field(default=True)
+    # Defaults to the database path with a .snapshot suffix
+    snapshot_path: str | None = Field(default=None)
+    snapshot_interval_seconds: float = Field(default=900.0, gt=0)
+
+
+class RetentionSettings(BaseSettings):
+    # Days to keep each resolution, unset keeps it forever. The 24 hour chart
+    # needs at least a couple of days of minute readings.
+    raw_days: int | None = Field(default=None, ge=2)
+    five_minute_days: int | None = Field(default=None, ge=1)
+    hourly_days: int | None = Field(default=None, ge=1)
+    daily_days: int | None = Field(default=None, ge=1)
+    interval_seconds: float = Field(default=60 * 60)
+    batch_size: int = Field(default=1000, ge=1)
+    # Existing databases without incremental vacuum are converted with a full
+    # VACUUM that blocks writes, automatically only up to the size limit
+    convert_to_incremental_vacuum: bool = False
+    incremental_vacuum_conversion_max_bytes: int = Field(default=64 * 1024 * 1024, ge=0)
+
+    @property
+    def enabled(self) -> bool:
+        return any(
+            days is not None
+            for days in (
+                self.raw_days,
+                self.five_minute_days,
+                self.hourly_days,
+                self.daily_days,
+            )
+        )
+
+
+class WebsocketSettings(BaseSettings):
+    # Messages queued per client before the oldest ones are dropped
+    send_queue_size: int = Field(default=8)
+    # Clients whose send takes longer than this are disconnected
+    send_timeout_seconds: float = Field(default=10.0)
+    # Minimum time between legend-only and chart broadcasts, changes in
+    # between are coalesced into one message
+    legend_interval_seconds: float = Field(default=1.0)
+    chart_interval_seconds: float = Field(default=5.0)
+
+
+class CompressionSettings(BaseSettings):
+    enabled: bool = Field(default=True)
+    # Smaller HTTP responses are not worth compressing
+    minimum_size: int = Field(default=500, ge=0)
+    # Levels kept low for the CPU of a Raspberry Pi
+    gzip_level: int = Field(default=5, ge=1, le=9)
+    brotli_quality: int = Field(default=4, ge=0, le=11)
+    # Websocket messages are raw deflate, compressed once for all clients
+    websocket_level: int = Field(default=5, ge=1, le=9)
+    websocket_window_bits: int = Field(default=12, ge=9, le=15)
 
 
 class SourceSettings(BaseSettings):
@@ -26,6 +97,24 @@ class SourceSettings(BaseSettings):
     background_color: Color = Field(default=...)
 
 
+class SourceTemplateSettings(BaseSettings):
+    # MQTT topic filter, may contain + and # wildcards. Topics matching it
+    # are registered as sources when their first message arrives.
+    topic: str = Field(default=...)
+    # Formatted with the levels matched by the wildcards ({0}, {1}, ...)
+    # and the full {topic}
+    label: str = Field(default="{topic}")
+    calibration_multiplier: Decimal = Field(default=Decimal("1.0"))
+    calibration_offset: Decimal = Field(default=Decimal("0.0"))
+    # Registered sources take the colours in turn
+    border_colors: list[Color] = Field(
+        default=[Color("#dd00dd"), Color("#0000dd"), Color("#dd8800")], min_length=1
+    )
+    background_colors: list[Color] = Field(
+        default=[Color("#ff00ff"), Color("#0000ff"), Color("#ffaa00")], min_length=1
+    )
+
+
 def _get_toml_file_path() -> Path:
     # Check if config path is provided via environment variable (for Docker)
     env_config_path = (
@@ -69,7 +158,13 @@ class RootSettings(BaseSettings):
     db_connection_string: str = Field(
         default="data/mqtt-thermometer.db"
     )  # Default to data directory for Docker
+    database: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    websocket: WebsocketSettings = Field(default_factory=WebsocketSettings)
+    compression: CompressionSettings = Field(default_factory=CompressionSettings)
+    retention: RetentionSettings = Field(default_factory=RetentionSettings)
     sources: list[SourceSettings] = Field(default=...)
+    source_templates: list[SourceTemplateSettings] = Field(default_factory=list)
 
     model_config = SettingsConfigDict(
         toml_file=_get_toml_file_path(),
@@ -0,0 +1,209 @@
+"""Binary snapshots of the temperature cache for fast restarts.
+
+A snapshot is a 32 byte header followed by the readings of each source::
+
+    header:  magic "MQTC", format version (u16), reserved (u16),
+             newest cached epoch minute (i64), database high-water mark in
+             epoch seconds (i64), number of sources (u32), CRC-32 of the
+             rest of the file (u32)
+    source:  name length (u16), reading count (u32), UTF-8 name,
+             epoch minutes (i64 x count), centi-degrees (i32 x count)
+
+Header fields are little-endian, the reading arrays are in the machine's
+byte order. On startup the snapshot is memory-mapped and validated, and only
+the rows saved since it was written are read from the database.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from contextlib import suppress
+from pathlib import Path
+
+from mqtt_thermometer import cache, database
+from mqtt_thermometer.settings import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MQTC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHqqII")
+SOURCE_HEADER = struct.Struct("<HI")
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def get_snapshot_path() -> Path:
+    if settings.cache.snapshot_path:
+        return Path(settings.cache.snapshot_path)
+    return Path(f"{settings.db_connection_string}.snapshot")
+
+
+def write_snapshot(path: Path) -> bool:
+    """Write the cache to a snapshot file, replacing it atomically."""
+    try:
+        # Rows up to the high-water mark are in the cache once it is read,
+        # the cache is only updated after the rows have been committed
+        high_water_mark = database.get_high_water_mark() or 0
+        readings = cache.get_all_readings()
+        last_minute = max(
+            (minutes[-1] for minutes, _ in readings.values() if minutes), default=0
+        )
+        body = bytearray()
+        for source, (minutes, values) in readings.items():
+            name = source.encode()
+            body += SOURCE_HEADER.pack(len(name), len(minutes))
+            body += name
+            body += minutes.tobytes()
+            body += values.tobytes()
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            0,
+            last_minute,
+            high_water_mark,
+            len(readings),
+            zlib.crc32(body),
+        )
+        temporary_path = path.with_name(f"{path.name}.tmp")
+        with open(temporary_path, "wb") as file:
+            file.write(header)
+            file.write(body)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, path)
+        logger.debug(f"Wrote cache snapshot of {len(readings)} sources to {path}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to write cache snapshot: {e}")
+        return False
+
+
+def read_snapshot(
+    path: Path,
+) -> tuple[int, int, dict[str, tuple[array, array]]]:
+    """Read and validate a snapshot.
+
+    Returns (last_minute, high_water_mark, readings by source). Raises
+    SnapshotError if the file is not a valid snapshot and OSError if it
+    cannot be read.
+    """
+    with (
+        open(path, "rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data,
+    ):
+        if len(data) < HEADER.size:
+            raise SnapshotError("truncated header")
+        magic, version, _, last_minute, high_water_mark, source_count, crc = (
+            HEADER.unpack_from(data)
+        )
+        if magic != MAGIC:
+            raise SnapshotError("not a cache snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"unsupported format version {version}")
+        with memoryview(data) as view:
+            body = view[HEADER.size :]
+            try:
+                if zlib.crc32(body) != crc:
+                    raise SnapshotError("checksum mismatch")
+                readings = {}
+                offset = 0
+                for _ in range(source_count):
+                    if offset + SOURCE_HEADER.size > len(body):
+                        raise SnapshotError("truncated source")
+                    name_length, count = SOURCE_HEADER.unpack_from(body, offset)
+                    offset += SOURCE_HEADER.size
+                    end = offset + name_length + count * 12
+                    if end > len(body):
+                        raise SnapshotError("truncated readings")
+                    name = bytes(body[offset : offset + name_length]).decode()
+                    offset += name_length
+                    minutes = array("q")
+                    minutes.frombytes(body[offset : offset + count * 8])
+                    offset += count * 8
+                    values = array("i")
+                    values.frombytes(body[offset : offset + count * 4])
+                    offset += count * 4
+                    readings[name] = (minutes, values)
+            finally:
+                body.release()
+    return last_minute, high_water_mark, readings
+
+
+def restore_cache(path: Path) -> bool:
+    """Load the cache from a snapshot and the rows saved after it.
+
+    Returns False, leaving the cache as it is, if there is no valid
+    snapshot.
+    """
+    started = time.perf_counter()
+    try:
+        last_minute, high_water_mark, readings = read_snapshot(path)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring cache snapshot {path}: {e}")
+        return False
+
+    cache.load_readings(readings)
+    # The newest minute may have been updated after the snapshot was written
+    replay_from = min(last_minute * 60, high_water_mark)
+    replayed = cache.replay_from_database(database.from_epoch_seconds(replay_from))
+    seconds = time.perf_counter() - started
+    cache.warmup_stats.clear()
+    cache.warmup_stats.update(
+        {
+            "source": "snapshot",
+            "rows": sum(len(minutes) for minutes, _ in readings.values()),
+            "replayed_rows": replayed,
+            "seconds": round(seconds, 3),
+        }
+    )
+    logger.info(
+        f"Cache restored from snapshot with {replayed} newer rows from database "
+        f"in {seconds:.2f} seconds."
+    )
+    return True
+
+
+class SnapshotTask:
+    """Periodically writes the cache snapshot in a worker thread."""
+
+    def __init__(self, path: Path, interval_seconds: float):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.writes = 0
+        self._stopped = asyncio.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "SnapshotTask":
+        return cls(get_snapshot_path(), settings.cache.snapshot_interval_seconds)
+
+    def write(self) -> bool:
+        # The periodic and the final write must not interleave
+        with self._lock:
+            written = write_snapshot(self.path)
+        if written:
+            self.writes += 1
+        return written
+
+    async def run(self):
+        """Write a snapshot every interval until stop() is called."""
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._stopped.wait(), self.interval_seconds)
+            if self._stopped.is_set():
+                return
+            await asyncio.to_thread(self.write)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from mqtt_thermometer import database
+from mqtt_thermometer.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (source, minute, average) or (source, minute, average, minimum, maximum, count)
+Row = (
+    tuple[str, datetime, Decimal] | tuple[str, datetime, Decimal, Decimal, Decimal, int]
+)
+
+
+class WriteBehindQueue:
+    """Bounded queue of minute averages drained by a dedicated writer thread.
+
+    Producers (the MQTT callbacks) never touch the database. Each queue item
+    is one batch of rows, typically all sources for one minute. The writer
+    collects batches for up to ``flush_interval`` seconds or ``flush_max_rows``
+    rows and commits them in a single transaction.
+    """
+
+    def __init__(self, max_size: int, flush_interval: float, flush_max_rows: int):
+        self.flush_interval = flush_interval
+        self.flush_max_rows = flush_max_rows
+        self._queue: queue.Queue[list[Row]] = queue.Queue(maxsize=max_size)
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats_lock = threading.Lock()
+        self._pending_rows = 0
+        self._enqueued_rows = 0
+        self._dropped_rows = 0
+        self._committed_rows = 0
+        self._failed_rows = 0
+        self._commits = 0
+        self._total_commit_seconds = 0.0
+        self._max_commit_seconds = 0.0
+        self._last_commit_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls) -> "WriteBehindQueue":
+        return cls(
+            max_size=settings.database.write_queue_size,
+            flush_interval=settings.database.flush_interval_seconds,
+            flush_max_rows=settings.database.flush_max_rows,
+        )
+
+    def put_many(self, rows: list[Row]) -> bool:
+        """Enqueue rows without blocking. Returns False if the queue is full."""
+        if not rows:
+            return True
+        with self._stats_lock:
+            self._pending_rows += len(rows)
+        try:
+            self._queue.put_nowait(list(rows))
+        except queue.Full:
+            with self._stats_lock:
+                self._pending_rows -= len(rows)
+                self._dropped_rows += len(rows)
+            logger.error("Write queue full, dropped %d rows", len(rows))
+            return False
+        with self._stats_lock:
+            self._enqueued_rows += len(rows)
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread and commit everything still queued."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Commit all queued rows from the calling thread."""
+        while batch := self._collect(wait=False):
+            self._commit(batch)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if batch := self._collect(wait=True):
+                self._commit(batch)
+
+    def _collect(self, wait: bool) -> list[Row]:
+        try:
+            # Wake up periodically to notice a stop request
+            batch = self._queue.get(timeout=0.5) if wait else self._queue.get_nowait()
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + (self.flush_interval if wait else 0)
+        while len(batch) < self.flush_max_rows:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.extend(self._queue.get(timeout=remaining))
+                else:
+                    batch.extend(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: list[Row]):
+        started = time.perf_counter()
+        success = database.save_temperatures(batch)
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self._pending_rows -= len(batch)
+            if success:
+                self._commits += 1
+                self._committed_rows += len(batch)
+                self._total_commit_seconds += elapsed
+                self._max_commit_seconds = max(self._max_commit_seconds, elapsed)
+                self._last_commit_seconds = elapsed
+            else:
+                self._failed_rows += len(batch)
+        if not success:
+            logger.error("Failed to save %d temperature rows", len(batch))
+
+    def get_stats(self) -> dict[str, int | float]:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._pending_rows,
+                "enqueued_rows": self._enqueued_rows,
+                "dropped_rows": self._dropped_rows,
+                "committed_rows": self._committed_rows,
+                "failed_rows": self._failed_rows,
+                "commits": self._commits,
+                "last_commit_ms": self._last_commit_seconds * 1000,
+                "max_commit_ms": self._max_commit_seconds * 1000,
+                "avg_commit_ms": (
+                    self._total_commit_seconds / self._commits * 1000
+                    if self._commits
+                    else 0.0
+                ),
+            }
+
+
+write_queue = WriteBehindQueue.from_settings()
@@ -0,0 +1,79 @@
+"""Tests for the minute aggregator."""
+
+import asyncio
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import clock
+from mqtt_thermometer.aggregate import MinuteAggregator
+
+MINUTE = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+
+
+class TestMinuteAggregator(unittest.TestCase):
+    def test_running_aggregates(self):
+        aggregator = MinuteAggregator(flush_delay_seconds=0)
+        for second, value in ((1, "20.0"), (20, "21.0"), (40, "20.5"), (59, "19.5")):
+            aggregator.add("sauna", Decimal(value), MINUTE + timedelta(seconds=second))
+
+        rows = aggregator.flush(before=MINUTE + timedelta(minutes=1))
+
+        self.assertEqual(
+            rows,
+            [
+                (
+                    "sauna",
+                    MINUTE,
+                    Decimal("20.25"),
+                    Decimal("19.5"),
+                    Decimal("21.0"),
+                    4,
+                )
+            ],
+        )
+
+    def test_flush_keeps_unfinished_minute(self):
+        aggregator = MinuteAggregator(flush_delay_seconds=0)
+        aggregator.add("sauna", Decimal("20"), MINUTE)
+        aggregator.add("sauna", Decimal("21"), MINUTE + timedelta(minutes=1))
+
+        rows = aggregator.flush(before=MINUTE + timedelta(minutes=1))
+
+        self.assertEqual([row[1] for row in rows], [MINUTE])
+        self.assertEqual(
+            [row[1] for row in aggregator.flush()], [MINUTE + timedelta(minutes=1)]
+        )
+
+    def test_reading_for_flushed_minute_is_dropped(self):
+        aggregator = MinuteAggregator(flush_delay_seconds=0)
+        aggregator.add("sauna", Decimal("20"), MINUTE)
+        aggregator.flush(before=MINUTE + timedelta(minutes=1))
+
+        aggregator.add("sauna", Decimal("25"), MINUTE + timedelta(seconds=59))
+
+        self.assertEqual(aggregator.late_readings, 1)
+        self.assertEqual(aggregator.flush(), [])
+
+
+class TestMinuteAggregatorTimer(unittest.IsolatedAsyncioTestCase):
+    async def test_quiet_minute_is_flushed_by_timer(self):
+        simulated = clock.SimulatedClock(MINUTE + timedelta(seconds=30))
+        aggregator = MinuteAggregator(flush_delay_seconds=2)
+        aggregator.add("sauna", Decimal("20"), MINUTE)
+        written = []
+
+        with clock.use_clock(simulated):
+            task = asyncio.create_task(aggregator.run(written.append))
+            await asyncio.sleep(0)
+            # Nothing is flushed before the delay after the minute boundary
+            simulated.advance(31)
+            await asyncio.sleep(0)
+            self.assertEqual(written, [])
+
+            simulated.advance(1)
+            await asyncio.sleep(0)
+            task.cancel()
+
+        self.assertEqual(len(written), 1)
+        self.assertEqual(written[0][0][1], MINUTE)
@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+from benchmarks.synthetic import SyntheticStream
+
+UNTIL = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def test_stream_is_reproducible():
+    stream = SyntheticStream(sources=2, hours=2, gaps="random", seed=1)
+
+    assert list(stream.readings(UNTIL)) == list(stream.readings(UNTIL))
+
+
+def test_periodic_gaps_leave_out_ten_minutes_an_hour():
+    stream = SyntheticStream(sources=3, messages_per_minute=2, hours=2, gaps="periodic")
+
+    averages = list(stream.minute_averages(UNTIL))
+
+    assert len(averages) == 3 * 2 * 50
+    assert all(minute.minute % 60 < 50 for _, minute, _ in averages)
+
+
+def test_benchmarks_write_json(tmp_path: Path):
+    output = tmp_path / "bench.json"
+
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks",
+            "--sources=2",
+            "--hours=1",
+            "--clients=2",
+            "--repeat=2",
+            f"--output={output}",
+        ],
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+    )
+
+    results = json.loads(output.read_text())["results"]
+    assert results["mqtt_on_message"]["messages_per_second"] > 0
+    assert results["broadcast_chart"]["chart_delta"]["count"] == 2
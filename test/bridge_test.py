@@ -0,0 +1,42 @@
+"""Tests for the MQTT thread to event loop bridge."""
+
+import asyncio
+import threading
+import unittest
+from decimal import Decimal
+
+from mqtt_thermometer.bridge import ReadingBridge
+
+
+class TestReadingBridge(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_is_drained_once_with_latest_readings(self):
+        batches = []
+        bridge = ReadingBridge(asyncio.get_running_loop(), batches.append)
+
+        def publish():
+            for value in range(100):
+                bridge.put("sauna", Decimal(value))
+                bridge.put("tupa", Decimal(value) + 1)
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        thread.join()
+        await asyncio.sleep(0)
+
+        self.assertEqual(batches, [{"sauna": Decimal(99), "tupa": Decimal(100)}])
+        self.assertEqual(bridge.get_stats()["received_readings"], 200)
+        self.assertEqual(bridge.get_stats()["coalesced_readings"], 198)
+
+    async def test_reading_after_drain_wakes_loop_again(self):
+        batches = []
+        bridge = ReadingBridge(asyncio.get_running_loop(), batches.append)
+
+        bridge.put("sauna", Decimal("80.0"))
+        await asyncio.sleep(0)
+        bridge.put("sauna", Decimal("81.0"))
+        await asyncio.sleep(0)
+
+        self.assertEqual(
+            batches, [{"sauna": Decimal("80.0")}, {"sauna": Decimal("81.0")}]
+        )
+        self.assertEqual(bridge.get_stats()["coalesced_readings"], 0)
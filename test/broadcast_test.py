@@ -0,0 +1,143 @@
+"""Tests for the websocket fan-out."""
+
+import asyncio
+import unittest
+import zlib
+
+from mqtt_thermometer.broadcast import Broadcaster, CoalescingTrigger
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent: list[str] = []
+        self.closed = False
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, message: bytes):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+class TestBroadcaster(unittest.IsolatedAsyncioTestCase):
+    async def test_messages_are_sent_in_order(self):
+        broadcaster = Broadcaster(queue_size=8, send_timeout=1.0)
+        websocket = FakeWebSocket()
+        broadcaster.add(websocket)
+
+        broadcaster.broadcast("a")
+        broadcaster.broadcast("b")
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(websocket.sent, ["a", "b"])
+        await broadcaster.close()
+
+    async def test_columnar_clients_get_columnar_message(self):
+        broadcaster = Broadcaster(queue_size=8, send_timeout=1.0)
+        websocket = FakeWebSocket()
+        columnar_websocket = FakeWebSocket()
+        broadcaster.add(websocket)
+        broadcaster.add(columnar_websocket, columnar=True)
+
+        broadcaster.broadcast("full", columnar_message="columnar")
+        broadcaster.broadcast("delta")
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(websocket.sent, ["full", "delta"])
+        self.assertEqual(columnar_websocket.sent, ["columnar", "delta"])
+        await broadcaster.close()
+
+    async def test_compressed_clients_share_compressed_message(self):
+        broadcaster = Broadcaster(queue_size=8, send_timeout=1.0)
+        websocket = FakeWebSocket()
+        compressed = [FakeWebSocket(), FakeWebSocket()]
+        broadcaster.add(websocket)
+        for client in compressed:
+            broadcaster.add(client, compressed=True)
+
+        broadcaster.broadcast("a" * 100)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(websocket.sent, ["a" * 100])
+        first, second = (client.sent[0] for client in compressed)
+        self.assertIs(first, second)
+        self.assertEqual(zlib.decompress(first, -15).decode(), "a" * 100)
+        await broadcaster.close()
+
+    async def test_queued_legends_are_coalesced(self):
+        broadcaster = Broadcaster(queue_size=8, send_timeout=1.0)
+        websocket = FakeWebSocket()
+        sender = broadcaster.add(websocket)
+
+        # Nothing is sent before the sender task runs
+        broadcaster.broadcast("legends 1", coalesce=True)
+        broadcaster.broadcast("chart")
+        broadcaster.broadcast("legends 2", coalesce=True)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(websocket.sent, ["chart", "legends 2"])
+        self.assertEqual(sender.coalesced_messages, 1)
+        await broadcaster.close()
+
+    async def test_full_queue_drops_oldest(self):
+        broadcaster = Broadcaster(queue_size=2, send_timeout=1.0)
+        websocket = FakeWebSocket()
+        sender = broadcaster.add(websocket)
+
+        for message in ("a", "b", "c"):
+            broadcaster.broadcast(message)
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(websocket.sent, ["b", "c"])
+        self.assertEqual(sender.dropped_messages, 1)
+        await broadcaster.close()
+
+    async def test_slow_client_does_not_hold_up_others(self):
+        broadcaster = Broadcaster(queue_size=8, send_timeout=0.05)
+        slow = FakeWebSocket(delay=1.0)
+        fast = FakeWebSocket()
+        broadcaster.add(slow)
+        broadcaster.add(fast)
+
+        broadcaster.broadcast("a")
+        await asyncio.sleep(0.01)
+        self.assertEqual(fast.sent, ["a"])
+
+        # The slow client is closed and evicted after the send timeout
+        await asyncio.sleep(0.1)
+        self.assertTrue(slow.closed)
+        self.assertEqual(len(broadcaster), 1)
+        self.assertEqual(broadcaster.get_stats()["evicted_clients"], 1)
+        await broadcaster.close()
+
+
+class TestCoalescingTrigger(unittest.IsolatedAsyncioTestCase):
+    async def test_first_trigger_runs_immediately_and_rest_coalesce(self):
+        runs = []
+        trigger = CoalescingTrigger(0.05, lambda: runs.append(len(runs)))
+
+        self.assertTrue(trigger.trigger())
+        for _ in range(5):
+            self.assertFalse(trigger.trigger())
+        self.assertEqual(len(runs), 1)
+
+        # One trailing run covers all the triggers within the interval
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(trigger.coalesced, 5)
+
+    async def test_trigger_after_quiet_period_runs_immediately(self):
+        runs = []
+        trigger = CoalescingTrigger(0.01, lambda: runs.append(len(runs)))
+
+        trigger.trigger()
+        await asyncio.sleep(0.02)
+
+        self.assertTrue(trigger.trigger())
+        self.assertEqual(len(runs), 2)
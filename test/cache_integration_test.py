@@ -3,6 +3,7 @@
 import os
 import tempfile
 import unittest
+import unittest.mock
 from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 
@@ -26,6 +27,7 @@ class TestCacheIntegration(unittest.TestCase):
     def tearDown(self):
         """Clean up test database and cache."""
         cache.clear_cache()
+        database.close_connections()
         database.settings.db_connection_string = self.original_connection_string
         os.close(self.db_fd)
         os.unlink(self.db_path)
@@ -33,7 +35,8 @@ class TestCacheIntegration(unittest.TestCase):
     def test_save_and_retrieve_with_cache(self):
         """Test that saving to database also populates cache."""
         source = "test/sensor"
-        timestamp = datetime.now(tz=UTC)
+        # The cache stores minute averages at minute resolution
+        timestamp = datetime.now(tz=UTC).replace(second=0, microsecond=0)
         temperature = Decimal("22.5")
 
         # Save to database (should also populate cache)
@@ -56,13 +59,9 @@ class TestCacheIntegration(unittest.TestCase):
         temperature = Decimal("23.0")
 
         # Save directly to database (bypass cache)
-        with database.get_database_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
-                (source, timestamp.isoformat(), temperature),
-            )
-            conn.commit()
+        database.save_temperatures(
+            [(source, timestamp, temperature)], add_to_cache=False
+        )
 
         # Cache should be empty, so cache-only method returns nothing
         since = timestamp - timedelta(minutes=1)
@@ -84,13 +83,7 @@ class TestCacheIntegration(unittest.TestCase):
         # Add old data directly to database (simulating existing data)
         old_time = base_time - timedelta(hours=2)
         old_temp = Decimal("20.0")
-        with database.get_database_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
-                (source, old_time.isoformat(), old_temp),
-            )
-            conn.commit()
+        database.save_temperatures([(source, old_time, old_temp)], add_to_cache=False)
 
         # Add recent data via normal save (should populate cache)
         recent_temp = Decimal("25.0")
@@ -120,14 +113,13 @@ class TestCacheIntegration(unittest.TestCase):
             (base_time, Decimal("21.0")),
         ]
 
-        with database.get_database_connection() as conn:
-            cursor = conn.cursor()
-            for timestamp, temperature in temperatures:
-                cursor.execute(
-                    "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
-                    (source, timestamp.isoformat(), temperature),
-                )
-            conn.commit()
+        database.save_temperatures(
+            [
+                (source, timestamp, temperature)
+                for timestamp, temperature in temperatures
+            ],
+            add_to_cache=False,
+        )
 
         # Clear cache and initialize from database
         cache.clear_cache()
@@ -148,6 +140,32 @@ class TestCacheIntegration(unittest.TestCase):
         stats = cache.get_cache_stats()
         self.assertEqual(stats[source], 3)
 
+    def test_cache_initialization_streams_all_sources_in_batches(self):
+        """Test that readings of several sources split across batches all load."""
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+        sources = ["test/a", "test/b", "test/c"]
+        database.save_temperatures(
+            [
+                (source, now - timedelta(minutes=minute), Decimal(minute))
+                for source in sources
+                for minute in range(10)
+            ]
+            # Older than the cache window
+            + [("test/a", now - timedelta(hours=25), Decimal("1.0"))],
+            add_to_cache=False,
+        )
+
+        with unittest.mock.patch.object(database, "WARMUP_BATCH_SIZE", 4):
+            batches = list(database.iter_recent_readings(now - cache.CACHE_MAX_AGE, 4))
+            cache.initialize_cache_from_database()
+
+        self.assertEqual([len(batch) for batch in batches], [4] * 7 + [2])
+        self.assertEqual(cache.get_cache_stats(), dict.fromkeys(sources, 10))
+        minutes, values = cache.get_readings("test/b", now - timedelta(hours=1))
+        self.assertEqual(list(values), [minute * 100 for minute in range(9, -1, -1)])
+        self.assertEqual(list(minutes), sorted(minutes))
+        self.assertEqual(cache.warmup_stats["rows"], 30)
+
     def test_cache_initialization_with_empty_database(self):
         """Test cache initialization when database is empty."""
         # Clear any existing data and cache
@@ -175,14 +193,10 @@ class TestCacheIntegration(unittest.TestCase):
             ),  # Last data 2.5 hours ago
         ]
 
-        with database.get_database_connection() as conn:
-            cursor = conn.cursor()
-            for timestamp, temperature in old_data:
-                cursor.execute(
-                    "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
-                    (source, timestamp.isoformat(), temperature),
-                )
-            conn.commit()
+        database.save_temperatures(
+            [(source, timestamp, temperature) for timestamp, temperature in old_data],
+            add_to_cache=False,
+        )
 
         # Initialize cache from database
         cache.clear_cache()
@@ -1,6 +1,7 @@
 """Tests for the temperature cache functionality."""
 
 import unittest
+from array import array
 from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 
@@ -19,7 +20,8 @@ class TestTemperatureCache(unittest.TestCase):
     def test_add_and_retrieve_temperature(self):
         """Test adding and retrieving temperature from cache."""
         source = "test/sensor"
-        timestamp = datetime.now(tz=UTC)
+        # The cache stores minute averages at minute resolution
+        timestamp = datetime.now(tz=UTC).replace(second=0, microsecond=0)
         temperature = Decimal("20.5")
 
         # Add temperature to cache
@@ -134,6 +136,130 @@ class TestTemperatureCache(unittest.TestCase):
         self.assertEqual(stats["source1"], 2)
         self.assertEqual(stats["source2"], 1)
 
+    def test_get_readings_returns_native_values(self):
+        """Test that readings are returned as epoch minutes and centi-degrees."""
+        base_time = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        for minute in range(5):
+            cache.temperature_cache.setdefault("source1", cache.TemperatureRing()).add(
+                int(base_time.timestamp()) // 60 + minute, 2000 + minute
+            )
+
+        minutes, values = cache.get_readings(
+            "source1", base_time + timedelta(minutes=2, seconds=30)
+        )
+
+        base_minute = int(base_time.timestamp()) // 60
+        self.assertEqual(list(minutes), [base_minute + 3, base_minute + 4])
+        self.assertEqual(list(values), [2003, 2004])
+        self.assertEqual(
+            [len(r) for r in cache.get_readings("missing", base_time)], [0, 0]
+        )
+
+
+class TestTemperatureRing(unittest.TestCase):
+    def test_prepend_inserts_older_readings(self):
+        ring = cache.TemperatureRing(capacity=5)
+        ring.add(10, 100)
+        ring.add(11, 110)
+
+        # Minute 11 is already there and gets replaced
+        ring.prepend(array("q", [7, 8, 11]), array("i", [70, 80, 111]))
+        self.assertEqual(
+            ring.snapshot(),
+            (array("q", [7, 8, 10, 11]), array("i", [70, 80, 100, 111])),
+        )
+
+        # Only the newest of the older readings fit
+        ring.prepend(array("q", [4, 5, 6]), array("i", [40, 50, 60]))
+        self.assertEqual(ring.minute_at(0), 6)
+        self.assertEqual(len(ring), 5)
+
+    def test_extend_appends_in_bulk_and_wraps(self):
+        ring = cache.TemperatureRing(capacity=4)
+        ring.extend(array("q", [1, 2, 3]), array("i", [10, 20, 30]))
+        self.assertEqual(
+            ring.snapshot(), (array("q", [1, 2, 3]), array("i", [10, 20, 30]))
+        )
+
+        # Past the capacity the oldest readings are overwritten
+        ring.extend(array("q", [4, 5]), array("i", [40, 50]))
+        self.assertEqual(
+            ring.snapshot(), (array("q", [2, 3, 4, 5]), array("i", [20, 30, 40, 50]))
+        )
+
+    def test_append_and_snapshot(self):
+        """Test that appended readings are returned in order."""
+        ring = cache.TemperatureRing(capacity=4)
+        for minute in range(3):
+            self.assertTrue(ring.add(minute, minute * 100))
+
+        minutes, values = ring.snapshot()
+
+        self.assertEqual(list(minutes), [0, 1, 2])
+        self.assertEqual(list(values), [0, 100, 200])
+        self.assertEqual(list(ring.snapshot(2)[0]), [2])
+
+    def test_full_ring_overwrites_oldest(self):
+        """Test that the oldest reading is dropped when the ring is full."""
+        ring = cache.TemperatureRing(capacity=3)
+        for minute in range(5):
+            ring.add(minute, minute)
+
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(list(ring.snapshot()[0]), [2, 3, 4])
+
+    def test_late_reading_is_inserted_in_order(self):
+        """Test that out-of-order readings are inserted in place."""
+        ring = cache.TemperatureRing(capacity=4)
+        ring.add(10, 1)
+        ring.add(13, 4)
+        ring.add(11, 2)
+        ring.add(12, 3)
+        ring.add(9, 0)
+
+        # Ring was full, so the oldest reading made room
+        self.assertEqual(list(ring.snapshot()[0]), [10, 11, 12, 13])
+        self.assertEqual(list(ring.snapshot()[1]), [1, 2, 3, 4])
+
+    def test_same_minute_replaces_value(self):
+        """Test that a reading for an existing minute replaces its value."""
+        ring = cache.TemperatureRing(capacity=4)
+        ring.add(1, 100)
+        ring.add(2, 200)
+        ring.add(1, 150)
+
+        self.assertEqual(list(ring.snapshot()[1]), [150, 200])
+
+    def test_too_late_reading_is_rejected(self):
+        """Test that the late insertion is bounded."""
+        ring = cache.TemperatureRing(capacity=200)
+        for minute in range(100, 100 + cache.MAX_LATE_SLOTS + 10):
+            ring.add(minute, 0)
+
+        self.assertFalse(ring.add(100, 1))
+        self.assertTrue(ring.add(100 + 10 + 1, 1))
+
+    def test_bisect_left_across_wrap(self):
+        """Test the binary search when the ring has wrapped around."""
+        ring = cache.TemperatureRing(capacity=4)
+        for minute in range(10, 16):
+            ring.add(minute, 0)
+
+        self.assertEqual(ring.bisect_left(0), 0)
+        self.assertEqual(ring.bisect_left(13), 1)
+        self.assertEqual(ring.bisect_left(15), 3)
+        self.assertEqual(ring.bisect_left(16), 4)
+
+    def test_expire(self):
+        """Test that expiry drops readings older than the cutoff."""
+        ring = cache.TemperatureRing(capacity=4)
+        for minute in range(4):
+            ring.add(minute, minute)
+
+        ring.expire(2)
+
+        self.assertEqual(list(ring.snapshot()[0]), [2, 3])
+
 
 if __name__ == "__main__":
     unittest.main()
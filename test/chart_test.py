@@ -0,0 +1,250 @@
+"""Tests for the vectorized chart series engine."""
+
+from array import array
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import numpy as np
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from mqtt_thermometer import cache, chart
+
+SINCE_MINUTE = 29_000_000
+
+
+def _reference_series(readings, slots, multiplier, offset, latest_temperature):
+    """The original per-minute Decimal implementation of the chart series."""
+    MAX_STEP = Decimal("0.5")
+    MAX_GAP_MINUTES = 10
+
+    last_temperature = None
+    temperature_data = [None] * slots
+    for minute, centidegrees in readings:
+        temperature = Decimal(centidegrees).scaleb(-2) * multiplier + offset
+        if last_temperature is not None:
+            if temperature - last_temperature > MAX_STEP:
+                temperature = last_temperature + MAX_STEP
+            elif temperature - last_temperature < -MAX_STEP:
+                temperature = last_temperature - MAX_STEP
+        last_temperature = temperature
+        if 0 <= minute - SINCE_MINUTE < slots:
+            temperature_data[minute - SINCE_MINUTE] = temperature
+
+    values = list(temperature_data)
+    for i in range(len(values)):
+        if values[i] is None:
+            prev_index = next(
+                (j for j in range(i - 1, -1, -1) if values[j] is not None), None
+            )
+            next_index = next(
+                (j for j in range(i + 1, len(values)) if values[j] is not None), None
+            )
+            if (
+                prev_index is not None
+                and next_index is not None
+                and next_index - prev_index <= MAX_GAP_MINUTES
+            ):
+                gap_size = next_index - prev_index
+                temperature_data[i] = values[prev_index] + (
+                    values[next_index] - values[prev_index]
+                ) * (Decimal(i - prev_index) / Decimal(gap_size))
+
+    if latest_temperature is not None:
+        current = slots - 1
+        latest_temp = latest_temperature
+        last_index = next(
+            (i for i in range(slots - 1, -1, -1) if temperature_data[i] is not None),
+            None,
+        )
+        if last_index is not None and current > last_index:
+            gap_minutes = current - last_index
+            if 1 < gap_minutes <= MAX_GAP_MINUTES:
+                last_db_temp = temperature_data[last_index]
+                for minute_offset in range(1, gap_minutes):
+                    progress = Decimal(minute_offset) / Decimal(gap_minutes)
+                    temperature_data[last_index + minute_offset] = (
+                        last_db_temp + (latest_temp - last_db_temp) * progress
+                    )
+        if last_temperature is not None:
+            if latest_temp - last_temperature > MAX_STEP:
+                latest_temp = last_temperature + MAX_STEP
+            elif latest_temp - last_temperature < -MAX_STEP:
+                latest_temp = last_temperature - MAX_STEP
+        temperature_data[current] = latest_temp
+
+    return [None if value is None else float(value) for value in temperature_data]
+
+
+def test_changed_slots():
+    previous = np.array([1.0, np.nan, 2.0, 3.0])
+    current = np.array([np.nan, 2.0, 3.5, np.nan])
+
+    changed = chart.changed_slots(previous, SINCE_MINUTE, current, SINCE_MINUTE + 1)
+
+    # Shifted by one minute: only the changed value and the new minute differ
+    assert changed.tolist() == [2, 3]
+
+
+@st.composite
+def _chart_inputs(draw):
+    slots = draw(st.integers(min_value=1, max_value=80))
+    offsets = draw(
+        st.lists(
+            st.integers(min_value=0, max_value=slots + 5), unique=True, max_size=60
+        )
+    )
+    readings = []
+    value = draw(st.integers(min_value=-3000, max_value=4000))
+    for offset in sorted(offsets):
+        # Mostly small changes with occasional jumps
+        value += draw(
+            st.one_of(
+                st.integers(min_value=-40, max_value=40),
+                st.integers(min_value=-500, max_value=500),
+            )
+        )
+        readings.append((SINCE_MINUTE + offset, value))
+    multiplier = draw(st.decimals(min_value="0.5", max_value="1.5", places=2))
+    offset = draw(st.decimals(min_value="-5", max_value="5", places=2))
+    latest = draw(st.none() | st.decimals(min_value="-30", max_value="40", places=1))
+    return readings, slots, multiplier, offset, latest
+
+
+@settings(max_examples=300, deadline=None)
+@given(_chart_inputs())
+def test_build_series_matches_reference(inputs):
+    readings, slots, multiplier, offset, latest = inputs
+    minutes = array("q", [minute for minute, _ in readings])
+    values = array("i", [value for _, value in readings])
+
+    series = chart.build_series(
+        minutes,
+        values,
+        since_minute=SINCE_MINUTE,
+        slots=slots,
+        multiplier=float(multiplier),
+        offset=float(offset),
+        latest_temperature=float(latest) if latest is not None else None,
+    )
+    expected = _reference_series(readings, slots, multiplier, offset, latest)
+
+    assert [value is None for value in expected] == list(np.isnan(series))
+    np.testing.assert_allclose(
+        series[~np.isnan(series)],
+        [value for value in expected if value is not None],
+        rtol=0,
+        atol=1e-9,
+    )
+
+
+def test_limit_steps():
+    temperatures = np.array([20.0, 22.0, 22.1, 20.0, 20.2, 20.3])
+
+    limited = chart.limit_steps(temperatures)
+
+    np.testing.assert_allclose(limited, [20.0, 20.5, 21.0, 20.5, 20.2, 20.3])
+
+
+def test_interpolate_gaps_only_fills_short_gaps():
+    series = np.full(20, np.nan)
+    series[0], series[4], series[19] = 1.0, 5.0, 0.0
+
+    chart.interpolate_gaps(series, max_gap=10)
+
+    np.testing.assert_allclose(series[:5], [1.0, 2.0, 3.0, 4.0, 5.0])
+    assert np.isnan(series[5:19]).all()
+
+
+def test_to_json_data():
+    series = np.array([1.5, np.nan])
+
+    data = chart.to_json_data(series, SINCE_MINUTE)
+
+    assert data == {
+        "2025-02-19T21:20:00+00:00": 1.5,
+        "2025-02-19T21:21:00+00:00": None,
+    }
+
+
+def test_calibrated_values_have_no_float_noise():
+    values = array("i", range(1500, 2600))
+
+    series = chart.build_series(
+        array("q", range(SINCE_MINUTE, SINCE_MINUTE + 1100)),
+        values,
+        since_minute=SINCE_MINUTE,
+        slots=1100,
+        multiplier=1.0,
+        offset=0.0,
+    )
+
+    assert chart.to_columnar_values(series) == [value / 100 for value in values]
+    assert chart.round_values(np.array([16.325, -0.125, 0.135]), 2).tolist() == [
+        16.32,
+        -0.12,
+        0.14,
+    ]
+
+
+def test_to_columnar_values():
+    series = np.array([1.234, np.nan, 20.005])
+
+    assert chart.to_columnar_values(series) == [1.23, None, 20.0]
+
+
+@st.composite
+def _grid_operations(draw):
+    slots = draw(st.integers(min_value=2, max_value=40))
+    operations = draw(
+        st.lists(
+            st.one_of(
+                st.tuples(
+                    st.just("add"),
+                    st.integers(min_value=-5, max_value=slots + 5),
+                    st.integers(min_value=1500, max_value=2500),
+                ),
+                st.tuples(st.just("slide"), st.integers(min_value=1, max_value=8)),
+                st.tuples(st.just("read"), st.none() | st.integers(1500, 2500)),
+            ),
+            max_size=60,
+        )
+    )
+    return slots, operations
+
+
+@settings(max_examples=200, deadline=None)
+@given(_grid_operations())
+def test_incremental_grid_matches_full_build(inputs):
+    slots, operations = inputs
+    cache.clear_cache()
+    grids = chart.ChartGrids(slots)
+    now_minute = int(datetime.now(tz=UTC).timestamp()) // 60
+    since_minute = now_minute - 300
+    try:
+        operations.append(("read", None))
+        for operation in operations:
+            if operation[0] == "add":
+                _, offset, centidegrees = operation
+                cache.add_temperature_to_cache(
+                    "test/sensor",
+                    datetime.fromtimestamp((since_minute + offset) * 60, tz=UTC),
+                    Decimal(centidegrees).scaleb(-2),
+                )
+            elif operation[0] == "slide":
+                since_minute += operation[1]
+            else:
+                latest = None if operation[1] is None else operation[1] / 100
+                grid = grids.get_grid("test/sensor", 0.94, 2.2, since_minute)
+                minutes, values = cache.get_readings(
+                    "test/sensor", datetime.fromtimestamp(since_minute * 60, tz=UTC)
+                )
+                expected = chart.build_series(
+                    minutes, values, since_minute, slots, 0.94, 2.2, latest
+                )
+                np.testing.assert_allclose(
+                    grid.get_series(latest), expected, rtol=0, atol=1e-9
+                )
+    finally:
+        cache.reading_listeners.remove(grids._on_reading)
+        cache.clear_cache()
@@ -0,0 +1,88 @@
+"""Tests for the clock abstraction."""
+
+import asyncio
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import clock
+from mqtt_thermometer.aggregate import MinuteAggregator
+from mqtt_thermometer.broadcast import CoalescingTrigger
+
+START = datetime(2025, 1, 1, 12, 0, 30, tzinfo=UTC)
+
+
+class TestSimulatedClock(unittest.IsolatedAsyncioTestCase):
+    async def test_sleepers_wake_in_deadline_order(self):
+        simulated = clock.SimulatedClock(START)
+        woken = []
+
+        async def sleeper(seconds: float):
+            await simulated.sleep(seconds)
+            woken.append((seconds, simulated.now()))
+
+        tasks = [asyncio.create_task(sleeper(seconds)) for seconds in (30, 10, 20)]
+        await asyncio.sleep(0)
+
+        simulated.advance(15)
+        await asyncio.sleep(0)
+        self.assertEqual(woken, [(10, START + timedelta(seconds=15))])
+
+        simulated.advance(60)
+        await asyncio.gather(*tasks)
+        self.assertEqual([seconds for seconds, _ in woken], [10, 20, 30])
+
+    async def test_timers_run_at_their_deadline(self):
+        simulated = clock.SimulatedClock(START)
+        ran = []
+        simulated.call_later(5, lambda: ran.append(simulated.now()))
+        simulated.call_later(1, lambda: ran.append(simulated.now())).cancel()
+
+        simulated.advance_to(START + timedelta(minutes=1))
+
+        self.assertEqual(ran, [START + timedelta(seconds=5)])
+        self.assertEqual(simulated.now(), START + timedelta(minutes=1))
+
+    async def test_use_clock_restores_previous_clock(self):
+        simulated = clock.SimulatedClock(START)
+
+        with clock.use_clock(simulated):
+            self.assertEqual(clock.now(), START)
+
+        self.assertIsInstance(clock.get_clock(), clock.SystemClock)
+        self.assertIsNotNone(clock.now().tzinfo)
+
+    async def test_aggregator_flushes_on_simulated_minute_boundary(self):
+        simulated = clock.SimulatedClock(START)
+        aggregator = MinuteAggregator(flush_delay_seconds=2)
+        written = []
+        with clock.use_clock(simulated):
+            task = asyncio.create_task(aggregator.run(written.extend))
+            await asyncio.sleep(0)
+            aggregator.add("sauna", Decimal("80.0"), START)
+
+            simulated.advance(31)
+            await asyncio.sleep(0)
+            self.assertEqual(written, [])
+
+            simulated.advance(1)
+            await asyncio.sleep(0)
+            task.cancel()
+
+        self.assertEqual(
+            [row[:2] for row in written], [("sauna", START.replace(second=0))]
+        )
+
+    async def test_coalescing_trigger_follows_simulated_time(self):
+        simulated = clock.SimulatedClock(START)
+        runs = []
+        with clock.use_clock(simulated):
+            trigger = CoalescingTrigger(60, lambda: runs.append(simulated.now()))
+            trigger.trigger()
+            trigger.trigger()
+
+            simulated.advance(59)
+            self.assertEqual(len(runs), 1)
+            simulated.advance(1)
+
+        self.assertEqual(runs, [START, START + timedelta(seconds=60)])
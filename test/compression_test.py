@@ -0,0 +1,106 @@
+"""Tests for HTTP response and websocket message compression."""
+
+import gzip
+import zlib
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.testclient import TestClient
+
+from mqtt_thermometer import compression
+
+
+def _client() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(compression.CompressionMiddleware, minimum_size=100)
+
+    @app.get("/large")
+    async def large():
+        return {"values": list(range(200))}
+
+    @app.get("/small")
+    async def small():
+        return PlainTextResponse("small")
+
+    @app.get("/tagged")
+    async def tagged(request: Request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return Response(status_code=304, headers={"ETag": '"v1"'})
+        return JSONResponse({"values": list(range(200))}, headers={"ETag": '"v1"'})
+
+    return TestClient(app)
+
+
+def test_negotiate_encoding():
+    assert compression.negotiate_encoding("gzip, deflate") == "gzip"
+    assert compression.negotiate_encoding("gzip;q=0, deflate") is None
+    assert compression.negotiate_encoding("identity") is None
+    assert compression.negotiate_encoding("*") == (
+        "br" if compression.brotli else "gzip"
+    )
+
+
+def test_large_responses_are_gzipped():
+    client = _client()
+
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.json() == {"values": list(range(200))}
+    stats = compression.stats.get_stats()["gzip"]
+    assert stats["bytes_out"] < stats["bytes_in"]
+
+
+def test_small_and_unaccepted_responses_are_not_compressed():
+    client = _client()
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "Content-Encoding" not in small.headers
+    assert "Content-Encoding" not in identity.headers
+    assert small.text == "small"
+
+
+def test_encoded_responses_have_their_own_etag():
+    client = _client()
+
+    encoded = client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+    identity = client.get("/tagged", headers={"Accept-Encoding": "identity"})
+    small = client.get("/small", headers={"Accept-Encoding": "identity"})
+
+    assert encoded.headers["ETag"] == '"v1-gzip"'
+    assert identity.headers["ETag"] == '"v1"'
+    # Uncompressed responses vary by the encoding as well
+    assert "Accept-Encoding" in identity.headers["Vary"]
+    assert "Accept-Encoding" in small.headers["Vary"]
+
+
+def test_revalidating_encoded_copy():
+    client = _client()
+
+    response = client.get(
+        "/tagged",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'},
+    )
+    # The gzip copy is not valid for a client that no longer accepts gzip
+    identity_tag = client.get(
+        "/tagged", headers={"Accept-Encoding": "identity", "If-None-Match": '"v1-gzip"'}
+    )
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"v1-gzip"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert identity_tag.status_code == 200
+
+
+def test_compress_message_is_raw_deflate():
+    message = '{"type": "legends", "legends": "' + "x" * 1000 + '"}'
+
+    compressed = compression.compress_message(message)
+
+    assert len(compressed) < len(message)
+    assert zlib.decompress(compressed, -15).decode() == message
+    # Not a gzip stream, browsers inflate it with DecompressionStream
+    assert compressed[:2] != gzip.compress(b"")[:2]
@@ -0,0 +1,452 @@
+"""Tests for the SQLite connection manager."""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import cache, clock, database
+
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_connections_are_reused(self):
+        """Test that the writer and readers are long-lived."""
+        with database.get_database_connection() as first:
+            pass
+        with database.get_database_connection() as second:
+            pass
+        self.assertIs(first, second)
+
+        with database.get_reader_connection() as first_reader:
+            pass
+        with database.get_reader_connection() as second_reader:
+            pass
+        self.assertIs(first_reader, second_reader)
+
+    def test_wal_journal_mode(self):
+        """Test that the database is switched to WAL mode."""
+        with database.get_database_connection() as connection:
+            (journal_mode,) = connection.execute("PRAGMA journal_mode").fetchone()
+        self.assertEqual(journal_mode, "wal")
+
+    def test_reader_is_read_only(self):
+        """Test that reader connections cannot modify the database."""
+        with (
+            self.assertRaises(sqlite3.OperationalError),
+            database.get_reader_connection() as connection,
+        ):
+            connection.execute("DELETE FROM reading")
+
+    def test_reader_sees_committed_writes(self):
+        """Test that readers see data committed by the writer."""
+        timestamp = datetime.now(tz=UTC)
+        self.assertTrue(
+            database.save_temperature("test/sensor", timestamp, Decimal("21.5"))
+        )
+
+        results = database.get_temperatures(
+            "test/sensor", timestamp - timedelta(minutes=1)
+        )
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][2], Decimal("21.5"))
+
+    def test_reader_does_not_wait_for_writer(self):
+        """Test that reads succeed while a write transaction is open."""
+        now = datetime.now(tz=UTC)
+        database.save_temperature("test/sensor", now, Decimal("20"))
+        with database.get_database_connection() as connection:
+            connection.execute(
+                database.UPSERT_READING_SQL,
+                (
+                    database._get_source_id(connection, "test/sensor"),
+                    database.to_epoch_seconds(now) + 60,
+                    3000,
+                    None,
+                    None,
+                    None,
+                ),
+            )
+            # Uncommitted row is not visible, committed one is
+            results = database.get_temperatures(
+                "test/sensor", datetime.now(tz=UTC) - timedelta(hours=1)
+            )
+            connection.rollback()
+
+        self.assertEqual([r[2] for r in results], [Decimal("20")])
+
+    def test_new_database_path_reopens_connections(self):
+        """Test that changing the configured path switches databases."""
+        manager = database.get_connection_manager()
+        other_fd, other_path = tempfile.mkstemp()
+        try:
+            database.settings.db_connection_string = other_path
+            self.assertIsNot(database.get_connection_manager(), manager)
+        finally:
+            database.close_connections()
+            database.settings.db_connection_string = self.db_path
+            os.close(other_fd)
+            os.unlink(other_path)
+
+
+class TestSchemaV2(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def _create_legacy_table(self, rows):
+        with database.get_database_connection() as connection:
+            connection.execute(
+                "CREATE TABLE temperature ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "source TEXT, "
+                "timestamp TEXT, "
+                "temperature DECTEXT"
+                ")"
+            )
+            connection.executemany(
+                "INSERT INTO temperature (source, timestamp, temperature) "
+                "VALUES (?, ?, ?)",
+                [
+                    (source, timestamp.isoformat(), temperature)
+                    for source, timestamp, temperature in rows
+                ],
+            )
+            connection.commit()
+
+    def test_upsert_is_idempotent(self):
+        """Test that saving the same minute twice keeps a single reading."""
+        database.create_table()
+        timestamp = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+
+        database.save_temperature("test/sensor", timestamp, Decimal("20.25"))
+        database.save_temperature("test/sensor", timestamp, Decimal("21.75"))
+
+        results = database.get_temperatures("test/sensor", timestamp)
+        self.assertEqual(
+            results, [("test/sensor", timestamp.isoformat(), Decimal("21.75"))]
+        )
+
+    def test_readings_are_stored_as_integers(self):
+        """Test the compact numeric representation."""
+        database.create_table()
+        timestamp = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        database.save_temperature("test/sensor", timestamp, Decimal("-5.07"))
+
+        with database.get_reader_connection() as connection:
+            row = connection.execute(
+                "SELECT source.name, reading.timestamp, reading.temperature "
+                "FROM reading JOIN source ON source.id = reading.source_id"
+            ).fetchone()
+
+        self.assertEqual(row, ("test/sensor", int(timestamp.timestamp()), -507))
+
+    def test_minute_aggregates_are_stored(self):
+        """Test that minimum, maximum and count are saved with the average."""
+        database.create_table()
+        timestamp = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        database.save_temperatures(
+            [
+                (
+                    "test/sensor",
+                    timestamp,
+                    Decimal("20.5"),
+                    Decimal("20.1"),
+                    Decimal("20.9"),
+                    6,
+                )
+            ]
+        )
+
+        with database.get_reader_connection() as connection:
+            row = connection.execute(
+                "SELECT temperature, minimum, maximum, count FROM reading"
+            ).fetchone()
+
+        self.assertEqual(row, (2050, 2010, 2090, 6))
+
+    def test_version_2_database_gets_aggregate_columns(self):
+        """Test that a version 2 reading table is upgraded in place."""
+        with database.get_database_connection() as connection:
+            connection.execute(
+                "CREATE TABLE reading ("
+                "source_id INTEGER NOT NULL, "
+                "timestamp INTEGER NOT NULL, "
+                "temperature INTEGER NOT NULL, "
+                "PRIMARY KEY (source_id, timestamp)"
+                ") WITHOUT ROWID"
+            )
+            connection.execute("INSERT INTO reading VALUES (1, 60, 2000)")
+            connection.commit()
+
+        database.create_table()
+
+        with database.get_reader_connection() as connection:
+            row = connection.execute(
+                "SELECT temperature, minimum, maximum, count FROM reading"
+            ).fetchone()
+            (version,) = connection.execute("PRAGMA user_version").fetchone()
+        self.assertEqual(row, (2000, None, None, None))
+        self.assertEqual(version, database.SCHEMA_VERSION)
+
+    def test_migrate_legacy_data(self):
+        """Test that legacy rows are copied and the legacy table is dropped."""
+        base_time = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        legacy_rows = [
+            ("source1", base_time + timedelta(minutes=i), Decimal("20.11") + i)
+            for i in range(5)
+        ] + [("source2", base_time, Decimal("-1.5"))]
+        self._create_legacy_table(legacy_rows)
+        database.create_table()
+
+        migrated = database.migrate_legacy_data(batch_size=2)
+
+        self.assertEqual(migrated, 6)
+        self.assertEqual(database.get_sources(), ["source2", "source1"])
+        results = database.get_temperatures("source1", base_time)
+        self.assertEqual(
+            [(r[1], r[2]) for r in results],
+            [(t.isoformat(), temp) for _, t, temp in legacy_rows[:5]],
+        )
+        with database.get_reader_connection() as connection:
+            self.assertFalse(database._legacy_table_exists(connection))
+
+    def test_migration_is_resumable(self):
+        """Test that an interrupted migration continues where it stopped."""
+        base_time = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        legacy_rows = [
+            ("source1", base_time + timedelta(minutes=i), Decimal("20") + i)
+            for i in range(6)
+        ]
+        self._create_legacy_table(legacy_rows)
+        database.create_table()
+
+        # Newest rows are migrated first
+        migrated = database.migrate_legacy_data(
+            batch_size=2, stop_before=base_time + timedelta(minutes=4)
+        )
+        self.assertEqual(migrated, 2)
+        self.assertEqual(len(database.get_temperatures("source1", base_time)), 2)
+
+        # A live write during the migration is kept
+        database.save_temperature(
+            "source1", base_time + timedelta(minutes=1), Decimal("99")
+        )
+
+        self.assertEqual(database.migrate_legacy_data(batch_size=2), 4)
+        results = database.get_temperatures("source1", base_time)
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results[1][2], Decimal("99"))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+class TestRollups(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def _rollups(self, resolution):
+        return database.get_rollups(
+            "test/sensor", resolution, datetime(2024, 1, 1, tzinfo=UTC)
+        )
+
+    def test_rollups_follow_saved_minutes(self):
+        """Test that each saved minute updates all rollup levels."""
+        base_time = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        database.save_temperatures(
+            [
+                (
+                    "test/sensor",
+                    base_time,
+                    Decimal("20"),
+                    Decimal("19"),
+                    Decimal("21"),
+                    4,
+                ),
+                ("test/sensor", base_time + timedelta(minutes=1), Decimal("22")),
+                ("test/sensor", base_time + timedelta(minutes=5), Decimal("30")),
+            ]
+        )
+        epoch = int(base_time.timestamp())
+
+        self.assertEqual(
+            self._rollups(300),
+            [(epoch, 1900, 2100, 2200, 2), (epoch + 300, 3000, 3000, 3000, 1)],
+        )
+        # Coarser levels weight the averages by the minutes in each period
+        self.assertEqual(self._rollups(3600), [(epoch, 1900, 2400, 3000, 3)])
+        self.assertEqual(
+            self._rollups(86400), [(epoch - 12 * 3600, 1900, 2400, 3000, 3)]
+        )
+
+        # Saving a minute again replaces its contribution
+        database.save_temperature("test/sensor", base_time + timedelta(minutes=5), 24)
+        self.assertEqual(self._rollups(3600), [(epoch, 1900, 2200, 2400, 3)])
+
+    def test_rollup_refresh_seeks_by_source(self):
+        """Test that refreshing rollups does not scan the whole tables."""
+        with database.get_reader_connection() as connection:
+            plans = [
+                " ".join(
+                    row[-1]
+                    for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                )
+                for sql, params in (
+                    (database.ROLLUP_FROM_READINGS_SQL, (300, 0, 600, 1)),
+                    (database.ROLLUP_FROM_ROLLUP_SQL, (3600, 0, 3600, 300, 1)),
+                )
+            ]
+
+        for plan in plans:
+            self.assertNotIn("SCAN", plan)
+            self.assertIn("source_id=?", plan)
+
+    def test_backfill_computes_missing_rollups(self):
+        """Test that readings saved before rollups existed are rolled up."""
+        base_time = datetime(2025, 1, 1, 12, 0, tzinfo=UTC)
+        with database.get_database_connection() as connection:
+            source_id = database._get_source_id(connection, "test/sensor")
+            connection.executemany(
+                "INSERT INTO reading (source_id, timestamp, temperature) "
+                "VALUES (?, ?, ?)",
+                [
+                    (source_id, int(base_time.timestamp()) - day * 86400, 2000 + day)
+                    for day in range(20)
+                ],
+            )
+            connection.commit()
+
+        self.assertTrue(database.backfill_rollups())
+
+        daily = self._rollups(86400)
+        self.assertEqual(len(daily), 20)
+        self.assertEqual([row[2] for row in daily], list(range(2019, 1999, -1)))
+        # Done once per database
+        self.assertTrue(database.backfill_rollups())
+
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+        # Half a minute past the rows saved on whole minutes, away from the
+        # retention cutoffs
+        self.clock = clock.SimulatedClock(datetime(2025, 1, 15, 12, 0, 30, tzinfo=UTC))
+        self.original_clock = clock.get_clock()
+        clock.set_clock(self.clock)
+
+    def tearDown(self):
+        clock.set_clock(self.original_clock)
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def _save_days(self, days: int):
+        now = clock.now().replace(second=0, microsecond=0)
+        database.save_temperatures(
+            [
+                (source, now - timedelta(days=day, minutes=minute), Decimal("20"))
+                for source in ("source1", "source2")
+                for day in range(days)
+                for minute in range(10)
+            ],
+            add_to_cache=False,
+        )
+
+    def _count(self, sql: str) -> int:
+        with database.get_reader_connection() as connection:
+            return connection.execute(sql).fetchone()[0]
+
+    def test_new_database_uses_incremental_vacuum(self):
+        with database.get_reader_connection() as connection:
+            (auto_vacuum,) = connection.execute("PRAGMA auto_vacuum").fetchone()
+        self.assertEqual(auto_vacuum, database.AUTO_VACUUM_INCREMENTAL)
+        self.assertFalse(database.enable_incremental_vacuum())
+
+    def test_large_database_is_converted_only_when_forced(self):
+        with database.get_database_connection() as connection:
+            connection.execute("PRAGMA auto_vacuum=NONE")
+            connection.execute("VACUUM")
+
+        self.assertFalse(database.enable_incremental_vacuum(max_bytes=0))
+        self.assertTrue(database.enable_incremental_vacuum(force=True, max_bytes=0))
+        with database.get_reader_connection() as connection:
+            (auto_vacuum,) = connection.execute("PRAGMA auto_vacuum").fetchone()
+        self.assertEqual(auto_vacuum, database.AUTO_VACUUM_INCREMENTAL)
+
+    def test_prune_expired_readings_in_batches(self):
+        """Test that only readings older than the retention are deleted."""
+        self._save_days(5)
+        rollups = self._count("SELECT count(*) FROM rollup")
+
+        pruned = database.prune_expired({None: 2}, batch_size=3)
+
+        # Days 2, 3 and 4 are older than two days
+        self.assertEqual(pruned, 2 * 3 * 10)
+        self.assertEqual(self._count("SELECT count(*) FROM reading"), 2 * 2 * 10)
+        self.assertEqual(self._count("SELECT count(*) FROM rollup"), rollups)
+
+    def test_prune_expired_rollups(self):
+        self._save_days(5)
+
+        database.prune_expired({300: 1, 3600: None})
+
+        with database.get_reader_connection() as connection:
+            oldest = connection.execute(
+                "SELECT min(timestamp) FROM rollup WHERE resolution=300"
+            ).fetchone()[0]
+        cutoff = clock.now() - timedelta(days=1)
+        self.assertGreaterEqual(oldest, int(cutoff.timestamp()) - 300)
+        self.assertEqual(self._count("SELECT count(*) FROM reading"), 2 * 50)
+
+    def test_incremental_vacuum_reclaims_space(self):
+        self._save_days(60)
+        database.prune_expired({None: 2, 300: 2, 3600: 2, 86400: 2})
+
+        self.assertGreater(database.incremental_vacuum(), 0)
+        with database.get_reader_connection() as connection:
+            (free_pages,) = connection.execute("PRAGMA freelist_count").fetchone()
+        self.assertEqual(free_pages, 0)
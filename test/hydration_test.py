@@ -0,0 +1,76 @@
+"""Tests for background cache hydration."""
+
+import os
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import cache, database
+from mqtt_thermometer.hydration import CacheHydration
+
+
+class TestCacheHydration(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+        database.save_temperatures(
+            [
+                (source, now - timedelta(minutes=minute), Decimal(minute % 50))
+                for source in ("test/a", "test/b")
+                for minute in range(0, 25 * 60, 7)
+            ],
+            add_to_cache=False,
+        )
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_loads_same_readings_as_full_warmup(self):
+        cache.initialize_cache_from_database()
+        expected = cache.get_all_readings()
+        cache.clear_cache()
+        hydration = CacheHydration(None, chunk=timedelta(hours=5))
+        self.assertEqual(hydration.get_stats()["state"], "pending")
+
+        hydration.run()
+
+        self.assertTrue(hydration.ready)
+        self.assertEqual(hydration.progress, 1.0)
+        self.assertEqual(cache.get_all_readings(), expected)
+        self.assertEqual(hydration.rows, sum(len(m) for m, _ in expected.values()))
+
+    def test_live_readings_added_during_hydration_are_kept(self):
+        # Not saved yet, newer than everything in the database
+        newest = datetime.now(tz=UTC).replace(second=0, microsecond=0) + timedelta(
+            minutes=1
+        )
+        cache.add_temperature_to_cache("test/a", newest, Decimal("99.0"))
+        hydration = CacheHydration(None, chunk=timedelta(hours=5))
+
+        hydration.run()
+
+        minutes, values = cache.get_all_readings()["test/a"]
+        self.assertEqual(list(minutes), sorted(minutes))
+        self.assertEqual(values[-1], 9900)
+
+    def test_stop_leaves_hydration_unfinished(self):
+        hydration = CacheHydration(None, chunk=timedelta(hours=1))
+        hydration.stop()
+
+        hydration.run()
+
+        self.assertEqual(hydration.state, "stopped")
+        self.assertFalse(hydration.ready)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+from datetime import UTC, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from fastapi.templating import Jinja2Templates
+
+from mqtt_thermometer.legends import LegendData, LegendRenderer
+
+TEMPLATES = Path(__file__).parent.parent / "mqtt_thermometer" / "templates"
+
+
+def _legend(label: str, temperature: str | None) -> LegendData:
+    return LegendData(
+        label=label,
+        temperature=Decimal(temperature) if temperature is not None else None,
+        border_color="#ff0000",
+        background_color="#00ff00",
+        last_updated=datetime.now(tz=UTC),
+    )
+
+
+def _renderer() -> LegendRenderer:
+    return LegendRenderer(Jinja2Templates(directory=TEMPLATES).env)
+
+
+def test_renders_legends_with_temperature():
+    html = _renderer().render([_legend("Tupa", "21.5"), _legend("Ulko", None)])
+
+    assert html.count('class="legenditem"') == 1
+    assert "Tupa<br>21.5 °C" in html
+    assert "Ulko" not in html
+    assert "background-color: #00ff00;" in html
+
+
+def test_unchanged_legends_are_not_rendered_again():
+    renderer = _renderer()
+    html = renderer.render([_legend("Tupa", "21.5"), _legend("Ulko", "-3.0")])
+
+    # Only the update time differs
+    again = renderer.render([_legend("Tupa", "21.5"), _legend("Ulko", "-3.0")])
+
+    assert again is html
+    assert renderer.version == 1
+    assert renderer.hits == 1
+
+
+def test_only_changed_fragment_is_rendered_again():
+    renderer = _renderer()
+    renderer.render([_legend("Tupa", "21.5"), _legend("Ulko", "-3.0")])
+
+    html = renderer.render([_legend("Tupa", "21.6"), _legend("Ulko", "-3.0")])
+
+    assert renderer.fragment_renders == 3
+    assert renderer.version == 2
+    assert "Tupa<br>21.6 °C" in html
+    assert "Ulko<br>-3.0 °C" in html
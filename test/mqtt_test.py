@@ -0,0 +1,164 @@
+"""Tests for the asyncio MQTT ingest against an in-process broker stand-in."""
+
+import asyncio
+import time
+import unittest
+from decimal import Decimal
+
+from mqtt_thermometer import mqtt
+from mqtt_thermometer.bridge import ReadingBridge
+
+CONNECT, SUBSCRIBE, PINGREQ, DISCONNECT = 0x10, 0x80, 0xC0, 0xE0
+
+
+def _encode_length(length: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def _publish_packet(topic: str, payload: str) -> bytes:
+    body = len(topic).to_bytes(2, "big") + topic.encode() + payload.encode()
+    return bytes([0x30]) + _encode_length(len(body)) + body
+
+
+class FakeBroker:
+    """Just enough of MQTT 3.1.1 to connect, subscribe and receive QoS 0."""
+
+    def __init__(self, publish: list[tuple[str, str]]):
+        self.publish = publish
+        self.connections = 0
+        self.disconnects = 0
+        self.subscriptions: list[str] = []
+        self._writers: list[asyncio.StreamWriter] = []
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    def drop_connections(self):
+        for writer in self._writers:
+            writer.close()
+        self._writers.clear()
+
+    async def stop(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> tuple[int, bytes]:
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header & 0xF0, await reader.readexactly(length)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.append(writer)
+        try:
+            while True:
+                command, body = await self._read_packet(reader)
+                if command == CONNECT:
+                    self.connections += 1
+                    writer.write(b"\x20\x02\x00\x00")
+                elif command == SUBSCRIBE:
+                    position, topics = 2, []
+                    while position < len(body):
+                        length = int.from_bytes(body[position : position + 2], "big")
+                        topics.append(
+                            body[position + 2 : position + 2 + length].decode()
+                        )
+                        position += 2 + length + 1
+                    self.subscriptions.extend(topics)
+                    granted = bytes(len(topics))
+                    writer.write(
+                        bytes([0x90])
+                        + _encode_length(2 + len(granted))
+                        + body[:2]
+                        + granted
+                    )
+                    for topic, payload in self.publish:
+                        writer.write(_publish_packet(topic, payload))
+                elif command == PINGREQ:
+                    writer.write(b"\xd0\x00")
+                elif command == DISCONNECT:
+                    self.disconnects += 1
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class TestAsyncioIngest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        topic = mqtt.settings.sources[0].source
+        self.topic = topic
+        self.broker = FakeBroker(publish=[(topic, "21.5")])
+        self.port = await self.broker.start()
+        self.readings: list[dict[str, Decimal]] = []
+        self.bridge = ReadingBridge(asyncio.get_running_loop(), self.readings.append)
+        self.ingest = mqtt.AsyncioIngest(
+            self.bridge, "127.0.0.1", self.port, initial_backoff=0.01
+        )
+
+    async def asyncTearDown(self):
+        await self.broker.stop()
+        mqtt.bridge = None
+
+    async def _wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Condition not met in time")
+
+    async def test_subscribes_receives_and_disconnects_cleanly(self):
+        task = asyncio.create_task(self.ingest.run())
+        await self._wait_for(lambda: self.readings)
+
+        self.assertIn(self.topic, self.broker.subscriptions)
+        self.assertEqual(self.readings, [{self.topic: Decimal("21.5")}])
+
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await self._wait_for(lambda: self.broker.disconnects == 1)
+
+    async def test_reconnects_after_broker_drops_connection(self):
+        task = asyncio.create_task(self.ingest.run())
+        await self._wait_for(lambda: self.broker.connections == 1)
+
+        self.broker.drop_connections()
+        await self._wait_for(lambda: self.broker.connections == 2)
+
+        self.assertEqual(self.ingest.connects, 2)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+    async def test_connect_does_not_block_the_loop(self):
+        def slow_connect(host, port):
+            time.sleep(0.2)
+            raise OSError("unreachable")
+
+        self.ingest.client.connect = slow_connect
+        task = asyncio.create_task(self.ingest.run())
+        started = time.perf_counter()
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+
+        # The loop kept running while the connect is still in progress
+        self.assertLess(time.perf_counter() - started, 0.15)
+        self.assertFalse(self.ingest._connecting.done())
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
@@ -0,0 +1,190 @@
+"""Tests for the time-warp replay tool."""
+
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from mqtt_thermometer import cache, clock, database, mqtt, replay, service
+from mqtt_thermometer.aggregate import MinuteAggregator
+
+START = datetime(2025, 1, 1, tzinfo=UTC)
+TUPA = "mokki/tupa/temperature"
+SAUNA = "mokki/sauna/temperature"
+
+
+class TestReplay(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.original_connection_string = database.settings.db_connection_string
+        # Recorded history: three hours of Tupa, Sauna with a gap that ends
+        # ten minutes before the end of the recording
+        self.source_path = Path(self.directory.name) / "source.db"
+        database.settings.db_connection_string = str(self.source_path)
+        database.create_table()
+        database.save_temperatures(
+            [
+                (TUPA, START + timedelta(minutes=minute), Decimal("20.5"))
+                for minute in range(180)
+            ]
+            + [
+                (SAUNA, START + timedelta(minutes=minute), Decimal(60 + minute % 5))
+                for minute in range(170)
+                if not 60 <= minute < 80
+            ],
+            add_to_cache=False,
+        )
+        database.close_connections()
+
+        database.settings.db_connection_string = os.path.join(
+            self.directory.name, "replay.db"
+        )
+        database.create_table()
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        self.directory.cleanup()
+
+    def test_reads_database_in_time_order(self):
+        messages = list(
+            replay.read_database(
+                self.source_path,
+                since=START + timedelta(minutes=1),
+                until=START + timedelta(minutes=3),
+            )
+        )
+
+        self.assertEqual(
+            messages,
+            [
+                (START + timedelta(minutes=1), TUPA, b"20.50"),
+                (START + timedelta(minutes=1), SAUNA, b"61.00"),
+                (START + timedelta(minutes=2), TUPA, b"20.50"),
+                (START + timedelta(minutes=2), SAUNA, b"62.00"),
+            ],
+        )
+
+    def test_reads_legacy_database(self):
+        legacy_path = Path(self.directory.name) / "legacy.db"
+        connection = sqlite3.connect(legacy_path)
+        connection.execute(
+            "CREATE TABLE temperature ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "source TEXT, "
+            "timestamp TEXT, "
+            "temperature DECTEXT"
+            ")"
+        )
+        connection.executemany(
+            "INSERT INTO temperature (source, timestamp, temperature) VALUES (?, ?, ?)",
+            [
+                (SAUNA, (START + timedelta(minutes=2)).isoformat(), "62.5"),
+                (TUPA, START.isoformat(), "20.25"),
+                (TUPA, (START + timedelta(minutes=1)).isoformat(), "20.5"),
+                (TUPA, (START + timedelta(minutes=3)).isoformat(), "21"),
+            ],
+        )
+        connection.commit()
+        connection.close()
+
+        messages = list(
+            replay.read_database(
+                legacy_path,
+                since=START + timedelta(minutes=1),
+                until=START + timedelta(minutes=3),
+            )
+        )
+
+        self.assertEqual(
+            messages,
+            [
+                (START + timedelta(minutes=1), TUPA, b"20.5"),
+                (START + timedelta(minutes=2), SAUNA, b"62.5"),
+            ],
+        )
+
+    def test_reads_partly_migrated_database(self):
+        with sqlite3.connect(self.source_path) as connection:
+            connection.execute(
+                "CREATE TABLE temperature ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "source TEXT, "
+                "timestamp TEXT, "
+                "temperature DECTEXT"
+                ")"
+            )
+            connection.execute(
+                "INSERT INTO temperature (source, timestamp, temperature) "
+                "VALUES (?, ?, ?)",
+                (TUPA, (START + timedelta(minutes=1)).isoformat(), "20.5"),
+            )
+        connection.close()
+
+        messages = list(
+            replay.read_database(self.source_path, until=START + timedelta(minutes=3))
+        )
+
+        # Readings up to the newest legacy row are already in the legacy table
+        self.assertEqual(
+            messages,
+            [
+                (START + timedelta(minutes=1), TUPA, b"20.5"),
+                (START + timedelta(minutes=2), TUPA, b"20.50"),
+                (START + timedelta(minutes=2), SAUNA, b"62.00"),
+            ],
+        )
+
+    def test_reads_message_log(self):
+        log_path = Path(self.directory.name) / "messages.jsonl"
+        log_path.write_text(
+            json.dumps(
+                {"timestamp": "2025-01-01T00:00:05", "topic": TUPA, "payload": 21.5}
+            )
+            + "\n\n"
+            + json.dumps(
+                {
+                    "timestamp": "2025-01-01T00:10:00+00:00",
+                    "topic": TUPA,
+                    "payload": "22",
+                }
+            )
+            + "\n"
+        )
+
+        messages = list(replay.read_log(log_path, until=START + timedelta(minutes=10)))
+
+        self.assertEqual(messages, [(START + timedelta(seconds=5), TUPA, b"21.5")])
+
+    async def test_replays_recorded_history(self):
+        with mock.patch.object(
+            mqtt, "aggregator", MinuteAggregator(flush_delay_seconds=2)
+        ):
+            report = await replay.replay(
+                replay.read_database(self.source_path), clients=2
+            )
+
+        self.assertIsInstance(clock.get_clock(), clock.SystemClock)
+        self.assertEqual(report["messages"], 330)
+        self.assertEqual(report["simulated_seconds"], 179 * 60)
+        self.assertEqual(report["late_readings"], 0)
+        # Every minute is saved once, as it was recorded
+        self.assertEqual(report["saved_rows"], 330)
+        self.assertEqual(
+            list(replay.read_database(Path(database.settings.db_connection_string))),
+            list(replay.read_database(self.source_path)),
+        )
+        self.assertEqual(report["cache"], {TUPA: 180, SAUNA: 150})
+        # Sauna went quiet over five simulated minutes before the end
+        self.assertIsNotNone(service.legend_data["Tupa"].temperature)
+        self.assertIsNone(service.legend_data["Sauna"].temperature)
+        self.assertEqual(report["broadcast"]["dropped_messages"], 0)
+        self.assertGreater(report["triggers"]["chart"]["runs"], 100)
+        self.assertGreaterEqual(report["chart_coverage"]["Tupa"], 180)
@@ -0,0 +1,45 @@
+"""Tests for the retention task."""
+
+import os
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import cache, database
+from mqtt_thermometer.retention import RetentionTask
+from mqtt_thermometer.settings import RetentionSettings
+
+
+class TestRetentionTask(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def test_run_once_reports_pruned_rows_and_reclaimed_bytes(self):
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+        database.save_temperatures(
+            [
+                ("source1", now - timedelta(minutes=minute), Decimal("20"))
+                for minute in range(0, 10 * 24 * 60, 5)
+            ],
+            add_to_cache=False,
+        )
+        task = RetentionTask(RetentionSettings(raw_days=2, five_minute_days=2))
+
+        task.run_once()
+
+        stats = task.get_stats()
+        self.assertEqual(stats["runs"], 1)
+        self.assertGreater(stats["pruned_rows"], 8 * 24 * 12)
+        self.assertGreater(stats["reclaimed_bytes"], 0)
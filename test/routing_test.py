@@ -0,0 +1,77 @@
+from mqtt_thermometer.routing import SourceRegistry, TopicRouter, topic_wildcards
+from mqtt_thermometer.settings import SourceSettings, SourceTemplateSettings
+
+
+def test_exact_and_wildcard_matches():
+    router = TopicRouter[str]()
+    router.add("mokki/sauna/temperature", "exact")
+    router.add("mokki/+/temperature", "single")
+    router.add("mokki/#", "multi")
+    router.add("#", "all")
+
+    assert router.match("mokki/sauna/temperature") == [
+        "exact",
+        "all",
+        "multi",
+        "single",
+    ]
+    assert router.match("mokki/tupa/temperature") == ["all", "multi", "single"]
+    assert router.match("mokki") == ["all", "multi"]
+    assert router.match("koti/tupa/temperature") == ["all"]
+    # Wildcards do not match system topics
+    assert router.match("$SYS/broker/uptime") == []
+
+
+def test_single_level_wildcard_needs_a_level():
+    router = TopicRouter[str]()
+    router.add("mokki/+", "single")
+
+    assert router.match("mokki/sauna") == ["single"]
+    assert router.match("mokki") == []
+    assert router.match("mokki/sauna/temperature") == []
+
+
+def test_topic_wildcards():
+    assert topic_wildcards("mokki/+/temperature", "mokki/sauna/temperature") == [
+        "sauna"
+    ]
+    assert topic_wildcards("+/#", "koti/sauna/temperature") == [
+        "koti",
+        "sauna/temperature",
+    ]
+
+
+def test_template_registers_new_sources():
+    sources = [
+        SourceSettings(
+            label="Sauna",
+            source="mokki/sauna/temperature",
+            border_color="#dddd00",
+            background_color="#ffff00",
+        )
+    ]
+    template = SourceTemplateSettings(
+        topic="mokki/+/temperature",
+        label="Mökki {0}",
+        border_colors=["#000001", "#000002"],
+        background_colors=["#000003"],
+    )
+    registry = SourceRegistry(sources, [template])
+
+    assert registry.subscriptions() == [
+        "mokki/sauna/temperature",
+        "mokki/+/temperature",
+    ]
+    # Configured sources take precedence over templates
+    assert registry.resolve("mokki/sauna/temperature") == [sources[0]]
+    assert registry.match("mokki/tupa/temperature") == []
+
+    tupa = registry.resolve("mokki/tupa/temperature")
+    kamari = registry.resolve("mokki/kamari/temperature")
+
+    assert [source.label for source in tupa + kamari] == ["Mökki tupa", "Mökki kamari"]
+    assert tupa[0].border_color.as_hex("long") == "#000001"
+    assert kamari[0].border_color.as_hex("long") == "#000002"
+    assert registry.resolve("mokki/tupa/temperature") == tupa
+    assert len(sources) == 3
+    assert registry.resolve("koti/tupa/temperature") == []
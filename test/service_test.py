@@ -1,5 +1,12 @@
-from datetime import datetime, UTC
-from mqtt_thermometer import service
+import asyncio
+import json
+from datetime import UTC, datetime
+from decimal import Decimal
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from mqtt_thermometer import clock, service
 
 
 def test_get_empty_temperatures():
@@ -14,3 +21,205 @@ def test_get_empty_temperatures():
         datetime(2021, 1, 1, 0, 2, 0, tzinfo=UTC): None,
         datetime(2021, 1, 1, 0, 3, 0, tzinfo=UTC): None,
     }
+
+
+def test_chart_delta_updates_previous_version(monkeypatch):
+    labels = [source.label for source in service.settings.sources]
+    slots = service.CHART_SLOTS
+    series = {label: np.full(slots, 20.0) for label in labels}
+    since_minute = 29_000_000
+    monkeypatch.setattr(service, "chart_state", None)
+    monkeypatch.setattr(service, "_get_chart_since_minute", lambda: since_minute)
+    monkeypatch.setattr(
+        service,
+        "_get_temperature_series",
+        lambda source, *_: series[
+            next(s.label for s in service.settings.sources if s.source == source)
+        ].copy(),
+    )
+
+    assert service._advance_chart_state() is None
+    previous = service._get_chart_data(
+        service.chart_state.since_minute, service.chart_state.series
+    )
+
+    # The window moves one minute forward and the newest minute changes
+    since_minute += 1
+    series[labels[0]][-1] = 21.5
+    changes = service._advance_chart_state()
+
+    assert service.chart_state.version == 2
+    current = service._get_chart_data(since_minute, service.chart_state.series)
+    since = min(current["datasets"][0]["data"])
+    for dataset, expected in zip(previous["datasets"], current["datasets"]):
+        data = {
+            timestamp: value
+            for timestamp, value in dataset["data"].items()
+            if timestamp >= since
+        }
+        data.update(changes.get(dataset["label"], []))
+        assert data == expected["data"]
+    assert len(changes[labels[0]]) == 1
+
+    # Nothing changed, so the version stays
+    assert service._advance_chart_state() == {}
+    assert service.chart_state.version == 2
+
+
+def test_chart_advances_every_minute(monkeypatch):
+    since = {"minute": 29_000_000}
+    monkeypatch.setattr(service, "chart_state", None)
+    monkeypatch.setattr(service, "_get_chart_since_minute", lambda: since["minute"])
+    monkeypatch.setattr(
+        service,
+        "_get_temperature_series",
+        lambda *_: np.full(service.CHART_SLOTS, 20.0),
+    )
+    broadcasts = []
+    monkeypatch.setattr(
+        service.broadcast.broadcaster,
+        "broadcast",
+        lambda message, **_: broadcasts.append(json.loads(message)),
+    )
+    service._advance_chart_state()
+
+    async def tick():
+        simulated = clock.SimulatedClock(datetime(2025, 1, 1, 12, 0, 30, tzinfo=UTC))
+        with clock.use_clock(simulated):
+            task = asyncio.create_task(service.advance_chart_every_minute())
+            await asyncio.sleep(0)
+            # Nothing changed on the first tick
+            simulated.advance(60)
+            await asyncio.sleep(0)
+            since["minute"] += 1
+            simulated.advance(60)
+            await asyncio.sleep(0)
+            task.cancel()
+
+    asyncio.run(tick())
+
+    assert [message["type"] for message in broadcasts] == ["chart_delta"]
+    assert broadcasts[0]["version"] == service.chart_state.version == 2
+    assert service.chart_state.since_minute == since["minute"]
+
+
+def test_rollup_resolution_fills_chart():
+    assert service._get_rollup_resolution(7) == 60 * 60
+    assert service._get_rollup_resolution(30) == 60 * 60
+    assert service._get_rollup_resolution(365) == 24 * 60 * 60
+
+
+def test_long_range_chart_uses_rollups(monkeypatch):
+    source = service.settings.sources[0]
+    rollups = [(1735732800, 2000, 2100, 2200, 60)]
+    monkeypatch.setattr(
+        service.database,
+        "get_rollups",
+        lambda name, resolution, since: rollups if name == source.source else [],
+    )
+
+    response = TestClient(service.app).get("/temperatures", params={"range": "7d"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["resolution"] == 60 * 60
+    # Calibrated like the 24 hour chart
+    expected = round(
+        21.0 * float(source.calibration_multiplier) + float(source.calibration_offset),
+        2,
+    )
+    assert body["datasets"][0]["data"] == {"2025-01-01T12:00:00+00:00": expected}
+    assert TestClient(service.app).get("/temperatures?range=2d").status_code == 422
+
+
+def test_columnar_chart_formats(monkeypatch):
+    source = service.settings.sources[0]
+    since_minute = 29_000_000
+    monkeypatch.setattr(service, "_get_chart_since_minute", lambda: since_minute)
+    monkeypatch.setattr(
+        service,
+        "_get_temperature_series",
+        lambda *_: np.array([20.123, np.nan] + [21.0] * (service.CHART_SLOTS - 2)),
+    )
+    client = TestClient(service.app)
+
+    body = client.get("/temperatures", params={"format": "columnar"}).json()
+
+    assert body["format"] == "columnar"
+    assert (body["start"], body["step"]) == (since_minute * 60, 60)
+    dataset = body["datasets"][0]
+    assert dataset["label"] == source.label
+    assert len(dataset["values"]) == service.CHART_SLOTS
+    assert dataset["values"][:3] == [20.12, None, 21.0]
+
+    # Rollups are placed on a regular grid of buckets, gaps are null
+    resolution = 60 * 60
+    now = int(datetime.now(tz=UTC).timestamp())
+    bucket = now // resolution * resolution - resolution
+    monkeypatch.setattr(
+        service.database,
+        "get_rollups",
+        lambda name, *_: (
+            [(bucket, 2000, 2100, 2200, 60)] if name == source.source else []
+        ),
+    )
+    body = client.get("/temperatures", params={"range": "7d", "format": "columnar"})
+    body = body.json()
+    assert body["step"] == resolution
+    values = body["datasets"][0]["values"]
+    index = (bucket - body["start"]) // resolution
+    assert values[index] is not None
+    assert values.count(None) == len(values) - 1
+
+
+def test_temperatures_conditional_get(monkeypatch):
+    client = TestClient(service.app)
+    monkeypatch.setattr(service.database, "get_rollups", lambda *_: [])
+
+    response = client.get("/temperatures", params={"range": "7d"})
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert "max-age" in response.headers["Cache-Control"]
+
+    cached = client.get(
+        "/temperatures", params={"range": "7d"}, headers={"If-None-Match": etag}
+    )
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    # A legend change makes the cached chart stale
+    service._bump_data_version()
+    changed = client.get(
+        "/temperatures", params={"range": "7d"}, headers={"If-None-Match": etag}
+    )
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_readings_rounding_to_shown_temperature_do_not_mark_dirty(monkeypatch):
+    source = service.settings.sources[0]
+    marked = []
+    monkeypatch.setattr(service, "_mark_dirty", marked.append)
+    monkeypatch.setitem(service.legend_data, source.label, None)
+    reading = (Decimal("21.0") - source.calibration_offset) / (
+        source.calibration_multiplier
+    )
+
+    service.process_mqtt_readings({source.source: reading})
+    service.process_mqtt_readings({source.source: reading + Decimal("0.001")})
+
+    assert marked == [source.label]
+
+
+def test_ready_until_cache_is_hydrated(monkeypatch):
+    hydration = service.hydration.CacheHydration(None)
+    monkeypatch.setattr(service, "cache_hydration", hydration)
+    client = TestClient(service.app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["state"] == "pending"
+
+    hydration.state = "ready"
+    assert client.get("/ready").status_code == 200
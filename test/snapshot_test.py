@@ -0,0 +1,75 @@
+"""Tests for cache snapshots."""
+
+import os
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from mqtt_thermometer import cache, database, snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+        self.snapshot_path = Path(f"{self.db_path}.snapshot")
+        self.now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+        self.snapshot_path.unlink(missing_ok=True)
+
+    def _save(self, source: str, minutes_ago: int, temperature: str):
+        database.save_temperatures(
+            [(source, self.now - timedelta(minutes=minutes_ago), Decimal(temperature))]
+        )
+
+    def test_restore_replays_only_newer_rows(self):
+        for minutes_ago in range(10, 2, -1):
+            self._save("test/a", minutes_ago, "20.0")
+        self._save("test/b", 5, "-1.5")
+        self.assertTrue(snapshot.write_snapshot(self.snapshot_path))
+
+        # Saved after the snapshot
+        self._save("test/a", 2, "21.0")
+        self._save("test/b", 1, "-2.0")
+        expected = cache.get_all_readings()
+        cache.clear_cache()
+
+        self.assertTrue(snapshot.restore_cache(self.snapshot_path))
+
+        self.assertEqual(cache.get_all_readings(), expected)
+        self.assertEqual(cache.warmup_stats["source"], "snapshot")
+        self.assertEqual(cache.warmup_stats["rows"], 9)
+        # The newest snapshot minute and the rows after it
+        self.assertEqual(cache.warmup_stats["replayed_rows"], 3)
+
+    def test_invalid_snapshot_is_ignored(self):
+        self._save("test/a", 3, "20.0")
+        self.assertTrue(snapshot.write_snapshot(self.snapshot_path))
+        data = bytearray(self.snapshot_path.read_bytes())
+        data[-1] ^= 0xFF
+        self.snapshot_path.write_bytes(data)
+
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.read_snapshot(self.snapshot_path)
+        cache.clear_cache()
+
+        self.assertFalse(snapshot.restore_cache(self.snapshot_path))
+        self.assertEqual(cache.get_cache_stats(), {})
+
+    def test_missing_snapshot_is_ignored(self):
+        self.assertFalse(snapshot.restore_cache(self.snapshot_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
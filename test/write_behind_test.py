@@ -0,0 +1,86 @@
+"""Tests for the write-behind queue."""
+
+import os
+import tempfile
+import unittest
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+
+from mqtt_thermometer import cache, database
+from mqtt_thermometer.write_behind import WriteBehindQueue
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        self.db_fd, self.db_path = tempfile.mkstemp()
+        self.original_connection_string = database.settings.db_connection_string
+        database.settings.db_connection_string = self.db_path
+        database.create_table()
+        cache.clear_cache()
+
+    def tearDown(self):
+        cache.clear_cache()
+        database.close_connections()
+        database.settings.db_connection_string = self.original_connection_string
+        os.close(self.db_fd)
+        os.unlink(self.db_path)
+
+    def _minute_rows(self, minute: datetime):
+        return [
+            ("source1", minute, Decimal("20.5")),
+            ("source2", minute, Decimal("21.5")),
+        ]
+
+    def test_batches_are_committed_together(self):
+        """Test that queued minutes are committed in a single transaction."""
+        write_queue = WriteBehindQueue(
+            max_size=10, flush_interval=0.0, flush_max_rows=100
+        )
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+        write_queue.put_many(self._minute_rows(now - timedelta(minutes=1)))
+        write_queue.put_many(self._minute_rows(now))
+
+        self.assertEqual(write_queue.get_stats()["queue_depth"], 4)
+        write_queue.flush()
+
+        stats = write_queue.get_stats()
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertEqual(stats["committed_rows"], 4)
+        self.assertEqual(stats["commits"], 1)
+        self.assertEqual(
+            len(database.get_temperatures("source1", now - timedelta(hours=1))), 2
+        )
+        self.assertEqual(cache.get_cache_stats(), {"source1": 2, "source2": 2})
+
+    def test_writer_thread_flushes_on_stop(self):
+        """Test that stopping the writer commits everything still queued."""
+        write_queue = WriteBehindQueue(
+            max_size=10, flush_interval=0.0, flush_max_rows=100
+        )
+        write_queue.start()
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+        write_queue.put_many(self._minute_rows(now))
+        write_queue.stop()
+
+        self.assertEqual(write_queue.get_stats()["committed_rows"], 2)
+        self.assertEqual(
+            len(database.get_temperatures("source2", now - timedelta(hours=1))), 1
+        )
+
+    def test_full_queue_drops_rows(self):
+        """Test that a full queue drops rows instead of blocking the caller."""
+        write_queue = WriteBehindQueue(
+            max_size=1, flush_interval=0.0, flush_max_rows=100
+        )
+        now = datetime.now(tz=UTC).replace(second=0, microsecond=0)
+
+        self.assertTrue(write_queue.put_many(self._minute_rows(now)))
+        self.assertFalse(write_queue.put_many(self._minute_rows(now)))
+
+        stats = write_queue.get_stats()
+        self.assertEqual(stats["queue_depth"], 2)
+        self.assertEqual(stats["dropped_rows"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()